@@ -6,6 +6,9 @@ ln -s /etc/nginx/sites-available/tools350_nginx.conf /etc/nginx/sites-enabled/to
 cd ~/350-tools-mk2
 # Assumes pipenv installed, tested with python3.8.1
 pipenv install 
-nohup uwsgi --socket tools350.sock --module tools350.wsgi --chmod-socket=666 &
+# Collects and precompresses the static files into static_serve
+pipenv run python manage.py collectstatic --noinput
+# Same options as run.sh, including the daemon running queued image conversions
+nohup uwsgi --ini uwsgi.ini &
 
 sudo /etc/init.d/nginx restart
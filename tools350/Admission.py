@@ -0,0 +1,124 @@
+import json
+import os
+from contextlib import contextmanager
+from threading import Lock
+from time import sleep, time
+from typing import *
+from uuid import uuid4
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, where the limit only holds within each process
+    fcntl = None
+
+
+class Admission:
+    """
+    Limit on how much work of one kind the server runs at once, shared by every server process through a state file.
+    Each request has a cost, in units of the pool's capacity, and runs once the units it needs are free. Requests that
+    can't run yet wait their turn in a bounded first come, first served queue, so a large request is not overtaken
+    forever by small ones. Requests are turned away when the queue is full or they wait too long. Units held or waited
+    for by processes that have died are reclaimed.
+    """
+
+    POLL_SECONDS = 0.005  # First wait between checks for free units, doubled after each check
+    MAX_POLL_SECONDS = 0.1
+
+    _lock = Lock()  # Serializes threads where there is no fcntl
+
+    def __init__(self, path: str, capacity: int, queue: int, timeout: float):
+        """
+        :param path: State file, created if needed. Every process using the same path shares the limit
+        :param capacity: Units that can be in use at once
+        :param queue: Most requests waiting at once
+        :param timeout: Longest a request waits, in seconds
+        """
+        self.path = path
+        self.capacity = capacity
+        self.queue = queue
+        self.timeout = timeout
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def acquire(self, cost: int) -> Optional[str]:
+        """
+        Wait for the units a request needs.
+        :param cost: Units needed. A request costing more than the capacity waits until the pool is idle instead
+        :return: Ticket to release the units with, None if the request was turned away
+        """
+        cost = max(1, min(cost, self.capacity))
+        ticket = uuid4().hex
+        with self._state() as state:
+            if not state['queue'] and self._used(state) + cost <= self.capacity:
+                state['held'][ticket] = [os.getpid(), cost]
+                return ticket
+            if len(state['queue']) >= self.queue:
+                return None
+            state['queue'].append([ticket, os.getpid(), cost])
+        deadline = time() + self.timeout
+        poll = Admission.POLL_SECONDS
+        while True:
+            sleep(poll)
+            poll = min(poll * 2, Admission.MAX_POLL_SECONDS)
+            with self._state() as state:
+                if state['queue'] and state['queue'][0][0] == ticket and self._used(state) + cost <= self.capacity:
+                    del state['queue'][0]
+                    state['held'][ticket] = [os.getpid(), cost]
+                    return ticket
+                if time() >= deadline:
+                    state['queue'] = [x for x in state['queue'] if x[0] != ticket]
+                    return None
+
+    def release(self, ticket: str):
+        """
+        :param ticket: Ticket returned by acquire
+        :return: None
+        """
+        with self._state() as state:
+            state['held'].pop(ticket, None)
+
+    def usage(self) -> Tuple[int, int]:
+        """
+        :return: Units in use, and requests waiting
+        """
+        with self._state() as state:
+            return self._used(state), len(state['queue'])
+
+    @contextmanager
+    def _state(self) -> Iterator[dict]:
+        """
+        Lock the state file, yielding its content with dead processes removed, and write back any changes
+        """
+        with Admission._lock, open(self.path, 'a+') as file:
+            if fcntl is not None:
+                fcntl.flock(file, fcntl.LOCK_EX)
+            file.seek(0)
+            text = file.read()
+            try:
+                state = json.loads(text)
+            except ValueError:  # New, or cut short by a crash
+                state = {'held': {}, 'queue': []}
+            alive = {}
+            for pid in {x[0] for x in state['held'].values()} | {x[1] for x in state['queue']}:
+                alive[pid] = Admission._alive(pid)
+            state['held'] = {k: v for k, v in state['held'].items() if alive[v[0]]}
+            state['queue'] = [x for x in state['queue'] if alive[x[1]]]
+            yield state
+            new = json.dumps(state)
+            if new != text:
+                file.seek(0)
+                file.truncate()
+                file.write(new)
+
+    @classmethod
+    def _used(cls, state: dict) -> int:
+        return sum(x[1] for x in state['held'].values())
+
+    @classmethod
+    def _alive(cls, pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
@@ -0,0 +1,97 @@
+import os
+from math import ceil
+from time import perf_counter
+from typing import *
+
+from django.http import HttpRequest, HttpResponse, JsonResponse
+
+from tools350 import settings
+from tools350.Admission import Admission
+from tools350.Metrics import Metrics
+
+
+class AdmissionMiddleware:
+    """
+    Holds the views listed in ADMISSION_VIEWS to the limits of their pool in ADMISSION_POOLS, shared by every server
+    process. Each request costs units estimated from its size: a unit per ADMISSION_LINES_PER_UNIT lines of the
+    uploaded files, or per ADMISSION_BYTES_PER_UNIT bytes of the upload. Requests turned away get a 503 with a
+    Retry-After. The units are held until the response, streamed or not, is done.
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]):
+        self.get_response = get_response
+        self.pools = {name: Admission(os.path.join(settings.ADMISSION_DIR, name + '.json'), **config)
+                      for name, config in settings.ADMISSION_POOLS.items()}
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        request.admission = None
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            AdmissionMiddleware._release(request)
+            raise
+        if request.admission is None:
+            return response
+        if response.streaming:
+            response.streaming_content = AdmissionMiddleware._stream(request, response.streaming_content)
+            # Also on close, as the stream is never finished if the client goes away before it is read
+            response._resource_closers.append(lambda: AdmissionMiddleware._release(request))
+        else:
+            AdmissionMiddleware._release(request)
+        return response
+
+    def process_view(self, request: HttpRequest, view_func: Callable, view_args: list,
+                     view_kwargs: dict) -> Optional[HttpResponse]:
+        match = request.resolver_match
+        limit = settings.ADMISSION_VIEWS.get(match.url_name if match is not None else None)
+        if limit is None or request.method != 'POST':
+            return None
+        name, estimate = limit
+        pool = self.pools[name]
+        labels = {'pool': name}
+        start = perf_counter()
+        ticket = pool.acquire(AdmissionMiddleware.cost(request, estimate))
+        Metrics.observe('tools350_admission_wait_seconds', perf_counter() - start, labels)
+        if ticket is None:
+            Metrics.inc('tools350_admission_rejected_total', labels)
+            response = JsonResponse({'error': 'The server is busy, try again shortly'}, status=503)
+            response['Retry-After'] = str(max(1, ceil(pool.timeout)))
+            return response
+        request.admission = pool, ticket
+        return None
+
+    @classmethod
+    def cost(cls, request: HttpRequest, estimate: str) -> int:
+        """
+        :param request: Request to a limited view
+        :param estimate: How to estimate the cost of the request: 'lines' or 'bytes'
+        :return: Units the request costs
+        """
+        if estimate == 'lines':
+            if request.FILES:
+                lines = sum(chunk.count(b'\n') for _, files in request.FILES.lists() for f in files
+                            for chunk in f.chunks())
+            elif request.content_type == 'application/json':  # Source sent as JSON, with its newlines escaped
+                lines = request.body.count(b'\\n')
+            else:  # A form without files, whose body was already read by Django and holds no source
+                return 1
+            return ceil(lines / settings.ADMISSION_LINES_PER_UNIT)
+        try:
+            size = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            size = 0
+        return ceil(size / settings.ADMISSION_BYTES_PER_UNIT)
+
+    @classmethod
+    def _stream(cls, request: HttpRequest, content: Iterable[bytes]) -> Iterator[bytes]:
+        try:
+            yield from content
+        finally:
+            AdmissionMiddleware._release(request)
+
+    @classmethod
+    def _release(cls, request: HttpRequest):
+        if getattr(request, 'admission', None) is not None:
+            pool, ticket = request.admission
+            request.admission = None
+            pool.release(ticket)
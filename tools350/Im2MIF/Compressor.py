@@ -1,10 +1,11 @@
 import numpy as np
 
-from PIL import Image, ImageOps
+from PIL import Image
 from typing import List, Tuple
-from mif import Mif
+from tools350.Im2MIF.mif import Mif
 from sklearn.cluster import MiniBatchKMeans
-from rgb import RGB
+from tools350.Im2MIF.rgb import RGB
+from tools350.Spans import Spans
 
 
 class Compressor:
@@ -55,45 +56,82 @@ class Compressor:
         limit = len(colors) if limit > len(colors) else limit  # If the limit is too high for sklearn's k-means,
                                                                # lower it to the right number
         batch_size = int(limit / 32) if limit > Compressor.__MIN_BATCH_SIZE else limit
-        return MiniBatchKMeans(n_clusters=limit, batch_size=batch_size, tol=0.2, max_iter=75).fit(colors)
+        with Spans.span('kmeans'):
+            return MiniBatchKMeans(n_clusters=limit, batch_size=batch_size, tol=0.2, max_iter=75).fit(colors)
 
     @classmethod
-    def compress_pixels(cls, im: Image.Image, cluster_size: int) -> Image.Image:
+    def compress_pixels(cls, im: Image.Image, cluster_size: int, reduction: str = 'center') -> Image.Image:
         """
-        Compress the image by clustering adjacent pixels to center color value.
+        Compress the image by giving every pixel in each square block of adjacent pixels the same color. Blocks start
+        at the top left corner, those on the right and bottom edges are cut short where the image ends.
         :param im: Image to compress
         :param cluster_size: Size of the square used to define adjacent pixels
-        :return: Compressed version of the original image. This is a new image object
-        """
-        if any(cluster_size > i for i in im.size):
-            print("Pixel cluster value of {} too large for im of dimension {}x{}".format(cluster_size, *im.size))
-            exit(1)
-        new_data = np.zeros(im.size, dtype=(np.uint8, 3))
-        cols, rows = im.size
-        for row in range(0, rows, cluster_size):
-            for col in range(0, cols, cluster_size):
-                pixel_value = Compressor.sample_image(im, col, row, cluster_size)
-                c_bound = min(col + cluster_size, cols)
-                r_bound = min(row + cluster_size, rows)
-                for r in range(row, r_bound):
-                    for c in range(col, c_bound):
-                        new_data[c][r] = pixel_value
-        return ImageOps.mirror(Image.fromarray(new_data, mode="RGB").rotate(-90, expand=True))
+        :param reduction: How the color of a block is picked, one of REDUCTIONS
+        :return: Compressed version of the original image, in RGB. This is a new image object
+        :raises ValueError: The cluster size is not between 1 and the smaller dimension of the image, or the reduction
+        is unknown
+        """
+        if reduction not in Compressor.REDUCTIONS:
+            raise ValueError("Unknown pixel reduction {}, expected one of {}".format(
+                reduction, ', '.join(Compressor.REDUCTIONS)))
+        if cluster_size < 1 or any(cluster_size > i for i in im.size):
+            raise ValueError("Pixel cluster value of {} invalid for image of dimension {}x{}".format(
+                cluster_size, *im.size))
+        data = np.asarray(im.convert('RGB'))  # rows x cols x 3
+        rows, cols, _ = data.shape
+        colors = np.empty((-(-rows // cluster_size), -(-cols // cluster_size), 3), dtype=np.uint8)
+        full_rows, full_cols = rows - rows % cluster_size, cols - cols % cluster_size
+        # Split the image at the last full block in each direction, so every block of a part has the same shape
+        for r0, r1 in ((0, full_rows), (full_rows, rows)):
+            for c0, c1 in ((0, full_cols), (full_cols, cols)):
+                if r0 == r1 or c0 == c1:
+                    continue
+                height, width = min(cluster_size, r1 - r0), min(cluster_size, c1 - c0)
+                blocks = data[r0:r1, c0:c1].reshape((r1 - r0) // height, height, (c1 - c0) // width, width, 3)
+                colors[r0 // cluster_size:-(-r1 // cluster_size), c0 // cluster_size:-(-c1 // cluster_size)] = \
+                    getattr(Compressor, '_' + reduction)(blocks)
+        return Image.fromarray(colors.repeat(cluster_size, 0).repeat(cluster_size, 1)[:rows, :cols], mode="RGB")
+
+    @classmethod
+    def _center(cls, blocks: np.ndarray) -> np.ndarray:
+        """
+        :param blocks: Block rows x block height x block cols x block width x 3
+        :return: Color of the pixel at the center of each block, block rows x block cols x 3
+        """
+        return blocks[:, blocks.shape[1] // 2, :, blocks.shape[3] // 2]
 
     @classmethod
-    def sample_image(cls, im: Image.Image, col: int, row: int, cluster_size: int) -> Tuple[int, int, int]:
-        """
-        Get the center color value inside a square with side length cluster_size and top left corner at (row, col)
-        :param im: Image to sample from
-        :param col: Col to sample near
-        :param row: Row to sample near
-        :param cluster_size: Size of the square to define adjacent pixels
-        :return: RGB value of the pixel at the center of the square
-        """
-        row_delta = cluster_size if row + cluster_size < im.size[1] else im.size[1] - row
-        col_delta = cluster_size if col + cluster_size < im.size[0] else im.size[0] - col
-        sample = (col + int(col_delta / 2), row + int(row_delta / 2))
-        x = im.getpixel(sample)
-        return x
+    def _mean(cls, blocks: np.ndarray) -> np.ndarray:
+        return np.rint(blocks.mean(axis=(1, 3))).astype(np.uint8)
+
+    @classmethod
+    def _median(cls, blocks: np.ndarray) -> np.ndarray:
+        """
+        Median of each channel separately, so the color may not appear in the block
+        """
+        return np.rint(np.median(Compressor._pixels(blocks), axis=2)).astype(np.uint8)
+
+    @classmethod
+    def _mode(cls, blocks: np.ndarray) -> np.ndarray:
+        """
+        Most common color of each block. Ties go to the color with the smallest 0xRRGGBB value
+        """
+        pixels = Compressor._pixels(blocks).astype(np.uint32)
+        keys = np.sort(pixels[..., 0] << 16 | pixels[..., 1] << 8 | pixels[..., 2], axis=2)
+        index = np.arange(keys.shape[2])
+        starts = np.concatenate([np.ones(keys.shape[:2] + (1,), dtype=bool), keys[..., 1:] != keys[..., :-1]], axis=2)
+        run_start = np.maximum.accumulate(np.where(starts, index, 0), axis=2)
+        ends = (index - run_start).argmax(axis=2)  # Where the first of the longest runs of one color ends
+        best = keys[np.arange(keys.shape[0])[:, None], np.arange(keys.shape[1]), ends]
+        return np.stack([best >> 16, best >> 8 & 0xFF, best & 0xFF], axis=2).astype(np.uint8)
+
+    @classmethod
+    def _pixels(cls, blocks: np.ndarray) -> np.ndarray:
+        """
+        :return: The pixels of each block in a row, block rows x block cols x pixels x 3
+        """
+        n, height, m, width, _ = blocks.shape
+        return blocks.transpose(0, 2, 1, 3, 4).reshape(n, m, height * width, 3)
 
+    REDUCTIONS = ('center', 'mean', 'median', 'mode')  # Each has a classmethod of the same name, prefixed with _
     __MIN_BATCH_SIZE = 200  # If there's fewer than this many colors, just do the whole thing at once, no mini batches
@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
 
-from util.util import *
-from Compressor import Compressor
+from tools350.Im2MIF.util.util import *
+from tools350.Im2MIF.Compressor import Compressor
 from PIL import Image
-from mif import Mif
-from rgb import RGB
-from MifEntry import MifEntry
+from tools350.Im2MIF.mif import Mif
+from tools350.Im2MIF.rgb import RGB
+from tools350.Im2MIF.MifEntry import MifEntry
 import argparse as ap
+from typing import BinaryIO, Dict, IO, List, Tuple, Union
 from os.path import basename, dirname
 
 
@@ -28,18 +29,41 @@ class Im2Mif:
         return
 
     @classmethod
-    def convert(cls, files: List[str], cluster_size: int, max_colors: int) -> BytesIO:
+    def convert(cls, files: List[Union[str, IO]], cluster_size: int, max_colors: int,
+                names: List[str] = None, reduction: str = 'center') -> BytesIO:
+        """
+        :param files: Images, as paths or binary streams such as uploads
+        :param cluster_size: Pixel window size
+        :param max_colors: Most colors allowed in the color MIF
+        :param names: Name of each image, defaults to the base name of each path
+        :param reduction: How each pixel window's color is picked, one of Compressor.REDUCTIONS
+        :return: Zip of the color MIF and a MIF per image
+        :raises ValueError: The pixel window is larger than an image, or the reduction is unknown
+        """
         images: List[Image.Image] = [Image.open(f) for f in files]
-        compressed = [Compressor.compress_pixels(im, cluster_size) for im in images] if cluster_size > 1 else images
+        compressed = [Compressor.compress_pixels(im, cluster_size, reduction) for im in images] \
+            if cluster_size > 1 else images
         color_mif, color_compressed = Compressor.compress_colors_collective(compressed, max_colors)
 
         mifs = [color_mif] + [Im2Mif.mifify(im, color_mif) for im in color_compressed]
-        names = ["colors.foo"] + [str(basename(f)) for f in files]
+        names = ["colors.foo"] + ([str(basename(f)) for f in files] if names is None else names)
 
         ret = zip_(names, [StringIO(str(x)) for x in mifs])
         [x.close() for x in images + compressed + color_compressed if x]
         return ret
 
+    @classmethod
+    def run_job(cls, inputs: List[Tuple[str, str]], params: Dict[str, int], out: BinaryIO):
+        """
+        Convert images for the job queue, see tools350.JobQueue.
+        :param inputs: (name, path) of each image
+        :param params: {"colors": max_colors, "cluster_size": cluster_size}, optionally with "reduction"
+        :param out: File to write the zip to
+        """
+        zipped = Im2Mif.convert([x[1] for x in inputs], params['cluster_size'], params['colors'],
+                                [x[0] for x in inputs], params.get('reduction', 'center'))
+        out.write(zipped.getvalue())
+
     @classmethod
     def mifify(cls, im: Image.Image, color_mif: Mif) -> Mif:
         width = num_bits_needed(color_mif.get_num_entries())
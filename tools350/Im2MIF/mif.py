@@ -1,6 +1,7 @@
 from typing import List
-from MifEntry import MifEntry
+from tools350.Im2MIF.MifEntry import MifEntry
 import difflib
+from tools350.MifWriter import MifWriter
 
 
 class Mif:
@@ -20,14 +21,13 @@ class Mif:
             return -1
 
     def make_header(self) -> str:
-        return """DEPTH = {};\nWIDTH = {};\nADDRESS_RADIX = DEC;\nDATA_RADIX = HEX;\nCONTENT\nBEGIN\n"""\
-            .format(len(self.__contents), self.__width)
+        return MifWriter.header(len(self.__contents), self.__width, 'HEX')
 
     def make_footer(self) -> str:
-        return """\nEND;\n"""
+        return MifWriter.footer()
 
     def build_line(self, entry_num: int, value: str) -> str:
-        return """{:04d} : {:s};\n""".format(entry_num, value)
+        return MifWriter.entry(entry_num, entry_num, value)
 
     def get_num_entries(self):
         return len(self.__contents)
@@ -41,5 +41,5 @@ class Mif:
         self.__contents.sort()
 
     def __str__(self):
-        return self.make_header() + ''.join([self.build_line(i, str(x)) for i, x in enumerate(self.__contents)]) \
-               + self.make_footer()
+        # Runs of identical entries, like a solid background, are written as a single range
+        return ''.join(MifWriter.write([str(x) for x in self.__contents], len(self.__contents), self.__width, 'HEX'))
@@ -1,4 +1,4 @@
-from MifEntry import MifEntry
+from tools350.Im2MIF.MifEntry import MifEntry
 
 
 class RGB(MifEntry):
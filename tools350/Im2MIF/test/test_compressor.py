@@ -0,0 +1,70 @@
+import unittest
+
+import numpy as np
+from PIL import Image
+
+try:
+    from ..Compressor import Compressor
+except ImportError:  # scikit-learn, needed for color compression, is not installed
+    Compressor = None
+
+
+def center_loop(im: Image.Image, cluster_size: int) -> np.ndarray:
+    """
+    Pixelation as done before it was vectorized, pixel by pixel
+    """
+    cols, rows = im.size
+    ret = np.zeros((rows, cols, 3), dtype=np.uint8)
+    for row in range(0, rows, cluster_size):
+        for col in range(0, cols, cluster_size):
+            height, width = min(cluster_size, rows - row), min(cluster_size, cols - col)
+            ret[row:row + height, col:col + width] = im.getpixel((col + width // 2, row + height // 2))
+    return ret
+
+
+@unittest.skipIf(Compressor is None, 'scikit-learn is not installed')
+class TestCompressor(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.RandomState(350)
+
+    def image(self, pixels) -> Image.Image:
+        return Image.fromarray(np.array(pixels, dtype=np.uint8), mode='RGB')
+
+    def test_center(self):
+        for cols, rows, cluster_size in [(8, 6, 2), (7, 5, 2), (10, 10, 3), (9, 4, 4), (6, 6, 6), (13, 11, 5)]:
+            im = Image.fromarray(self.rng.randint(0, 256, (rows, cols, 3)).astype(np.uint8), mode='RGB')
+            out = Compressor.compress_pixels(im, cluster_size)
+            self.assertEqual(im.size, out.size)
+            np.testing.assert_array_equal(np.asarray(out), center_loop(im, cluster_size),
+                                          'Wrong pixels for {}x{} in blocks of {}'.format(cols, rows, cluster_size))
+
+    def test_reductions(self):
+        red, green, blue = (255, 0, 0), (0, 255, 0), (0, 0, 255)
+        # One full 2x2 block, with ragged blocks of 1x2, 2x1 and 1x1 to its right and below it
+        im = self.image([[red, red, blue],
+                         [green, red, green],
+                         [(10, 20, 30), blue, (1, 2, 3)]])
+        expected = {
+            'center': [[red, red, green], [red, red, green], [blue, blue, (1, 2, 3)]],
+            'mean': [[(191, 64, 0), (191, 64, 0), (0, 128, 128)], [(191, 64, 0), (191, 64, 0), (0, 128, 128)],
+                     [(5, 10, 142), (5, 10, 142), (1, 2, 3)]],
+            'median': [[(255, 0, 0)] * 2 + [(0, 128, 128)], [(255, 0, 0)] * 2 + [(0, 128, 128)],
+                       [(5, 10, 142), (5, 10, 142), (1, 2, 3)]],
+            'mode': [[red, red, blue], [red, red, blue], [blue, blue, (1, 2, 3)]],  # Ties go to the smaller color
+        }
+        for reduction, pixels in expected.items():
+            np.testing.assert_array_equal(np.asarray(Compressor.compress_pixels(im, 2, reduction)),
+                                          np.array(pixels, dtype=np.uint8), reduction)
+
+    def test_invalid(self):
+        im = self.image(np.zeros((4, 8, 3)))
+        for cluster_size in (0, -1, 5):
+            with self.assertRaises(ValueError):
+                Compressor.compress_pixels(im, cluster_size)
+        with self.assertRaises(ValueError):
+            Compressor.compress_pixels(im, 2, 'max')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+
+import argparse as ap
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import sqlite3
+import traceback
+from contextlib import contextmanager
+from time import sleep, time
+from typing import *
+from uuid import uuid4
+
+from tools350.Tools import Tools
+
+
+class Job(NamedTuple):
+    """
+    A job as last recorded in the queue
+    """
+    id: str
+    kind: str
+    status: str  # One of the JobQueue statuses
+    created: float
+    started: Optional[float]
+    finished: Optional[float]
+    error: Optional[str]  # Why the job failed
+
+
+class JobQueue:
+    """
+    Queue of slow jobs, like image conversions, run by worker processes of their own instead of the server's request
+    threads. Jobs are rows of a table in a SQLite database and their files live in a directory per job, so any number
+    of server processes can submit and poll while a fixed number of workers, started with work, run the jobs one at a
+    time each. Results are kept for a while after a job finishes, then removed along with the job.
+
+    A job runs a handler, named by its kind in HANDLERS. A handler is called with the (name, path) of each input file,
+    the parameters the job was submitted with, and a binary file to write the result to.
+    """
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    POLL_SECONDS = 0.5  # How long an idle worker waits before looking for jobs again
+    EXPIRE_SECONDS = 60  # How often a worker removes expired jobs
+
+    # Kind -> handler, as module:attribute, imported by the workers when first needed
+    HANDLERS = {
+        'im2mif': 'tools350.Im2MIF.Im2Mif:Im2Mif.run_job',
+    }
+
+    def __init__(self, database: str, root: str, ttl: float, max_queued: int, timeout: float):
+        """
+        :param database: Path of the SQLite database, created if needed
+        :param root: Directory to keep the files of jobs in, created if needed
+        :param ttl: Seconds a finished job and its result are kept
+        :param max_queued: Most jobs waiting or running at once. Submissions past it are turned away
+        :param timeout: Seconds after which a running job is assumed lost, with its worker, and marked failed
+        """
+        self.database = database
+        self.root = root
+        self.ttl = ttl
+        self.max_queued = max_queued
+        self.timeout = timeout
+        os.makedirs(root, exist_ok=True)
+        with self._connect() as db:
+            db.execute(JobQueue._SCHEMA)
+
+    def submit(self, kind: str, params: Mapping[str, Any], files: Iterable[Tuple[str, Iterable[bytes]]]) \
+            -> Optional[str]:
+        """
+        :param kind: Kind of job, a key of HANDLERS
+        :param params: Parameters for the handler, as JSON
+        :param files: (name, content in chunks) of each input file
+        :return: Id of the job, or None if the queue is full
+        :raises ValueError: The kind is unknown
+        """
+        if kind not in JobQueue.HANDLERS:
+            raise ValueError("Unknown kind of job {}".format(kind))
+        self.expire()
+        if self._full():  # Spares writing the files when the queue is already full
+            return None
+        id_ = uuid4().hex
+        directory = self._directory(id_)
+        os.makedirs(directory)
+        names = []
+        try:
+            for i, (name, chunks) in enumerate(files):
+                with open(os.path.join(directory, '{}.in'.format(i)), 'wb') as file:
+                    for chunk in chunks:
+                        file.write(chunk)
+                names.append(name)
+            with self._connect() as db:
+                db.execute("BEGIN IMMEDIATE")  # Locks out other submitters until the job is counted
+                full = self._full(db)
+                if not full:
+                    db.execute("INSERT INTO jobs (id, kind, params, names, status, created) VALUES (?, ?, ?, ?, ?, ?)",
+                               (id_, kind, json.dumps(params), json.dumps(names), JobQueue.QUEUED, time()))
+                db.execute("COMMIT")
+        except BaseException:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        if full:
+            shutil.rmtree(directory, ignore_errors=True)
+            return None
+        return id_
+
+    def status(self, id_: str) -> Optional[Job]:
+        """
+        :param id_: Id of the job
+        :return: The job, None if there is no such job or it expired
+        """
+        with self._connect() as db:
+            row = db.execute("SELECT id, kind, status, created, started, finished, error FROM jobs WHERE id = ?",
+                             (id_,)).fetchone()
+        return None if row is None else Job(*row)
+
+    def result(self, id_: str) -> Optional[str]:
+        """
+        :param id_: Id of the job
+        :return: Path of the result of the job, None if it has not finished successfully or expired
+        """
+        job = self.status(id_)
+        if job is None or job.status != JobQueue.DONE:
+            return None
+        path = self._result(id_)
+        return path if os.path.isfile(path) else None
+
+    def position(self, id_: str) -> int:
+        """
+        :param id_: Id of a queued job
+        :return: Number of jobs waiting ahead of it
+        """
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM jobs WHERE status = ? AND created < "
+                              "(SELECT created FROM jobs WHERE id = ?)", (JobQueue.QUEUED, id_)).fetchone()[0]
+
+    def run_once(self) -> Optional[str]:
+        """
+        Claim the oldest queued job and run it in this process.
+        :return: Id of the job run, None if there was none
+        """
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")  # Locks out other workers until the job is claimed
+            row = db.execute("SELECT id, kind, params, names FROM jobs WHERE status = ? ORDER BY created LIMIT 1",
+                             (JobQueue.QUEUED,)).fetchone()
+            if row is not None:
+                db.execute("UPDATE jobs SET status = ?, started = ? WHERE id = ?", (JobQueue.RUNNING, time(), row[0]))
+            db.execute("COMMIT")
+        if row is None:
+            return None
+        id_, kind, params, names = row
+        directory = self._directory(id_)
+        inputs = [(name, os.path.join(directory, '{}.in'.format(i))) for i, name in enumerate(json.loads(names))]
+        status, error = JobQueue.DONE, None
+        tmp = self._result(id_) + '.tmp'
+        try:
+            with open(tmp, 'wb') as file:
+                JobQueue._handler(kind)(inputs, json.loads(params), file)
+            os.replace(tmp, self._result(id_))
+        except Exception as e:
+            status, error = JobQueue.FAILED, '{}: {}'.format(str(type(e)), str(e))
+            traceback.print_exc()
+        finally:
+            for path in [tmp] + [x[1] for x in inputs]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        with self._connect() as db:
+            # Unless it was given up on meanwhile
+            db.execute("UPDATE jobs SET status = ?, finished = ?, error = ? WHERE id = ? AND status = ?",
+                       (status, time(), error, id_, JobQueue.RUNNING))
+        return id_
+
+    def expire(self):
+        """
+        Remove the jobs that finished more than ttl ago, with their files, and fail the jobs that have been running for
+        longer than the timeout.
+        :return: None
+        """
+        now = time()
+        with self._connect() as db:
+            db.execute("UPDATE jobs SET status = ?, finished = ?, error = ? WHERE status = ? AND started < ?",
+                       (JobQueue.FAILED, now, 'Timed out', JobQueue.RUNNING, now - self.timeout))
+            expired = [row[0] for row in db.execute("SELECT id FROM jobs WHERE finished < ?", (now - self.ttl,))]
+            db.executemany("DELETE FROM jobs WHERE id = ?", [(x,) for x in expired])
+        for id_ in expired:
+            shutil.rmtree(self._directory(id_), ignore_errors=True)
+
+    def work(self, workers: int):
+        """
+        Run jobs in worker processes until interrupted or terminated, stopping the workers along with this process.
+        Workers whose parent is killed outright stop on their own once they are idle.
+        :param workers: Number of worker processes, and so the most jobs run at once
+        :return: None
+        """
+        for kind in JobQueue.HANDLERS:  # Imported before forking, so the workers share them copy-on-write
+            try:
+                JobQueue._handler(kind)
+            except ImportError:
+                traceback.print_exc()
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+        processes = [context.Process(target=self._work, args=(os.getpid(),), daemon=True)
+                     for _ in range(max(1, workers))]
+        # Like when uWSGI restarts its daemons, which only signals this process
+        previous = signal.signal(signal.SIGTERM, JobQueue._terminate)
+        try:
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            for process in processes:
+                if process.pid is not None:
+                    process.join()
+
+    def _work(self, parent: int):
+        """
+        :param parent: Process running work, which this worker stops without
+        """
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        if hasattr(os, 'nice'):
+            os.nice(10)  # Leave the processor to the server's request threads first
+        expired = 0.0
+        while os.getppid() == parent:
+            if time() - expired > JobQueue.EXPIRE_SECONDS:
+                self.expire()
+                expired = time()
+            try:
+                if self.run_once() is None:
+                    sleep(JobQueue.POLL_SECONDS)
+            except sqlite3.OperationalError:  # Database locked for longer than the timeout, try again later
+                traceback.print_exc()
+                sleep(JobQueue.POLL_SECONDS)
+
+    @classmethod
+    def _terminate(cls, signum: int, frame):
+        raise SystemExit(128 + signum)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        db = sqlite3.connect(self.database, timeout=30, isolation_level=None)
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def _full(self, db: sqlite3.Connection = None) -> bool:
+        """
+        :param db: Connection to count the jobs on, a new one by default
+        :return: Whether max_queued jobs are already queued or running
+        """
+        if db is None:
+            with self._connect() as db:
+                return self._full(db)
+        return db.execute(JobQueue._ACTIVE, (JobQueue.QUEUED, JobQueue.RUNNING)).fetchone()[0] >= self.max_queued
+
+    def _directory(self, id_: str) -> str:
+        return os.path.join(self.root, id_)
+
+    def _result(self, id_: str) -> str:
+        return os.path.join(self._directory(id_), 'result')
+
+    @classmethod
+    def _handler(cls, kind: str) -> Callable[[List[Tuple[str, str]], Dict[str, Any], BinaryIO], None]:
+        return Tools.resolve(JobQueue.HANDLERS[kind])
+
+    _SCHEMA = ("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL, "
+               "names TEXT NOT NULL, status TEXT NOT NULL, created REAL NOT NULL, started REAL, finished REAL, "
+               "error TEXT)")
+    _ACTIVE = "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)"
+
+
+if __name__ == '__main__':
+    from tools350 import settings
+
+    args = ap.ArgumentParser(description='Run queued jobs, like image conversions, until interrupted')
+    args.add_argument('-j', '--workers', dest='workers', type=int, default=settings.JOB_WORKERS,
+                      help='Number of worker processes')
+    in_ = args.parse_args()
+    JobQueue(settings.DATABASES['default']['NAME'], settings.JOB_DIR, settings.JOB_TTL_SECONDS,
+             settings.JOB_MAX_QUEUED, settings.JOB_TIMEOUT_SECONDS).work(in_.workers)
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+
+import argparse as ap
+import json
+import os
+import platform
+import random
+import struct
+import subprocess
+import sys
+import threading
+import zlib
+from collections import defaultdict
+from http.cookiejar import CookieJar
+from time import perf_counter, time
+from typing import *
+from urllib.error import HTTPError
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+from uuid import uuid4
+
+from tools350.assembler.Benchmark import Benchmark
+
+try:
+    import resource
+except ImportError:  # Not available on Windows, where peak RSS of this process is not reported
+    resource = None
+
+
+class Upload(NamedTuple):
+    """
+    A request to replay: a page to fetch, or a form to post
+    """
+    scenario: str
+    method: str
+    path: str
+    fields: Dict[str, str]
+    files: List[Tuple[str, str, bytes]]  # (field, file name, content)
+
+
+class Sample(NamedTuple):
+    """
+    Outcome of one request
+    """
+    scenario: str
+    status: int  # 0 if the request failed without a response
+    seconds: float  # Until the whole response was read
+    bytes: int
+
+
+class LoadTest:
+    """
+    Replays a mix of uploads like the ones students make before a deadline, from several simulated users at once, and
+    reports the throughput and latency of each kind of request. Requests go to the Django app in this process through
+    the test client, or to a running server over HTTP. Scenarios:
+    assemble: One to four assembly files of 10 to 4096 lines. Each file is unique, so the assembler's result cache
+    doesn't answer them
+    declarations: Assembly files using custom instructions, uploaded with their declarations
+    image: An image submitted for conversion. Only the submission is timed, the conversion runs in the job queue
+    page: One of the static pages or tool pages
+    """
+
+    SCENARIOS = ('assemble', 'declarations', 'image', 'page')
+    MIX = {'assemble': 6, 'declarations': 2, 'image': 1, 'page': 4}
+    PAGES = ('/', '/help/', '/feedback/', '/about/', '/assembler/', '/im2mif/')
+    PERCENTILES = (50, 95, 99)
+    THRESHOLD = 1.25  # Slowdown from the baseline, or drop in throughput, that counts as a regression
+    NOISE_MS = 10  # Latency differences smaller than this are never regressions
+
+    def __init__(self, mix: Mapping[str, float] = None, seed: int = 350):
+        """
+        :param mix: Relative weight of each scenario, defaults to MIX
+        :param seed: Seed for the uploads, so that every run replays the same mix
+        """
+        self.mix = dict(LoadTest.MIX if mix is None else mix)
+        unknown = set(self.mix) - set(LoadTest.SCENARIOS)
+        if unknown:
+            raise ValueError("Unknown scenarios {}".format(', '.join(sorted(unknown))))
+        self.seed = seed
+        self._programs = {c.name: c.lines for c in Benchmark.cases(seed)}
+
+    @classmethod
+    def parse_mix(cls, text: str) -> Dict[str, float]:
+        """
+        :param text: Weights like assemble=6,page=4
+        :return: Weight of each scenario
+        :raises ValueError: The text is malformed
+        """
+        ret = {}
+        for item in text.split(','):
+            name, _, weight = item.partition('=')
+            ret[name.strip()] = float(weight)
+        return ret
+
+    def uploads(self, rng: random.Random) -> Iterator[Upload]:
+        """
+        :param rng: Random source of the simulated user
+        :return: Endless requests following the mix
+        """
+        names, weights = zip(*self.mix.items())
+        while True:
+            yield getattr(self, '_' + rng.choices(names, weights)[0])(rng)
+
+    def run(self, send: Callable[[Upload], Tuple[int, int]], users: int, duration: float = None,
+            requests: int = None) -> List[Sample]:
+        """
+        :param send: Makes a request, returning its status and the size of the response, once read
+        :param users: Number of simulated users, each sending a request as soon as its last one is answered
+        :param duration: Seconds to run for
+        :param requests: Requests to send in total, if no duration is given
+        :return: Every request sent
+        """
+        samples: List[Sample] = []
+        lock = threading.Lock()
+        remaining = [requests]
+        deadline = None if duration is None else perf_counter() + duration
+
+        def user(rng: random.Random):
+            for upload in self.uploads(rng):
+                with lock:
+                    if deadline is not None and perf_counter() >= deadline:
+                        return
+                    if deadline is None:
+                        if remaining[0] <= 0:
+                            return
+                        remaining[0] -= 1
+                start = perf_counter()
+                try:
+                    status, size = send(upload)
+                except Exception:
+                    status, size = 0, 0
+                sample = Sample(upload.scenario, status, perf_counter() - start, size)
+                with lock:
+                    samples.append(sample)
+
+        threads = [threading.Thread(target=user, args=(random.Random(self.seed + i),), daemon=True)
+                   for i in range(users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples
+
+    @classmethod
+    def summarize(cls, samples: Sequence[Sample], seconds: float) -> Dict[str, dict]:
+        """
+        :param samples: Every request sent
+        :param seconds: Wall time the requests were sent over
+        :return: {scenario: {'requests', 'errors', 'rejected', 'throughput', 'p50_ms', 'p95_ms', 'p99_ms', 'mean_kib'}},
+        with every request together under 'total'. Errors are failed requests, rejected ones are 503s
+        """
+        groups = defaultdict(list)
+        for sample in samples:
+            groups[sample.scenario].append(sample)
+            groups['total'].append(sample)
+        ret = {}
+        for name, group in sorted(groups.items()):
+            times = sorted(x.seconds for x in group)
+            ret[name] = {'requests': len(group), 'throughput': len(group) / seconds if seconds else 0.0,
+                         'errors': sum(1 for x in group if not 0 < x.status < 400),
+                         'rejected': sum(1 for x in group if x.status == 503),
+                         'mean_kib': sum(x.bytes for x in group) / len(group) / 1024}
+            for p in LoadTest.PERCENTILES:
+                ret[name]['p{}_ms'.format(p)] = times[max(0, -(-len(times) * p // 100) - 1)] * 1000  # Nearest rank
+        return ret
+
+    @classmethod
+    def compare(cls, results: dict, baseline: dict, threshold: float = THRESHOLD) -> List[str]:
+        """
+        :return: Description of every scenario that got slower or handled fewer requests per second than in the
+        baseline, by more than the threshold
+        """
+        ret = []
+        for name, now in results['scenarios'].items():
+            old = baseline['scenarios'].get(name)
+            if old is None:
+                continue
+            for key in ('p50_ms', 'p95_ms'):
+                if now[key] > old[key] * threshold and now[key] - old[key] > LoadTest.NOISE_MS:
+                    ret.append('{} {}: {:.1f}, baseline {:.1f}'.format(name, key, now[key], old[key]))
+            if now['throughput'] * threshold < old['throughput']:
+                ret.append('{} throughput: {:.1f}/s, baseline {:.1f}/s'.format(name, now['throughput'],
+                                                                               old['throughput']))
+        return ret
+
+    @classmethod
+    def report(cls, results: dict, baseline: dict = None) -> str:
+        """
+        :return: Table of the results, with the change from the baseline if one is given
+        """
+        columns = ['requests', 'errors', 'rejected', 'throughput'] + ['p{}_ms'.format(p) for p in LoadTest.PERCENTILES]
+        ret = ['{:14s}'.format('scenario') + ''.join('{:>20s}'.format(c) for c in columns)]
+        for name, now in results['scenarios'].items():
+            old = (baseline or {}).get('scenarios', {}).get(name, {})
+            cells = []
+            for column in columns:
+                change = ' ({:+4.0f}%)'.format((now[column] / old[column] - 1) * 100) if old.get(column) else ''
+                value = '{:d}'.format(now[column]) if isinstance(now[column], int) else '{:.1f}'.format(now[column])
+                cells.append('{:>20s}'.format(value + change))
+            ret.append('{:14s}'.format(name) + ''.join(cells))
+        ret.append('peak RSS: ' + ', '.join('{} {:.0f} MiB'.format(k, v / 1024)
+                                            for k, v in results['peak_rss_kib'].items()))
+        return '\n'.join(ret)
+
+    @classmethod
+    def in_process(cls) -> Callable[[Upload], Tuple[int, int]]:
+        """
+        :return: Sender for the Django app of this process, through a test client per thread. Needs
+        DJANGO_SETTINGS_MODULE
+        """
+        import django
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.test import Client
+        django.setup()
+        local = threading.local()
+
+        def send(upload: Upload) -> Tuple[int, int]:
+            if not hasattr(local, 'client'):
+                local.client = Client(HTTP_HOST='localhost')
+            if upload.method == 'GET':
+                response = local.client.get(upload.path)
+            else:
+                data = dict(upload.fields)
+                for field, name, content in upload.files:
+                    data.setdefault(field, []).append(SimpleUploadedFile(name, content))
+                response = local.client.post(upload.path, data)
+            size = sum(len(x) for x in response.streaming_content) if response.streaming else len(response.content)
+            response.close()
+            return response.status_code, size
+
+        return send
+
+    @classmethod
+    def over_http(cls, url: str) -> Callable[[Upload], Tuple[int, int]]:
+        """
+        :param url: Root of a running server, like http://127.0.0.1:8000
+        :return: Sender for the server, with a session per thread carrying the CSRF cookie
+        """
+        local = threading.local()
+
+        def send(upload: Upload) -> Tuple[int, int]:
+            if not hasattr(local, 'opener'):
+                local.cookies = CookieJar()
+                local.opener = build_opener(HTTPCookieProcessor(local.cookies))
+                local.opener.open(url + '/assembler/').read()  # Sets the CSRF cookie
+            headers, body = {}, None
+            if upload.method == 'POST':
+                token = next((c.value for c in local.cookies if c.name == 'csrftoken'), '')
+                boundary = uuid4().hex
+                body = LoadTest._multipart(boundary, upload.fields, upload.files)
+                headers = {'Content-Type': 'multipart/form-data; boundary=' + boundary, 'X-CSRFToken': token,
+                           'Referer': url + '/'}
+            try:
+                with local.opener.open(Request(url + upload.path, body, headers, method=upload.method)) as response:
+                    return response.status, len(response.read())
+            except HTTPError as e:
+                return e.code, len(e.read())
+
+        return send
+
+    @classmethod
+    def peak_rss(cls, master: int = None) -> Dict[str, float]:
+        """
+        :param master: Pid of a uWSGI master to report the workers of, instead of this process
+        :return: Peak resident set size of each process, in KiB
+        """
+        if master is None:
+            if resource is None:
+                return {}
+            scale = 1 if sys.platform != 'darwin' else 1 / 1024  # Bytes on macOS, KiB elsewhere
+            return {'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+                    'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale}
+        ret = {}
+        for pid in [master] + LoadTest._children(master):
+            try:
+                with open('/proc/{}/status'.format(pid)) as f:
+                    for line in f:
+                        if line.startswith('VmHWM:'):
+                            ret['master' if pid == master else str(pid)] = float(line.split()[1])
+            except OSError:
+                pass
+        return ret
+
+    @classmethod
+    def _children(cls, pid: int) -> List[int]:
+        ret = []
+        for entry in os.listdir('/proc'):
+            if entry.isdigit():
+                try:
+                    with open('/proc/{}/stat'.format(entry)) as f:
+                        if int(f.read().rpartition(')')[2].split()[1]) == pid:
+                            ret.append(int(entry))
+                except OSError:
+                    pass
+        return sorted(ret)
+
+    @classmethod
+    def _multipart(cls, boundary: str, fields: Mapping[str, str], files: Iterable[Tuple[str, str, bytes]]) -> bytes:
+        parts = []
+        for name, value in fields.items():
+            parts.append('--{}\r\nContent-Disposition: form-data; name="{}"\r\n\r\n{}\r\n'.format(
+                boundary, name, value).encode('utf-8'))
+        for field, name, content in files:
+            parts.append('--{}\r\nContent-Disposition: form-data; name="{}"; filename="{}"\r\nContent-Type: '
+                         'application/octet-stream\r\n\r\n'.format(boundary, field, name).encode('utf-8') + content +
+                         b'\r\n')
+        parts.append('--{}--\r\n'.format(boundary).encode('utf-8'))
+        return b''.join(parts)
+
+    def _assemble(self, rng: random.Random, declarations: bool = False) -> Upload:
+        files = []
+        for i in range(rng.randint(1, 4)):
+            if declarations:
+                lines = self._programs['declarations_1000']
+            else:
+                lines = self._programs[rng.choice(['straight_{}'.format(x) for x in Benchmark.SIZES] +
+                                                  ['branchy_1000', 'named_registers_1000', 'errors_1000'])]
+            text = '# {}\n{}'.format(uuid4().hex, ''.join(x + '\n' for x in lines))
+            files.append(('assembly', 'file{}.s'.format(i), text.encode('utf-8')))
+        if declarations:
+            files += [(field, field + '.json', json.dumps(value).encode('utf-8'))
+                      for field, value in Benchmark.CUSTOM.items()]
+        return Upload('declarations' if declarations else 'assemble', 'POST', '/assemble/', {}, files)
+
+    def _declarations(self, rng: random.Random) -> Upload:
+        return self._assemble(rng, True)
+
+    def _image(self, rng: random.Random) -> Upload:
+        size = rng.choice([32, 64, 160])
+        return Upload('image', 'POST', '/im2mif_convert/', {'num-colors': str(rng.choice([4, 16, 32]))},
+                      [('assembly', 'image.png', LoadTest._png(size, size, rng))])
+
+    def _page(self, rng: random.Random) -> Upload:
+        return Upload('page', 'GET', rng.choice(LoadTest.PAGES), {}, [])
+
+    @classmethod
+    def _png(cls, width: int, height: int, rng: random.Random) -> bytes:
+        """
+        :return: An RGB image of random stripes, encoded as a PNG
+        """
+        rows = []
+        for _ in range(height):
+            color = bytes(rng.randrange(256) for _ in range(3))
+            rows.append(b'\0' + color * width)
+        chunk = lambda kind, data: (struct.pack('>I', len(data)) + kind + data +
+                                    struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+        return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) +
+                chunk(b'IDAT', zlib.compress(b''.join(rows))) + chunk(b'IEND', b''))
+
+
+if __name__ == '__main__':
+    args = ap.ArgumentParser(description='Replay a mix of uploads against the app, reporting throughput and latency')
+    args.add_argument('-u', '--url', dest='url', default=None, help='Root URL of a running server, like '
+                                                                    'http://127.0.0.1:8000. Defaults to the app in '
+                                                                    'this process')
+    args.add_argument('-c', '--users', dest='users', type=int, default=8, help='Simulated users sending at once')
+    args.add_argument('-d', '--duration', dest='duration', type=float, default=None, help='Seconds to run for')
+    args.add_argument('-n', '--requests', dest='requests', type=int, default=200,
+                      help='Requests to send, when no duration is given')
+    args.add_argument('-m', '--mix', dest='mix', default=None, help='Weights of the scenarios, like assemble=6,'
+                                                                    'declarations=2,image=1,page=4')
+    args.add_argument('-p', '--master-pid', dest='master', type=int, default=None,
+                      help='Pid of the uWSGI master, to report the peak RSS of each of its workers')
+    args.add_argument('-o', '--output', dest='output', default=None, help='JSON file to write the results to')
+    args.add_argument('-b', '--baseline', dest='baseline', default=None, help='Results of an earlier run to compare '
+                                                                              'against. Exits 1 on a regression')
+    args.add_argument('-s', '--seed', dest='seed', type=int, default=350, help='Seed for the uploads')
+    in_ = args.parse_args()
+    test = LoadTest(LoadTest.parse_mix(in_.mix) if in_.mix else None, in_.seed)
+    send = LoadTest.over_http(in_.url.rstrip('/')) if in_.url else LoadTest.in_process()
+    start = perf_counter()
+    samples = test.run(send, in_.users, in_.duration, in_.requests)
+    seconds = perf_counter() - start
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    results = {'commit': commit, 'time': time(), 'python': platform.python_version(),
+               'target': in_.url or 'in-process', 'users': in_.users, 'seconds': seconds, 'mix': test.mix,
+               'scenarios': LoadTest.summarize(samples, seconds), 'peak_rss_kib': LoadTest.peak_rss(in_.master)}
+    baseline = None
+    if in_.baseline:
+        with open(in_.baseline, 'r') as file:
+            baseline = json.load(file)
+    print(LoadTest.report(results, baseline))
+    if in_.output:
+        with open(in_.output, 'w') as file:
+            json.dump(results, file, indent=1, sort_keys=True)
+    regressions = LoadTest.compare(results, baseline) if baseline else []
+    for regression in regressions:
+        print('Regression: ' + regression)
+    sys.exit(1 if regressions else 0)
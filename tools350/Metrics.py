@@ -0,0 +1,314 @@
+import argparse as ap
+import mmap
+import os
+import re
+import struct
+from collections import defaultdict
+from threading import Lock
+from typing import *
+
+
+class Family(NamedTuple):
+    """
+    A metric, as declared to Prometheus
+    """
+    type: str  # counter, gauge or histogram
+    help: str
+    buckets: Tuple[float, ...] = ()  # Upper bounds of the buckets of a histogram, without +Inf
+
+
+class Metrics:
+    """
+    Server metrics shared by every process, in the Prometheus text format. Each process adds to a file of its own in
+    the metrics directory, mapped into memory, and a scrape sums the files of every process, so one scrape sees the
+    whole server whichever worker answers it. Counts of processes that have exited are kept, except for gauges.
+
+    The directory is passed on through the environment, so processes started by the server, like the assembler's
+    worker pool, record into it too. Until a directory is configured, recording does nothing.
+    """
+
+    ENVIRONMENT = 'TOOLS350_METRICS_DIR'
+
+    LATENCY = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+    SIZES = (1 << 10, 4 << 10, 16 << 10, 64 << 10, 256 << 10, 1 << 20, 4 << 20, 16 << 20)
+
+    FAMILIES = {
+        'tools350_requests_total': Family('counter', 'Requests handled, by view and status code'),
+        'tools350_request_seconds': Family('histogram', 'Time taken to handle a request, including streaming the '
+                                                        'response, by view', LATENCY),
+        'tools350_requests_in_flight': Family('gauge', 'Requests being handled, by view'),
+        'tools350_upload_bytes': Family('histogram', 'Size of request bodies, by view', SIZES),
+        'tools350_response_bytes': Family('histogram', 'Size of response bodies, by view', SIZES),
+        'tools350_assembler_lines_total': Family('counter', 'Lines of assembly read'),
+        'tools350_assembler_seconds_total': Family('counter', 'Time spent assembling files. Lines per second is the '
+                                                              'rate of tools350_assembler_lines_total over the rate '
+                                                              'of this'),
+        'tools350_admission_wait_seconds': Family('histogram', 'Time requests waited for capacity, by pool', LATENCY),
+        'tools350_admission_rejected_total': Family('counter', 'Requests turned away as their pool was busy, by pool'),
+        'tools350_cache_hits_total': Family('counter', 'Cache lookups that found an entry, by cache'),
+        'tools350_cache_misses_total': Family('counter', 'Cache lookups that found nothing, by cache'),
+    }
+
+    INITIAL_BYTES = 1 << 16  # Size of a new file, doubled whenever it fills up
+
+    _lock = Lock()
+    _pid: Optional[int] = None  # Process the file is open in. A forked child opens its own
+    _file: Optional[mmap.mmap] = None
+    _offsets: Dict[str, int] = {}  # Sample -> offset of its value in the file
+
+    @classmethod
+    def configure(cls, directory: Optional[str], clear: bool = False):
+        """
+        :param directory: Directory to keep the files in, created if needed. None to stop recording
+        :param clear: Whether to drop the file of this process, left by an earlier process that had the same pid, like
+        one of the last run of the server. The files of other processes are never touched
+        :return: None
+        """
+        with Metrics._lock:
+            Metrics._pid = None  # Opened again in the new directory on next use
+        if directory is None:
+            os.environ.pop(Metrics.ENVIRONMENT, None)
+            return
+        os.makedirs(directory, exist_ok=True)
+        if clear:
+            try:
+                os.remove(os.path.join(directory, '{}{}'.format(os.getpid(), Metrics._EXTENSION)))
+            except FileNotFoundError:
+                pass
+        os.environ[Metrics.ENVIRONMENT] = directory
+
+    @classmethod
+    def clear(cls, directory: str):
+        """
+        Drop everything recorded in the directory, by every process. Only safe before any process of the server starts
+        recording, so it is run once, by the uWSGI master, rather than by each worker
+        :param directory: Directory the files are kept in
+        :return: None
+        """
+        if not os.path.isdir(directory):
+            return
+        for entry in os.scandir(directory):
+            if entry.name.endswith(Metrics._EXTENSION):
+                os.remove(entry.path)
+
+    @classmethod
+    def inc(cls, name: str, labels: Mapping[str, str] = None, amount: float = 1):
+        """
+        :param name: Counter or gauge, a key of FAMILIES
+        :param labels: Labels of the sample
+        :param amount: Amount to add, negative to decrease a gauge
+        :return: None
+        """
+        if Metrics.ENVIRONMENT in os.environ:
+            Metrics._add([(Metrics.sample(name, labels), amount)])
+
+    @classmethod
+    def observe(cls, name: str, value: float, labels: Mapping[str, str] = None):
+        """
+        :param name: Histogram, a key of FAMILIES
+        :param value: Value observed
+        :param labels: Labels of the sample, other than le
+        :return: None
+        """
+        if Metrics.ENVIRONMENT not in os.environ:
+            return
+        labels = dict(labels or {})
+        updates = [(Metrics.sample(name + '_sum', labels), value), (Metrics.sample(name + '_count', labels), 1)]
+        for bound in Metrics.FAMILIES[name].buckets + (float('inf'),):
+            if value <= bound:
+                labels['le'] = Metrics._number(bound)
+                updates.append((Metrics.sample(name + '_bucket', labels), 1))
+        Metrics._add(updates)
+
+    @classmethod
+    def sample(cls, name: str, labels: Mapping[str, str] = None) -> str:
+        """
+        :return: The sample as written in the text format, like name{label="value"}
+        """
+        if not labels:
+            return name
+        return '{}{{{}}}'.format(name, ','.join('{}="{}"'.format(k, str(v).replace('\\', r'\\').replace('"', r'\"')
+                                                                   .replace('\n', r'\n')) for k, v in labels.items()))
+
+    @classmethod
+    def collect(cls, directory: str = None) -> Dict[str, float]:
+        """
+        :param directory: Metrics directory, defaults to the configured one
+        :return: Every sample, summed over the processes
+        """
+        directory = directory or os.environ.get(Metrics.ENVIRONMENT)
+        ret = defaultdict(float)
+        if directory is None:
+            return ret
+        for entry in os.scandir(directory):
+            if not entry.name.endswith(Metrics._EXTENSION):
+                continue
+            alive = Metrics._alive(int(entry.name[:-len(Metrics._EXTENSION)]))
+            try:
+                with open(entry.path, 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            for sample, value in Metrics._read(data):
+                if alive or Metrics._family(sample).type != 'gauge':
+                    ret[sample] += value
+        return ret
+
+    @classmethod
+    def render(cls, directory: str = None) -> str:
+        """
+        :param directory: Metrics directory, defaults to the configured one
+        :return: Every metric, in the Prometheus text format
+        """
+        families = defaultdict(list)
+        for sample, value in Metrics.collect(directory).items():
+            families[Metrics._name(sample)].append((sample, value))
+        lines = []
+        for name, family in Metrics.FAMILIES.items():
+            if name not in families:
+                continue
+            lines.append('# HELP {} {}'.format(name, family.help))
+            lines.append('# TYPE {} {}'.format(name, family.type))
+            for sample, value in sorted(families[name], key=Metrics._order):
+                lines.append('{} {}'.format(sample, Metrics._number(value)))
+        return '\n'.join(lines) + '\n'
+
+    @classmethod
+    def _add(cls, updates: Iterable[Tuple[str, float]]):
+        with Metrics._lock:
+            if Metrics._pid != os.getpid():
+                Metrics._open()
+            file = Metrics._file
+            for sample, amount in updates:
+                offset = Metrics._offsets.get(sample)
+                if offset is None:
+                    offset = Metrics._append(sample)
+                    file = Metrics._file
+                value, = Metrics._VALUE.unpack_from(file, offset)
+                Metrics._VALUE.pack_into(file, offset, value + amount)
+
+    @classmethod
+    def _forked(cls):
+        Metrics._lock = Lock()  # In case the fork happened while another thread held it
+        Metrics._pid = None
+
+    @classmethod
+    def _open(cls):
+        """
+        Open the file of this process, picking up what it already holds
+        """
+        path = os.path.join(os.environ[Metrics.ENVIRONMENT], '{}{}'.format(os.getpid(), Metrics._EXTENSION))
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < Metrics.INITIAL_BYTES:
+                os.ftruncate(fd, Metrics.INITIAL_BYTES)
+            Metrics._file = mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+        Metrics._pid = os.getpid()
+        Metrics._offsets = {sample: offset for sample, offset in Metrics._entries(Metrics._file)}
+
+    @classmethod
+    def _append(cls, sample: str) -> int:
+        """
+        :return: Offset of the value of the new sample
+        """
+        key = sample.encode('utf-8')
+        size = 8 + (len(key) + 7) // 8 * 8 + 8  # Length, key padded to keep the values aligned, value
+        used, = Metrics._USED.unpack_from(Metrics._file, 0)
+        used = used or Metrics._USED.size
+        if used + size > len(Metrics._file):
+            length = len(Metrics._file)
+            while used + size > length:
+                length *= 2
+            with open(os.path.join(os.environ[Metrics.ENVIRONMENT], '{}{}'.format(os.getpid(), Metrics._EXTENSION)),
+                      'r+b') as f:
+                f.truncate(length)
+                Metrics._file.close()
+                Metrics._file = mmap.mmap(f.fileno(), 0)
+        struct.pack_into('<Q{}s'.format(size - 16), Metrics._file, used, len(key), key)
+        Metrics._VALUE.pack_into(Metrics._file, used + size - 8, 0.0)
+        Metrics._USED.pack_into(Metrics._file, 0, used + size)  # Last, so readers never see a half written entry
+        Metrics._offsets[sample] = used + size - 8
+        return used + size - 8
+
+    @classmethod
+    def _entries(cls, data) -> Iterator[Tuple[str, int]]:
+        """
+        :return: (sample, offset of its value) for each entry of a file
+        """
+        used, = Metrics._USED.unpack_from(data, 0)
+        offset = Metrics._USED.size
+        while offset < used:
+            length, = Metrics._USED.unpack_from(data, offset)
+            key = bytes(data[offset + 8:offset + 8 + length]).decode('utf-8')
+            offset += 8 + (length + 7) // 8 * 8 + 8
+            yield key, offset - 8
+
+    @classmethod
+    def _read(cls, data: bytes) -> Iterator[Tuple[str, float]]:
+        if len(data) < Metrics._USED.size:
+            return
+        for sample, offset in Metrics._entries(data):
+            yield sample, Metrics._VALUE.unpack_from(data, offset)[0]
+
+    @classmethod
+    def _alive(cls, pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    @classmethod
+    def _name(cls, sample: str) -> str:
+        """
+        :return: Name of the family the sample belongs to
+        """
+        name = sample.partition('{')[0]
+        if name not in Metrics.FAMILIES:
+            for suffix in ('_bucket', '_sum', '_count'):
+                if name.endswith(suffix) and name[:-len(suffix)] in Metrics.FAMILIES:
+                    return name[:-len(suffix)]
+        return name
+
+    @classmethod
+    def _family(cls, sample: str) -> Family:
+        return Metrics.FAMILIES.get(Metrics._name(sample), Family('untyped', ''))
+
+    @classmethod
+    def _order(cls, item: Tuple[str, float]) -> tuple:
+        """
+        Sort key keeping the samples of a histogram together, with its buckets in increasing order
+        """
+        le = Metrics._LE.search(item[0])
+        name, _, labels = Metrics._LE.sub('', item[0]).partition('{')
+        return (labels, Metrics._SUFFIXES.get(name.rpartition('_')[2], 0),
+                float(le.group(1)) if le is not None else 0.0)
+
+    @classmethod
+    def _number(cls, value: float) -> str:
+        if value == float('inf'):
+            return '+Inf'
+        return str(int(value)) if value == int(value) else repr(value)
+
+    _EXTENSION = '.metrics'
+    _USED = struct.Struct('<Q')  # Bytes of the file in use, at its start, and the length of each key
+    _VALUE = struct.Struct('<d')
+    _LE = re.compile(r',?le="([^"]*)"')
+    _SUFFIXES = {'bucket': 0, 'sum': 1, 'count': 2}
+
+
+if hasattr(os, 'register_at_fork'):  # Not on Windows
+    os.register_at_fork(after_in_child=Metrics._forked)
+
+
+if __name__ == '__main__':
+    from tools350 import settings
+
+    args = ap.ArgumentParser(description='Drop the metrics of the last run of the server. Run once, before it starts')
+    args.parse_args()
+    if settings.METRICS_DIR is not None:
+        Metrics.clear(settings.METRICS_DIR)
@@ -0,0 +1,88 @@
+from time import perf_counter
+from typing import *
+
+from django.http import HttpRequest, HttpResponse
+
+from tools350 import settings
+from tools350.Metrics import Metrics
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, status, upload size and response size of every request in Metrics, labelled with the name of
+    the view that handled it, along with the requests in flight. For a streamed response, the latency and size are
+    recorded once the stream is done. Requests answered before reaching a view, like static files, are labelled
+    static or other. Off when METRICS_DIR is None.
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]):
+        self.get_response = get_response
+        Metrics.configure(settings.METRICS_DIR)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if settings.METRICS_DIR is None:
+            return self.get_response(request)
+        start = perf_counter()
+        request.metrics_view = None
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            MetricsMiddleware._leave(request)
+            raise
+        if response.streaming:
+            sent = [0]  # Bytes streamed so far
+            response.streaming_content = MetricsMiddleware._stream(request, response, response.streaming_content, start,
+                                                                   sent)
+            # Also on close, as the stream is never started if the client goes away before it is read
+            response._resource_closers.append(lambda: MetricsMiddleware._finish(request, response, start, sent[0]))
+        else:
+            MetricsMiddleware._finish(request, response, start, len(response.content))
+        return response
+
+    def process_view(self, request: HttpRequest, view_func: Callable, view_args: list, view_kwargs: dict):
+        if settings.METRICS_DIR is not None:
+            match = request.resolver_match
+            request.metrics_view = (match.url_name if match is not None else None) or view_func.__name__
+            Metrics.inc('tools350_requests_in_flight', {'view': request.metrics_view})
+
+    @classmethod
+    def _stream(cls, request: HttpRequest, response: HttpResponse, content: Iterable[bytes], start: float,
+                sent: List[int]) -> Iterator[bytes]:
+        try:
+            for chunk in content:
+                sent[0] += len(chunk)
+                yield chunk
+        finally:
+            MetricsMiddleware._finish(request, response, start, sent[0])
+
+    @classmethod
+    def _finish(cls, request: HttpRequest, response: HttpResponse, start: float, size: int):
+        """
+        Record the request once it is done. Only the first call counts, as a stream both ends and is closed
+        """
+        if getattr(request, 'metrics_finished', False):
+            return
+        request.metrics_finished = True
+        MetricsMiddleware._leave(request)
+        labels = {'view': MetricsMiddleware._view(request)}
+        Metrics.observe('tools350_request_seconds', perf_counter() - start, labels)
+        Metrics.observe('tools350_response_bytes', size, labels)
+        try:
+            uploaded = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            uploaded = 0
+        if uploaded:
+            Metrics.observe('tools350_upload_bytes', uploaded, labels)
+        Metrics.inc('tools350_requests_total', dict(labels, code=str(response.status_code)))
+
+    @classmethod
+    def _leave(cls, request: HttpRequest):
+        if getattr(request, 'metrics_view', None) is not None:
+            Metrics.inc('tools350_requests_in_flight', {'view': request.metrics_view}, -1)
+
+    @classmethod
+    def _view(cls, request: HttpRequest) -> str:
+        view = getattr(request, 'metrics_view', None)
+        if view is not None:
+            return view
+        return 'static' if request.path.startswith(settings.STATIC_URL) else 'other'
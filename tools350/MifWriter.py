@@ -0,0 +1,79 @@
+from typing import *
+
+
+class MifWriter:
+    """
+    Writes memory initialization files for Quartus, shared by every tool. Entries are produced lazily, and each run of
+    identical words is collapsed into a single range entry, so solid backgrounds and padding cost one line each.
+    """
+
+    @classmethod
+    def header(cls, depth: int, width: int, radix: str = 'HEX') -> str:
+        """
+        :param depth: Number of words in the memory
+        :param width: Width of each word, in bits
+        :param radix: Radix the words are written in: BIN, HEX, OCT, DEC or UNS
+        :return: Header, up to and including CONTENT BEGIN
+        """
+        return MifWriter._HEADER.format(depth, width, radix)
+
+    @classmethod
+    def entry(cls, first: int, last: int, word: str) -> str:
+        """
+        :param first: First address holding the word
+        :param last: Last address holding the word
+        :param word: Word, in the data radix
+        :return: Entry for the addresses, as a range if there is more than one
+        """
+        if first == last:
+            return MifWriter._ENTRY.format(first, word)
+        return MifWriter._RANGE.format(first, last, word)
+
+    @classmethod
+    def entries(cls, words: Iterable[str], start: int = 0, depth: int = None, fill: str = None) -> Iterator[str]:
+        """
+        :param words: Word at each address, in the data radix
+        :param start: Address of the first word
+        :param depth: Number of words in the memory. With a fill, addresses past the last word up to the depth hold
+        the fill
+        :param fill: Word for the addresses past the last word
+        :return: Entry for each run of identical words
+        """
+        previous, first, address = None, start, start
+        for word in words:
+            if word != previous:
+                if previous is not None:
+                    yield MifWriter.entry(first, address - 1, previous)
+                previous, first = word, address
+            address += 1
+        if fill is not None and depth is not None and address < depth:
+            if previous != fill:
+                if previous is not None:
+                    yield MifWriter.entry(first, address - 1, previous)
+                previous, first = fill, address
+            address = depth
+        if previous is not None:
+            yield MifWriter.entry(first, address - 1, previous)
+
+    @classmethod
+    def footer(cls) -> str:
+        return MifWriter._FOOTER
+
+    @classmethod
+    def write(cls, words: Iterable[str], depth: int, width: int, radix: str = 'HEX', fill: str = None) -> Iterator[str]:
+        """
+        :param words: Word at each address from 0, in the data radix
+        :param depth: Number of words in the memory
+        :param width: Width of each word, in bits
+        :param radix: Radix the words are written in
+        :param fill: Word for the addresses past the last word, if any
+        :return: The whole MIF, in pieces
+        """
+        yield MifWriter.header(depth, width, radix)
+        yield from MifWriter.entries(words, 0, depth, fill)
+        yield MifWriter._FOOTER
+
+    _HEADER = "DEPTH = {};\nWIDTH = {};\nADDRESS_RADIX = DEC;\nDATA_RADIX = {};\nCONTENT\nBEGIN\n"
+    _ENTRY = "{:04d} : {};\n"
+    _RANGE = "[{:04d}..{:04d}] : {};\n"
+    _FOOTER = "END;\n"
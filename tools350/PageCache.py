@@ -0,0 +1,137 @@
+import gzip
+import os
+from hashlib import sha256
+from threading import Lock
+from typing import *
+
+from django.http import HttpRequest, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+from tools350.Metrics import Metrics
+
+try:
+    import brotli
+except ImportError:  # Optional. Pages are only offered gzipped without it
+    brotli = None
+
+
+class Page(NamedTuple):
+    """
+    A page as loaded from disk, with each encoding it can be sent in
+    """
+    mtime: int  # Nanoseconds, of the file the page was loaded from
+    size: int
+    modified: int  # Seconds, for Last-Modified
+    etag: str  # Hash of the content, unquoted
+    bodies: Dict[str, bytes]  # Content-Encoding ('' for none) -> body. Encodings that don't save space are left out
+
+
+class PageCache:
+    """
+    Pages read from disk once per process and kept in memory, reloaded when the file's mtime or size changes. Pages are
+    served with an ETag and Last-Modified, answering conditional requests with a 304, and gzip or brotli compressed
+    when the client accepts it. Compressed bodies are made once, when the page is loaded.
+    """
+
+    CONTENT_TYPE = 'text/html; charset=utf-8'
+    GZIP_LEVEL = 9
+    BROTLI_QUALITY = 11
+
+    _LABELS = {'cache': 'pages'}
+
+    def __init__(self, roots: Sequence[str]):
+        """
+        :param roots: Directories to look pages up in, in order. Duplicates are only searched once
+        """
+        self.roots = list(dict.fromkeys(roots))
+        self._pages: Dict[Tuple[str, ...], Tuple[str, Page]] = {}
+        self._lock = Lock()
+
+    def get(self, path: Sequence[str]) -> Page:
+        """
+        :param path: Path of the page under a root
+        :return: The page, loaded again if the file changed since it was last loaded
+        :raises FileNotFoundError: The page is in none of the roots
+        """
+        path = tuple(path)
+        cached = self._pages.get(path)
+        if cached is not None:
+            file, page = cached
+            try:
+                stat = os.stat(file)
+                if stat.st_mtime_ns == page.mtime and stat.st_size == page.size:
+                    Metrics.inc('tools350_cache_hits_total', PageCache._LABELS)
+                    return page
+            except FileNotFoundError:
+                pass
+        Metrics.inc('tools350_cache_misses_total', PageCache._LABELS)
+        with self._lock:  # Loaded by one thread at a time, so a page changed under load is compressed once
+            for root in self.roots:
+                file = os.path.join(root, *path)
+                try:
+                    page = PageCache._load(file)
+                except FileNotFoundError:
+                    continue
+                self._pages[path] = file, page
+                return page
+        self._pages.pop(path, None)
+        raise FileNotFoundError(os.path.join(*path))
+
+    def respond(self, request: HttpRequest, path: Sequence[str]) -> HttpResponse:
+        """
+        :param request: Request for the page
+        :param path: Path of the page under a root
+        :return: The page in the best encoding the request accepts, or a 304 if the client's copy is current
+        :raises FileNotFoundError: The page is in none of the roots
+        """
+        page = self.get(path)
+        encoding = PageCache.choose(request.META.get('HTTP_ACCEPT_ENCODING', ''), page.bodies)
+        etag = '"{}{}"'.format(page.etag, '-' + encoding if encoding else '')
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            current = etag in parse_etags(if_none_match) or '*' in parse_etags(if_none_match)
+        else:
+            since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+            current = since is not None and page.modified <= since
+        response = HttpResponseNotModified() if current else HttpResponse(page.bodies[encoding],
+                                                                          content_type=PageCache.CONTENT_TYPE)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(page.modified)
+        response['Vary'] = 'Accept-Encoding'
+        if encoding and not current:
+            response['Content-Encoding'] = encoding
+        return response
+
+    @classmethod
+    def choose(cls, accept_encoding: str, bodies: Mapping[str, bytes]) -> str:
+        """
+        :param accept_encoding: Accept-Encoding header of the request
+        :param bodies: Encodings available
+        :return: Smallest available encoding the header accepts, '' for none
+        """
+        accepted = {}
+        for item in accept_encoding.split(','):
+            name, _, params = item.partition(';')
+            q = 1.0
+            for param in params.split(';'):
+                key, _, value = param.partition('=')
+                if key.strip() == 'q':
+                    try:
+                        q = float(value)
+                    except ValueError:
+                        q = 0.0
+            accepted[name.strip().lower()] = q
+        options = [x for x in bodies if x and accepted.get(x, accepted.get('*', 0.0)) > 0]
+        return min(options, key=lambda x: len(bodies[x]), default='')
+
+    @classmethod
+    def _load(cls, file: str) -> Page:
+        with open(file, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            body = f.read()
+        bodies = {'': body}
+        compressed = {'gzip': gzip.compress(body, PageCache.GZIP_LEVEL, mtime=0)}
+        if brotli is not None:
+            compressed['br'] = brotli.compress(body, quality=PageCache.BROTLI_QUALITY)
+        bodies.update((k, v) for k, v in compressed.items() if len(v) < len(body))
+        return Page(stat.st_mtime_ns, stat.st_size, int(stat.st_mtime), sha256(body).hexdigest()[:32], bodies)
@@ -0,0 +1,120 @@
+from contextlib import nullcontext
+from contextvars import ContextVar
+from time import perf_counter
+from typing import *
+
+
+class Spans:
+    """
+    Wall time spent in each named stage of a request. Stages are timed with Spans.span and Spans.iterate, which record
+    into the Spans active in the current context. With no Spans active they cost a single context lookup, so they can
+    be left in place when timing is turned off. Time spent in a stage more than once, like once per file, is summed.
+    """
+
+    _current: ContextVar = ContextVar('spans', default=None)
+    _NOOP = nullcontext()
+
+    def __init__(self):
+        self.totals: Dict[str, List[float]] = {}  # Name of the stage -> [seconds, times entered]
+
+    @classmethod
+    def span(cls, name: str) -> ContextManager:
+        """
+        :param name: Name of the stage
+        :return: Context manager timing the stage into the active Spans
+        """
+        spans = cls._current.get()
+        return Spans._NOOP if spans is None else _Span(spans, name)
+
+    @classmethod
+    def iterate(cls, name: str, iterable: Iterable) -> Iterable:
+        """
+        Time a lazy stage: only the time spent producing each item is counted, not the time spent by the consumer.
+        :param name: Name of the stage
+        :param iterable: Items produced by the stage
+        :return: The same items
+        """
+        spans = cls._current.get()
+        return iterable if spans is None else spans._iterate(name, iterable)
+
+    @classmethod
+    def active(cls) -> Optional["Spans"]:
+        """
+        :return: Spans of the current context, None if timing is off
+        """
+        return cls._current.get()
+
+    def bind(self, iterable: Iterable) -> Iterator:
+        """
+        Make these Spans active while each item is produced, for work that continues after the request has been
+        handled, like a streamed response.
+        :param iterable: Items to produce
+        :return: The same items
+        """
+        iterator = iter(iterable)
+        while True:
+            token = Spans._current.set(self)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                Spans._current.reset(token)
+            yield item
+
+    def __enter__(self) -> "Spans":
+        self._tokens = getattr(self, '_tokens', [])
+        self._tokens.append(Spans._current.set(self))
+        return self
+
+    def __exit__(self, *exc):
+        Spans._current.reset(self._tokens.pop())
+
+    def add(self, name: str, seconds: float, count: int = 1):
+        """
+        :param name: Name of the stage
+        :param seconds: Time spent in the stage
+        :param count: Times the stage was entered
+        :return: None
+        """
+        total = self.totals.setdefault(name, [0.0, 0])
+        total[0] += seconds
+        total[1] += count
+
+    def to_dict(self) -> Dict[str, dict]:
+        """
+        :return: {name: {'ms', 'count'}} for every stage
+        """
+        return {name: {'ms': round(seconds * 1000, 3), 'count': count}
+                for name, (seconds, count) in self.totals.items()}
+
+    def server_timing(self) -> str:
+        """
+        :return: Value of a Server-Timing header listing every stage
+        """
+        return ', '.join('{};dur={:.2f}{}'.format(name, seconds * 1000, ';desc="x{}"'.format(count) if count > 1 else '')
+                         for name, (seconds, count) in self.totals.items())
+
+    def _iterate(self, name: str, iterable: Iterable) -> Iterator:
+        seconds = 0.0
+        start = perf_counter()
+        for item in iterable:
+            seconds += perf_counter() - start
+            yield item
+            start = perf_counter()
+        self.add(name, seconds + perf_counter() - start)
+
+
+class _Span:
+
+    __slots__ = ('_spans', '_name', '_start')
+
+    def __init__(self, spans: Spans, name: str):
+        self._spans = spans
+        self._name = name
+
+    def __enter__(self):
+        self._start = perf_counter()
+
+    def __exit__(self, *exc):
+        self._spans.add(self._name, perf_counter() - self._start)
@@ -0,0 +1,99 @@
+import cProfile
+import json
+import logging
+import os
+import tracemalloc
+from datetime import datetime
+from random import random
+from time import perf_counter
+from typing import *
+from uuid import uuid4
+
+from django.http import HttpRequest, HttpResponse
+
+from tools350 import settings
+from tools350.Spans import Spans
+
+_logger = logging.getLogger(__name__)
+
+
+class TimingMiddleware:
+    """
+    Times the stages of each request with Spans, reporting them in a Server-Timing header and a JSON log line. For a
+    streamed response, the header only holds the stages finished before streaming started, and the log line is written
+    once the stream is done. A sample of requests is also run under cProfile or tracemalloc, with the dumps written to
+    PROFILE_DIR. Off entirely when TIMING_ENABLED is off and nothing is sampled.
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]):
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        profile = cProfile.Profile() if random() < settings.PROFILE_SAMPLE_RATE else None
+        trace = random() < settings.TRACEMALLOC_SAMPLE_RATE and not tracemalloc.is_tracing()
+        if not settings.TIMING_ENABLED and profile is None and not trace:
+            return self.get_response(request)
+        if trace:
+            tracemalloc.start()
+        spans = Spans()
+        start = perf_counter()
+        with spans:
+            if profile is not None:
+                profile.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profile is not None:
+                    profile.disable()
+        spans.add('view', perf_counter() - start)
+        if settings.TIMING_ENABLED:
+            response['Server-Timing'] = spans.server_timing()
+        if response.streaming:
+            response.streaming_content = TimingMiddleware._stream(request, response, response.streaming_content, spans,
+                                                                  profile, trace)
+        else:
+            TimingMiddleware._finish(request, response, spans, profile, trace)
+        return response
+
+    @classmethod
+    def _stream(cls, request: HttpRequest, response: HttpResponse, content: Iterable[bytes], spans: Spans,
+                profile: Optional[cProfile.Profile], trace: bool) -> Iterator[bytes]:
+        start = perf_counter()
+        try:
+            yield from spans.bind(content if profile is None else TimingMiddleware._profiled(profile, content))
+        finally:
+            spans.add('stream', perf_counter() - start)
+            TimingMiddleware._finish(request, response, spans, profile, trace)
+
+    @classmethod
+    def _profiled(cls, profile: cProfile.Profile, iterable: Iterable) -> Iterator:
+        iterator = iter(iterable)
+        while True:
+            profile.enable()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                profile.disable()
+            yield item
+
+    @classmethod
+    def _finish(cls, request: HttpRequest, response: HttpResponse, spans: Spans, profile: Optional[cProfile.Profile],
+                trace: bool):
+        record = {'method': request.method, 'path': request.path, 'status': response.status_code,
+                  'spans': spans.to_dict()}
+        if profile is not None or trace:
+            os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+            name = os.path.join(settings.PROFILE_DIR, '{:%Y%m%d-%H%M%S}-{}-{}'.format(
+                datetime.now(), request.path.strip('/').replace('/', '_') or 'index', uuid4().hex[:8]))
+            if profile is not None:
+                profile.dump_stats(name + '.prof')
+                record['profile'] = name + '.prof'
+            if trace:
+                tracemalloc.take_snapshot().dump(name + '.tracemalloc')
+                record['peak_kib'] = round(tracemalloc.get_traced_memory()[1] / 1024)
+                record['tracemalloc'] = name + '.tracemalloc'
+                tracemalloc.stop()
+        if settings.TIMING_ENABLED or profile is not None or trace:
+            _logger.info(json.dumps(record, sort_keys=True))
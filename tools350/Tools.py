@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+import argparse as ap
+import os
+import re
+import subprocess
+import sys
+from importlib import import_module
+from threading import RLock
+from types import SimpleNamespace
+from typing import *
+
+
+class Tool(NamedTuple):
+    """
+    How to load a tool
+    """
+    exports: Dict[str, str]  # Name -> module:attribute, for everything the server uses from the tool
+    warm: Tuple[str, ...] = ()  # module:attribute of functions building the tool's caches, called once it is imported
+
+
+class ImportTime(NamedTuple):
+    """
+    Cost of importing a module, as reported by python -X importtime
+    """
+    module: str
+    own: int  # Microseconds spent in the module itself
+    cumulative: int  # Microseconds including the modules it imported first
+    depth: int  # How deep in the imports of the tool it was first imported
+
+
+class Tools:
+    """
+    Registry of the tools the server runs, each imported the first time it is used rather than when the server starts,
+    so a worker only pays for the dependencies of the tools it serves. Tools can also be warmed ahead of time, like in
+    the uWSGI master before it forks its workers, which then share the imported modules and caches copy-on-write.
+    """
+
+    TOOLS = {
+        'assembler': Tool({
+            'Assembler': 'tools350.assembler.Assembler:Assembler',
+            'AssemblySession': 'tools350.assembler.AssemblySession:AssemblySession',
+            'OutputFormat': 'tools350.assembler.OutputFormat:OutputFormat',
+            'ResultCache': 'tools350.assembler.ResultCache:ResultCache',
+        }, ('tools350.assembler.parsing.ISACache:ISACache.get',)),  # Compiles the base ISA
+        'disassembler': Tool({
+            'Disassembler': 'tools350.assembler.Disassembler:Disassembler',
+            'Simulator': 'tools350.assembler.Simulator:Simulator',
+        }),
+        'jobs': Tool({
+            'JobQueue': 'tools350.JobQueue:JobQueue',
+        }),
+        'im2mif': Tool({
+            'Im2Mif': 'tools350.Im2MIF.Im2Mif:Im2Mif',
+        }),
+    }
+
+    _lock = RLock()
+    _loaded: Dict[str, SimpleNamespace] = {}
+
+    @classmethod
+    def get(cls, name: str) -> SimpleNamespace:
+        """
+        :param name: Name of the tool, a key of TOOLS
+        :return: Everything the tool exports, as attributes. Imported and warmed on first use
+        :raises ImportError: A dependency of the tool is not installed
+        """
+        try:
+            return cls._loaded[name]
+        except KeyError:
+            pass
+        with cls._lock:
+            if name not in cls._loaded:
+                tool = Tools.TOOLS[name]
+                ret = SimpleNamespace(**{k: Tools.resolve(v) for k, v in tool.exports.items()})
+                for warm in tool.warm:
+                    Tools.resolve(warm)()
+                cls._loaded[name] = ret
+            return cls._loaded[name]
+
+    @classmethod
+    def warm(cls, names: Iterable[str]) -> List[str]:
+        """
+        Load tools ahead of their first use.
+        :param names: Names of the tools
+        :return: Names of the tools that could not be loaded, as their dependencies are not installed
+        """
+        ret = []
+        for name in names:
+            try:
+                Tools.get(name)
+            except ImportError:
+                ret.append(name)
+        return ret
+
+    @classmethod
+    def resolve(cls, path: str) -> Any:
+        """
+        :param path: module:attribute, where the attribute can be dotted
+        :return: The attribute, importing its module if needed
+        """
+        module, _, attributes = path.partition(':')
+        ret = import_module(module)
+        for attribute in attributes.split('.'):
+            ret = getattr(ret, attribute)
+        return ret
+
+    @classmethod
+    def import_times(cls, name: str) -> List[ImportTime]:
+        """
+        Import a tool in a new interpreter, timing every module it imports.
+        :param name: Name of the tool
+        :return: Every module imported, in the order they finished importing
+        :raises ImportError: A dependency of the tool is not installed
+        """
+        modules = sorted({x.partition(':')[0] for x in Tools.TOOLS[name].exports.values()})
+        startup = {x.module for x in Tools._import_times('pass')}  # Imported by the interpreter, before the tool
+        return [x for x in Tools._import_times('import ' + ', '.join(modules)) if x.module not in startup]
+
+    @classmethod
+    def _import_times(cls, code: str) -> List[ImportTime]:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([root] + [x for x in [os.environ.get('PYTHONPATH')] if x]))
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], env=env, stdout=subprocess.DEVNULL,
+                                 stderr=subprocess.PIPE, universal_newlines=True)
+        if process.returncode:
+            raise ImportError(process.stderr.strip().splitlines()[-1])
+        ret = []
+        for line in process.stderr.splitlines():
+            match = Tools._IMPORT_TIME.match(line)
+            if match is not None:
+                module = match.group(3)
+                ret.append(ImportTime(module.strip(), int(match.group(1)), int(match.group(2)),
+                                      (len(module) - len(module.lstrip())) // 2))
+        return ret
+
+    _IMPORT_TIME = re.compile(r'import time:\s*(\d+) \|\s*(\d+) \| (.*)$')
+
+
+if __name__ == '__main__':
+    args = ap.ArgumentParser(description='Report what importing each tool costs, module by module, from a cold start')
+    args.add_argument('tools', nargs='*', help='Tools to report on, defaults to all of them. One of: {}'.format(
+        ', '.join(Tools.TOOLS)))
+    args.add_argument('-n', '--top', dest='top', type=int, default=15, help='Most expensive modules to list per tool')
+    in_ = args.parse_args()
+    for tool in in_.tools or Tools.TOOLS:
+        try:
+            times = Tools.import_times(tool)
+        except ImportError as e:
+            print('{}: not importable, {}\n'.format(tool, e))
+            continue
+        print('{}: {:.1f} ms'.format(tool, sum(x.cumulative for x in times if x.depth == 0) / 1000))
+        print('  {:>10} {:>10}  module'.format('own ms', 'total ms'))
+        for x in sorted(times, key=lambda x: -x.own)[:in_.top]:
+            print('  {:10.1f} {:10.1f}  {}'.format(x.own / 1000, x.cumulative / 1000, x.module))
+        print()
@@ -1,81 +1,358 @@
 import json
+import logging
+import sys
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from contextlib import contextmanager
 from io import StringIO, BytesIO
-from typing import List
+from multiprocessing import get_context
+from threading import Lock
+from time import perf_counter
+from typing import List, Sequence, Dict, Tuple, Iterator, Iterable, Union, IO, ContextManager
 from os import path
 
-from tools350.assembler.instruction.InstructionType import InstructionType
-from tools350.assembler.instruction.Instruction import Instruction
+from tools350.assembler.instruction.EncodedInstruction import EncodedInstruction
+from tools350.assembler.instruction.ErrorInstruction import ErrorInstruction
+from tools350.assembler.OutputFormat import OutputFormat
+from tools350.assembler.parsing.Lexer import SourceLine
 from tools350.assembler.parsing.Parser import Parser
-from zipfile import ZipFile
+from tools350.assembler.parsing.Program import Program
+from tools350.assembler.parsing.SymbolTable import SymbolTable
+from tools350.assembler.ZipStream import ZipStream
+from tools350.Metrics import Metrics
+from tools350.Spans import Spans
 
+_logger = logging.getLogger(__name__)
+
+Source = Union[str, IO]  # Path of a file, or a readable text or binary stream read from its start
 
 class Assembler:
 
     FIELDS = ['inst', 'inst-types', 'named-regs']
 
     @classmethod
-    def assemble_all(cls, files: List[str], names: List[str], additional_declarations: dict, is_pipelined=True) -> BytesIO:
+    def assemble_all(cls, files: List[Source], names: List[str], additional_declarations: dict, is_pipelined=True,
+                     workers: int = 0, parallel_files: int = None, timings: Dict[str, float] = None,
+                     output_format: str = 'mif') -> BytesIO:
         """
         Interface of Assembler with other types. Converts MIPS -> Zip[MIF]
-        :param files: MIPS assembly files
+        :param files: MIPS assembly files, as paths or streams. Streams are only sent to the process pool if they can
+        be pickled, like a BytesIO
         :param names: Names of the MIPS file before hashing so the files in the zip have the same name as their
          matching MIPS
-        :param additional_declarations:
+        :param additional_declarations: Declaration files, as paths or streams, keyed by FIELDS
         :param is_pipelined:
+        :param workers: Size of the process pool to assemble on. With fewer than two workers, everything is assembled
+        in the calling thread
+        :param parallel_files: Fewest files worth spreading across the process pool, defaults to PARALLEL_FILES.
+        Smaller uploads are assembled in the calling thread, using the pool only for very large programs
+        :param timings: Optional dict to fill with the wall time taken by each file, in seconds
+        :param output_format: Name of the OutputFormat to write each file in. Formats that can't show errors inline
+        get a '<name>.errors.txt' next to each file with errors in it
         :return:
         """
+        return BytesIO(b''.join(Assembler.stream_all(files, names, additional_declarations, is_pipelined, workers,
+                                                     parallel_files, timings, output_format)))
+
+    @classmethod
+    def stream_all(cls, files: List[Source], names: List[str], additional_declarations: dict, is_pipelined=True,
+                   workers: int = 0, parallel_files: int = None,
+                   timings: Dict[str, float] = None, output_format: str = 'mif') -> Iterator[bytes]:
+        """
+        Same as assemble_all, but the zip is handed out in chunks as it is built, so memory use does not grow with the
+        size or number of files. The declarations are compiled before this returns, so errors in them are raised
+        here. Errors in the assembly are written into the MIFs, as the start of the zip may already be sent by the
+        time they are found. The files must not be removed until the stream is exhausted or closed.
+        :return: The zip, in chunks
+        :raises ValueError: Unknown output format, or one whose words are too narrow for the declared instructions
+        """
+        if output_format not in OutputFormat.names():
+            raise ValueError("Unknown output format {}, expected one of {}".format(
+                output_format, ', '.join(OutputFormat.names())))
+        fmt = OutputFormat.get(output_format)
         parser_ = Parser(Assembler.unpack(additional_declarations, 'named-regs'),
                          Assembler.unpack(additional_declarations, 'inst'),
                          Assembler.unpack(additional_declarations, 'inst-types'))
-        tmp = [cls.assemble(f, parser_, is_pipelined) for f in files]
-        return Assembler._zip(names, tmp)
+        fmt.check(parser_.get_isa().get_encoder())
+        executor = Assembler.get_executor(workers) if workers > 1 else None
+        parallel_files = Assembler.PARALLEL_FILES if parallel_files is None else parallel_files
+        if executor is not None and len(files) >= parallel_files:
+            mifs = Assembler._assemble_parallel(files, names, parser_, is_pipelined, executor, 2 * workers, timings,
+                                                fmt)
+        else:
+            mifs = Assembler._assemble_serial(files, names, parser_, is_pipelined, executor, timings, fmt)
+        return ZipStream.zip(Assembler._entries(names, mifs, fmt))
+
+    @classmethod
+    def _entries(cls, names: List[str], mifs: Iterable[Tuple[Iterable, List[dict]]],
+                 fmt: OutputFormat) -> Iterator[Tuple[str, Iterable]]:
+        """
+        :return: Name and pieces of each file in the zip, followed by its errors for formats that can't show them
+        """
+        for name, (mif, errors) in zip(names, mifs):
+            yield Assembler.fix_filename(name, fmt.extension), mif
+            if errors:  # Only filled in once the file has been written out
+                yield Assembler.fix_filename(name, 'errors.txt'), (
+                    Assembler._ERROR_LINE.format(e['address'], e['line'] + 1, e['text'], e['error']) for e in errors)
+
+    @classmethod
+    def _assemble_serial(cls, files: List[Source], names: List[str], parser_: Parser, is_pipelined: bool,
+                         executor: Executor, timings: Dict[str, float], fmt: OutputFormat) -> Iterator[Tuple[Iterator,
+                                                                                                        List[dict]]]:
+        """
+        :return: Each file, produced lazily, with the list its errors are added to as it is produced. The list is None
+        when the format shows errors inline
+        """
+        for file, name in zip(files, names):
+            errors = None if fmt.inline_errors else []
+            yield Assembler._timed(Assembler.iter_mif(file, parser_, is_pipelined, executor, errors, fmt), name,
+                                   'serial', len(files), timings), errors
+
+    @classmethod
+    def _assemble_parallel(cls, files: List[Source], names: List[str], parser_: Parser, is_pipelined: bool,
+                           executor: Executor, window: int, timings: Dict[str, float] = None,
+                           fmt: OutputFormat = None) -> Iterator[Tuple[list, List[dict]]]:
+        """
+        Assemble whole files on the executor, keeping at most window files in flight so that finished MIFs don't pile
+        up faster than they are sent.
+        :return: Each MIF in file order, with its errors if the format can't show them
+        """
+        pending = deque()
+        for file, name in zip(files, names):
+            pending.append((name, executor.submit(Assembler._assemble_timed, file, parser_, is_pipelined, fmt)))
+            if len(pending) >= window:
+                yield Assembler._collect(*pending.popleft(), len(files), timings)
+        while pending:
+            yield Assembler._collect(*pending.popleft(), len(files), timings)
+
+    @classmethod
+    def _collect(cls, name: str, future: Future, count: int,
+                 timings: Dict[str, float] = None) -> Tuple[list, List[dict]]:
+        mif, errors, seconds = future.result()
+        Assembler._record(name, seconds, 'parallel', count, timings)
+        return [mif], errors
+
+    @classmethod
+    def _timed(cls, mif: Iterator[Union[str, bytes]], name: str, mode: str, count: int,
+               timings: Dict[str, float] = None) -> Iterator[Union[str, bytes]]:
+        """
+        Pass the lines of a MIF through, timing how long it takes to produce them. Time spent by the consumer between
+        lines is not counted.
+        """
+        seconds = 0.0
+        start = perf_counter()
+        for line in mif:
+            seconds += perf_counter() - start
+            yield line
+            start = perf_counter()
+        Assembler._record(name, seconds + perf_counter() - start, mode, count, timings)
+
+    @classmethod
+    def _record(cls, name: str, seconds: float, mode: str, count: int, timings: Dict[str, float] = None):
+        _logger.info('Assembled %s in %.2f ms (%s, %d files)', name, seconds * 1000, mode, count)
+        Metrics.inc('tools350_assembler_seconds_total', amount=seconds)
+        if timings is not None:
+            timings[name] = seconds
+
+    @classmethod
+    def get_executor(cls, workers: int) -> Executor:
+        """
+        Get the process pool shared by every request in this process, creating it on first use. Workers are spawned
+        rather than forked, as the server process is multithreaded, with the interpreter found by _python.
+        :param workers: Number of worker processes
+        :return: Process pool with the given number of workers
+        """
+        with Assembler._executor_lock:
+            if Assembler._executor is None or Assembler._executor_workers != workers:
+                if Assembler._executor is not None:
+                    Assembler._executor.shutdown(wait=False)
+                context = get_context('spawn')
+                context.set_executable(Assembler._python())
+                Assembler._executor = ProcessPoolExecutor(workers, mp_context=context)
+                Assembler._executor_workers = workers
+            return Assembler._executor
+
+    @classmethod
+    def _python(cls) -> str:
+        """
+        :return: Python interpreter to spawn workers with. Inside uWSGI, sys.executable is the uwsgi binary unless
+        py-sys-executable is set, so the interpreter of the environment uWSGI runs in is looked for instead
+        """
+        if path.basename(sys.executable).lower().startswith('python'):
+            return sys.executable
+        for candidate in (path.join(sys.prefix, 'bin', 'python3'), path.join(sys.prefix, 'bin', 'python'),
+                          path.join(sys.prefix, 'python.exe')):
+            if path.isfile(candidate):
+                return candidate
+        return sys.executable
+
+    @classmethod
+    def shutdown_executor(cls):
+        """
+        Stop the shared process pool, if it was started. It is started again on next use.
+        :return: None
+        """
+        with Assembler._executor_lock:
+            if Assembler._executor is not None:
+                Assembler._executor.shutdown()
+            Assembler._executor = None
+            Assembler._executor_workers = 0
+
+    @classmethod
+    def _assemble_timed(cls, file: Source, parser_: Parser, is_pipelined: bool,
+                        fmt: OutputFormat = None) -> Tuple[Union[str, bytes], List[dict], float]:
+        """
+        :return: The assembled file, the lines that could not be encoded if the format can't show them, and the wall
+        time taken to assemble it, in seconds
+        """
+        fmt = Assembler._MIF if fmt is None else fmt
+        start = perf_counter()
+        errors = None if fmt.inline_errors else []
+        ret = fmt.empty.join(Assembler.iter_mif(file, parser_, is_pipelined, errors=errors, fmt=fmt))
+        return ret, errors, perf_counter() - start
 
     @classmethod
     def unpack(cls, dict_: dict, key: str) -> List[dict]:
         try:
-            with open(dict_[key], 'r') as f:
-                return [json.load(f)]
+            source = dict_[key]
         except KeyError as e:
             return []
+        with Assembler.open_source(source) as f:
+            return [json.loads(''.join(f))]
+
+    @classmethod
+    @contextmanager
+    def open_source(cls, source: Source) -> ContextManager[Iterable[str]]:
+        """
+        :param source: Path of a file, or a readable stream. Streams are read from the start, and are not closed
+        :return: Context manager giving the lines of the source, as text
+        """
+        if isinstance(source, str):
+            with open(source, 'r') as f:
+                yield f
+        else:
+            if source.seekable():
+                source.seek(0)
+            yield (line.decode('utf-8') if isinstance(line, bytes) else line for line in source)
+
+    @classmethod
+    def assemble(cls, file: Source, parser_: Parser, is_pipelined: bool, executor: Executor = None) -> StringIO:
+        """
+        Assemble a single file into a MIF.
+        :param file: MIPS assembly file, as a path or a stream
+        :param parser_: Parser for the ISA to assemble with
+        :param is_pipelined:
+        :param executor: Optional worker pool. Programs of at least PARALLEL_LINES instructions are encoded on it in
+        batches of BATCH_SIZE lines
+        :return: MIF text
+        """
+        ret = StringIO()
+        ret.writelines(Assembler.iter_mif(file, parser_, is_pipelined, executor))
+        return ret
+
+    @classmethod
+    def iter_mif(cls, file: Source, parser_: Parser, is_pipelined: bool, executor: Executor = None,
+                 errors: List[dict] = None, fmt: OutputFormat = None) -> Iterator[Union[str, bytes]]:
+        """
+        Assemble a single file into a MIF, one line at a time. The file is read when the first line is requested.
+        :param file: MIPS assembly file, as a path or a stream
+        :param parser_: Parser for the ISA to assemble with
+        :param is_pipelined:
+        :param executor: Optional worker pool, see assemble
+        :param errors: Optional list to add each line that could not be encoded to, as {'line', 'address', 'text',
+        'error'}. Line numbers start at 0
+        :param fmt: Format to write the program in, defaults to a MIF
+        :return: Lines of the MIF, or pieces of the file in the given format
+        :raises ValueError: The format's words are too narrow for the declared instructions
+        """
+        fmt = Assembler._MIF if fmt is None else fmt
+        fmt.check(parser_.get_isa().get_encoder())
+        with Spans.span('first_pass'), Assembler.open_source(file) as f:
+            program = parser_.first_pass(f)
+        Metrics.inc('tools350_assembler_lines_total', amount=len(program))
+        yield fmt.header()
+        yield from fmt.body(Spans.iterate('encode', Assembler._second_pass(parser_, program, executor, errors, fmt)))
+        yield fmt.footer(len(program))
+
+    @classmethod
+    def _second_pass(cls, parser_: Parser, program: Program, executor: Executor = None,
+                     errors: List[dict] = None, fmt: OutputFormat = None) -> Iterable[Union[str, bytes]]:
+        """
+        Encode every line of the program. Lines are independent once the symbol table is built, so large programs are
+        split into batches for the executor. Without an executor, lines are encoded as they are requested.
+        :param parser_: Parser for the ISA to assemble with
+        :param program: Result of the first pass
+        :param executor: Optional worker pool
+        :param errors: Optional list to add the lines that could not be encoded to
+        :param fmt: Format to write each line in
+        :return: MIF lines, in address order
+        """
+        if executor is None or len(program) < Assembler.PARALLEL_LINES:
+            return (Assembler._parse_and_format_line(parser_, line, address, program.symbols, errors, fmt)
+                    for address, line in enumerate(program.lines))
+        batches = [executor.submit(Assembler._encode_batch, parser_, program.symbols, start,
+                                   program.lines[start:start + Assembler.BATCH_SIZE], fmt)
+                   for start in range(0, len(program), Assembler.BATCH_SIZE)]
+        return Assembler._collect_batches(batches, errors)
 
     @classmethod
-    def assemble(cls, file: str, parser_: Parser, is_pipelined: bool) -> StringIO:
-        with open(file, 'r') as f:
-            parser_.clear()
-            text = parser_.preprocess_assembly(f.readlines())
-            ret = StringIO()
-            ret.write(Assembler._HEADER)
-            ret.writelines([Assembler._parse_and_format_line(parser_, line, i) for i, line in enumerate(text)])
-            ret.write(Assembler._FOOTER.format(len(text), str(Assembler._NOP)))
-            return ret
+    def _collect_batches(cls, batches: List[Future], errors: List[dict] = None) -> Iterator[Union[str, bytes]]:
+        for batch in batches:
+            lines, batch_errors = batch.result()
+            if errors is not None:
+                errors.extend(batch_errors)
+            yield from lines
+
+    @classmethod
+    def _encode_batch(cls, parser_: Parser, symbols: SymbolTable, start: int,
+                      lines: Sequence[SourceLine], fmt: OutputFormat = None) -> Tuple[list, List[dict]]:
+        """
+        :param parser_: Parser for the ISA to assemble with
+        :param symbols: Symbol table of the program
+        :param start: Address of the first line
+        :param lines: Consecutive lines of the program
+        :param fmt: Format to write each line in, defaults to a MIF
+        :return: MIF lines for the batch, and the lines that could not be encoded
+        """
+        errors = []
+        return [Assembler._parse_and_format_line(parser_, line, address, symbols, errors, fmt)
+                for address, line in enumerate(lines, start)], errors
 
     @classmethod
-    def _parse_and_format_line(cls, parser_: Parser, mips: str, number: int) -> str:
+    def encode_line(cls, parser_: Parser, mips: SourceLine, number: int,
+                    symbols: SymbolTable) -> Union[EncodedInstruction, ErrorInstruction]:
+        """
+        :param parser_: Parser for the ISA to assemble with
+        :param mips: Instruction line
+        :param number: Address of the line
+        :param symbols: Symbol table of the program
+        :return: The encoded instruction, or an error instruction holding the reason it could not be encoded
+        """
         try:
-            instr = parser_.parse_line(mips, number)
+            return parser_.parse_source(mips, number, symbols)
         except (AssertionError, SyntaxError) as e:
-            instr = Assembler._NOP.replace_with_error(str(e))
-        # print(mips, '\n', str(instr))
-        # print(Assembler.MIF_LINE.format(number, str(instr), mips))
-        return Assembler._MIF_LINE.format(number, str(instr), mips)
-
-    @classmethod
-    def _zip(cls, file_names: List[str], assembled_files: List[StringIO]) -> BytesIO:
-        zipped = BytesIO()
-        with ZipFile(zipped, 'w') as zip_:
-            for filename, file in zip(file_names, assembled_files):
-                filename = Assembler.fix_filename(filename)
-                zip_.writestr(filename, file.getvalue())
-                file.close()
-            for file in zip_.filelist:
-                file.create_system = 0
-        return zipped
-
-    @classmethod
-    def fix_filename(cls, name: str) -> str:
-        return '{}.mif'.format(path.basename(name).split('.')[0])
-
-    _HEADER = """DEPTH = 4096;\nWIDTH = 32;\nADDRESS_RADIX = DEC;\nDATA_RADIX = BIN;\nCONTENT\nBEGIN\n"""
-    _MIF_LINE = """{:04d} : {:32s}; -- {}\n"""
-    _FOOTER = """[{:04d}..4095] : {:32s};\nEND;\n"""
-    _NOP = Instruction("R", "nop", [], fmt=InstructionType.NOP)
+            return ErrorInstruction(str(e))
+        except KeyError as e:
+            return ErrorInstruction("{} is not declared".format(e))
+
+    @classmethod
+    def _parse_and_format_line(cls, parser_: Parser, mips: SourceLine, number: int, symbols: SymbolTable,
+                               errors: List[dict] = None, fmt: OutputFormat = None) -> Union[str, bytes]:
+        instr = Assembler.encode_line(parser_, mips, number, symbols)
+        if errors is not None and not isinstance(instr, EncodedInstruction):
+            errors.append({'line': mips.number, 'address': number, 'text': mips.text, 'error': str(instr)})
+        return (Assembler._MIF if fmt is None else fmt).line(number, instr, mips)
+
+    @classmethod
+    def fix_filename(cls, name: str, extension: str = 'mif') -> str:
+        return '{}.{}'.format(path.basename(name).split('.')[0], extension)
+
+    PARALLEL_FILES = 8  # Fewest files in one upload worth spreading across the process pool
+    PARALLEL_LINES = 2048  # Smallest program worth splitting across an executor
+    BATCH_SIZE = 512  # Lines encoded per task on an executor
+
+    _MIF = OutputFormat.get('mif')
+    _ERROR_LINE = """{:04d} (line {}): {} -- {}\n"""
+    _executor: Executor = None
+    _executor_workers = 0
+    _executor_lock = Lock()
@@ -0,0 +1,178 @@
+from collections import OrderedDict
+from threading import Lock, RLock
+from typing import *
+from uuid import uuid4
+
+from tools350.assembler.Assembler import Assembler
+from tools350.assembler.instruction.EncodedInstruction import EncodedInstruction
+from tools350.assembler.parsing.Lexer import Lexer, SourceLine
+from tools350.assembler.parsing.Parser import Parser
+from tools350.assembler.parsing.SymbolTable import SymbolTable
+from tools350.Metrics import Metrics
+
+
+class Encoding(NamedTuple):
+    """
+    Encoding of one instruction line, with what it was encoded against
+    """
+    word: Optional[str]  # Binary text of the instruction, None if it could not be encoded
+    error: Optional[str]  # Why the instruction could not be encoded
+    address: int  # Address of the line
+    names: FrozenSet[str]  # Names the line refers to
+    relative: bool  # Whether a name is used as a branch offset, making the encoding depend on the address
+
+
+class AssemblySession:
+    """
+    A program being edited, kept between requests so that each edit only re-encodes what it affected: the edited lines,
+    lines referring to a jump target that moved, and branches to a name whose own address moved. Sessions live in the
+    memory of one server process, and the least recently used session is dropped once MAX_SESSIONS is reached; a client
+    whose session is gone starts a new one with the whole program.
+    """
+
+    MAX_SESSIONS = 256
+
+    _lock = RLock()
+    _sessions: "OrderedDict[str, AssemblySession]" = OrderedDict()
+    _LABELS = {'cache': 'sessions'}
+
+    def __init__(self, parser_: Parser, text_file: Iterable[str] = ()):
+        """
+        :param parser_: Parser for the ISA to assemble with
+        :param text_file: Lines of the program
+        """
+        self.key: str = uuid4().hex
+        self.lock = Lock()
+        self._parser = parser_
+        self._sources: List[SourceLine] = []
+        self._encodings: List[Optional[Encoding]] = []
+        self._targets: Dict[str, int] = {}
+        self._length = 0
+        self.edit(0, 0, text_file)
+
+    @classmethod
+    def start(cls, text_file: Iterable[str], extra_registers: Iterable[dict] = (), extra_instr: Iterable[dict] = (),
+              extra_types: Iterable[dict] = ()) -> "AssemblySession":
+        """
+        Assemble a program and keep it for later edits
+        :param text_file: Lines of the program
+        :param extra_registers: Named register declarations uploaded by students
+        :param extra_instr: Instruction declarations uploaded by students
+        :param extra_types: Instruction type declarations uploaded by students
+        :return: New session, which can be found again with its key
+        """
+        session = cls(Parser(extra_registers, extra_instr, extra_types), text_file)
+        with cls._lock:
+            cls._sessions[session.key] = session
+            while len(cls._sessions) > cls.MAX_SESSIONS:
+                cls._sessions.popitem(last=False)
+        return session
+
+    @classmethod
+    def get(cls, key: str) -> Optional["AssemblySession"]:
+        """
+        :param key: Key of a session made by start
+        :return: The session, None if there is no such session in this process
+        """
+        with cls._lock:
+            try:
+                cls._sessions.move_to_end(key)
+                ret = cls._sessions[key]
+            except KeyError:
+                Metrics.inc('tools350_cache_misses_total', AssemblySession._LABELS)
+                return None
+        Metrics.inc('tools350_cache_hits_total', AssemblySession._LABELS)
+        return ret
+
+    @classmethod
+    def clear(cls):
+        """
+        Drop every session
+        :return: None
+        """
+        with cls._lock:
+            cls._sessions.clear()
+
+    def edit(self, start: int, end: int, lines: Iterable[str]) -> List[dict]:
+        """
+        Replace some lines of the program, and encode whatever the change affected. Not safe to call from several
+        threads at once, hold lock to edit a shared session.
+        :param start: Number of the first line replaced, starting at 0
+        :param end: Number of the line after the last line replaced. Equal to start to only insert lines
+        :param lines: New lines
+        :return: Every instruction whose encoding changed, see words. Instructions that are not listed kept their
+        encoding, and moved along with their line.
+        :raises ValueError: The lines replaced are not in the program
+        """
+        if not 0 <= start <= end <= len(self._sources):
+            raise ValueError("Lines {} to {} are not in a program of {} lines".format(start, end, len(self._sources)))
+        lines = list(Lexer.lex(lines))
+        self._sources[start:end] = lines
+        self._encodings[start:end] = [None] * len(lines)
+        targets = {}
+        address = 0
+        for source in self._sources:
+            if source.label is not None:
+                targets[source.label] = address
+            if source.mnemonic is not None or source.error is not None:
+                address += 1
+        moved = {name for name in self._targets.keys() | targets.keys()
+                 if self._targets.get(name) != targets.get(name)}
+        self._targets = targets
+        self._length = address
+        symbols = SymbolTable(self._parser.get_isa().get_registers(), targets)
+        changed = []
+        address = 0
+        for number, source in enumerate(self._sources):
+            if source.mnemonic is None and source.error is None:
+                continue
+            encoding = self._encodings[number]
+            if encoding is None or not moved.isdisjoint(encoding.names) or \
+                    (encoding.relative and encoding.address != address):
+                encoding = self._encode(source, address, symbols)
+                self._encodings[number] = encoding
+                changed.append(AssemblySession._word(number, encoding))
+            elif encoding.address != address:
+                self._encodings[number] = encoding._replace(address=address)
+            address += 1
+        return changed
+
+    def words(self) -> List[dict]:
+        """
+        :return: Encoding of every instruction in address order, as {'line', 'address', 'word'} or
+        {'line', 'address', 'error'}
+        """
+        return [AssemblySession._word(number, encoding) for number, encoding in enumerate(self._encodings)
+                if encoding is not None]
+
+    def __len__(self) -> int:
+        """
+        :return: Number of instructions in the program
+        """
+        return self._length
+
+    def _encode(self, source: SourceLine, address: int, symbols: SymbolTable) -> Encoding:
+        """
+        :param source: Instruction line
+        :param address: Address of the line
+        :param symbols: Symbol table of the program
+        :return: Encoding of the line at this address
+        """
+        names = frozenset(v for v in source.values if v.__class__ is str)
+        relative = False
+        if names:
+            try:
+                operands = self._parser.get_isa().get_encoder().get_template(source.mnemonic).operands
+                relative = any(o.relative and v.__class__ is str for o, v in zip(operands, source.values))
+            except (KeyError, AssertionError):
+                pass
+        instr = Assembler.encode_line(self._parser, source, address, symbols)
+        if isinstance(instr, EncodedInstruction):
+            return Encoding(str(instr), None, address, names, relative)
+        return Encoding(None, str(instr).strip(), address, names, relative)
+
+    @classmethod
+    def _word(cls, number: int, encoding: Encoding) -> dict:
+        if encoding.word is None:
+            return {'line': number, 'address': encoding.address, 'error': encoding.error}
+        return {'line': number, 'address': encoding.address, 'word': encoding.word}
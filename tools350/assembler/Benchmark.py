@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+
+import argparse as ap
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tracemalloc
+from collections import deque
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import *
+
+from tools350.assembler.Assembler import Assembler
+from tools350.assembler.ZipStream import ZipStream
+from tools350.assembler.parsing.Parser import Parser
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test', 'benchmark.json')
+
+
+class Case(NamedTuple):
+    """
+    A synthetic program to benchmark
+    """
+    name: str
+    lines: List[str]
+    declarations: Dict[str, dict]  # Additional declarations, keyed by Assembler.FIELDS
+
+
+class Benchmark:
+    """
+    Times each stage of the assembler on synthetic programs, and compares the times against a saved baseline. Each
+    stage is timed on its own, keeping the median over several rounds of the fastest of several runs, and compared as
+    a ratio to a fixed reference workload timed in the same round:
+    first_pass: Parser.first_pass, splitting lines and building the symbol table
+    encode: Parser.parse_source on every instruction, through Assembler.encode_line
+    format: Formatting every encoded instruction as a MIF line
+    zip: Compressing the MIF into a zip with ZipStream
+    total: Assembler.stream_all on the program saved to a file, end to end
+    The peak memory allocated during a run of the whole assembler is recorded as well.
+
+    Against the assembler from before instructions were packed into integer words, on the straight lines of
+    straight_4096: encoding went from 29 to 2.0 us per line (14x, though tokenizing moved into the first pass), and the
+    whole assembler from 38 to 10.3 us per line (3.7x). That is short of the 10x per line aimed for; most of the time
+    left is the first pass tokenizing each line.
+    """
+
+    SIZES = (10, 100, 1000, 4096)
+    STAGES = ('first_pass', 'encode', 'format', 'zip', 'total')
+    THRESHOLD = 1.5  # Slowdown from the baseline, relative to the reference, that counts as a regression
+    NOISE_MS = 2.0  # Differences smaller than this, on the machine of the baseline, are never regressions
+    MIN_SECONDS = 0.05  # Shortest time to spend running each stage, per round
+
+    REGISTERS = ['$zero', '$v0', '$a0', '$a1', '$t0', '$t1', '$t7', '$s0', '$s3', '$t9', '$fp', '$sp', '$ra']
+    CUSTOM = {'inst-types': {'types': {'S': {'opcode': 5, 'rd': 5, 'immed': 22}}},
+              'inst': {'swap': {'type': 'S', 'opcode': '11001', 'syntax': ['rd', 'immed']},
+                       'mac': {'type': 'R', 'opcode': '00000', 'aluop': '01001', 'syntax': ['rd', 'rs', 'rt']}}}
+
+    @classmethod
+    def cases(cls, seed: int = 350) -> List[Case]:
+        """
+        :param seed: Seed for the random programs, so that every run benchmarks the same programs
+        :return: Every case to benchmark
+        """
+        rng = random.Random(seed)
+        ret = [Case('straight_{}'.format(size), [Benchmark._straight(rng) for _ in range(size)], {})
+               for size in Benchmark.SIZES]
+        ret.append(Case('branchy_1000', Benchmark._branchy(rng, 1000), {}))
+        ret.append(Case('named_registers_1000', [Benchmark._named(rng) for _ in range(1000)], {}))
+        ret.append(Case('declarations_1000', [rng.choice([Benchmark._straight, Benchmark._custom])(rng)
+                                              for _ in range(1000)], Benchmark.CUSTOM))
+        ret.append(Case('errors_1000', [rng.choice([Benchmark._straight, Benchmark._error])(rng)
+                                        for _ in range(1000)], {}))
+        return ret
+
+    @classmethod
+    def run(cls, cases: Iterable[Case], repeat: int = 5, rounds: int = 5) -> dict:
+        """
+        :param cases: Programs to benchmark
+        :param repeat: Runs of each stage per round, keeping the fastest
+        :param rounds: Times to go through every case. The median of the rounds is kept, so that a stage isn't held
+        back or sped up by what the machine was doing while it was timed
+        :return: Results, as {'python', 'cases': {name: {'lines', 'reference', 'stages': {stage: ms},
+        'ratios': {stage: ratio}, 'peak_kib'}}}. The reference is the time taken by a fixed workload, timed in turn with
+        each stage, and each ratio is the time of the stage over the reference timed with it. Ratios hardly change with the
+        speed of the machine, so they are what is compared
+        """
+        cases = list(cases)
+        samples = {case.name: [] for case in cases}
+        with TemporaryDirectory() as tmp:
+            for _ in range(rounds):
+                for case in cases:
+                    samples[case.name].append(Benchmark._run_case(case, repeat, tmp))
+        results = {}
+        for name, runs in samples.items():
+            results[name] = {
+                'lines': runs[0]['lines'],
+                'reference': median(x['reference'] for x in runs),
+                'stages': {stage: median(x['stages'][stage] for x in runs) for stage in Benchmark.STAGES},
+                'ratios': {stage: median(x['ratios'][stage] for x in runs) for stage in Benchmark.STAGES},
+                'peak_kib': median(x['peak_kib'] for x in runs),
+            }
+        return {'python': platform.python_version(), 'cases': results}
+
+    @classmethod
+    def compare(cls, results: dict, baseline: dict, threshold: float = THRESHOLD) -> List[str]:
+        """
+        :param results: Results of run
+        :param baseline: Results of an earlier run
+        :param threshold: Growth in the ratio of a stage to the reference, or in memory, from the baseline that counts
+        as a regression
+        :return: Description of every regression, with times scaled to the machine of the baseline. Cases or stages
+        missing from either side are skipped
+        """
+        ret = []
+        for name, case in results['cases'].items():
+            old = baseline['cases'].get(name)
+            if old is None or 'ratios' not in old:
+                continue
+            for stage, ratio in case['ratios'].items():
+                before = old['ratios'].get(stage)
+                if before is not None and ratio > before * threshold and \
+                        (ratio - before) * old['reference'] > Benchmark.NOISE_MS:
+                    ret.append('{} {}: {:.2f} ms, baseline {:.2f} ms'.format(name, stage, ratio * old['reference'],
+                                                                             before * old['reference']))
+            if 'peak_kib' in old and case['peak_kib'] > old['peak_kib'] * threshold:
+                ret.append('{} memory: {:.0f} KiB, baseline {:.0f} KiB'.format(name, case['peak_kib'],
+                                                                                old['peak_kib']))
+        return ret
+
+    @classmethod
+    def report(cls, results: dict, baseline: dict = None) -> str:
+        """
+        :return: Table of the results, with the change in each ratio from the baseline if one is given
+        """
+        ret = ['{:24s} {:>6s} '.format('case', 'lines') + ' '.join('{:>18s}'.format(s) for s in Benchmark.STAGES) +
+               ' {:>10s}'.format('peak KiB')]
+        for name, case in results['cases'].items():
+            old = (baseline or {}).get('cases', {}).get(name, {})
+            cells = []
+            for stage in Benchmark.STAGES:
+                before = old.get('ratios', {}).get(stage)
+                change = ' ({:+4.0f}%)'.format((case['ratios'][stage] / before - 1) * 100) if before else ''
+                cells.append('{:>18s}'.format('{:.3f}{}'.format(case['stages'][stage], change)))
+            ret.append('{:24s} {:6d} '.format(name, case['lines']) + ' '.join(cells) +
+                       ' {:10.0f}'.format(case['peak_kib']))
+        return '\n'.join(ret)
+
+    @classmethod
+    def _run_case(cls, case: Case, repeat: int, tmp: str) -> dict:
+        declarations = {}
+        for field, declaration in case.declarations.items():
+            declarations[field] = os.path.join(tmp, '{}.{}.json'.format(case.name, field))
+            with open(declarations[field], 'w') as f:
+                json.dump(declaration, f)
+        file = os.path.join(tmp, case.name + '.s')
+        with open(file, 'w') as f:
+            f.writelines(line + '\n' for line in case.lines)
+        lines = [line + '\n' for line in case.lines]
+        parser_ = Parser(Assembler.unpack(declarations, 'named-regs'), Assembler.unpack(declarations, 'inst'),
+                         Assembler.unpack(declarations, 'inst-types'))
+        program = parser_.first_pass(lines)
+        encoded = [Assembler.encode_line(parser_, line, address, program.symbols)
+                   for address, line in enumerate(program.lines)]
+        mif = [Assembler._MIF.line(address, instr, line)
+               for address, (line, instr) in enumerate(zip(program.lines, encoded))]
+        stages = {
+            'first_pass': lambda: parser_.first_pass(lines),
+            'encode': lambda: [Assembler.encode_line(parser_, line, address, program.symbols)
+                               for address, line in enumerate(program.lines)],
+            'format': lambda: [Assembler._MIF.line(address, instr, line)
+                               for address, (line, instr) in enumerate(zip(program.lines, encoded))],
+            'zip': lambda: deque(ZipStream.zip([(case.name + '.mif', mif)]), maxlen=0),
+            'total': lambda: deque(Assembler.stream_all([file], [case.name + '.s'], declarations), maxlen=0),
+        }
+        ret = {'lines': len(program), 'stages': {}, 'ratios': {}}
+        references = []
+        for stage in Benchmark.STAGES:  # The reference is timed alongside each stage, under the same conditions
+            reference, ret['stages'][stage] = Benchmark._best([Benchmark._reference, stages[stage]], repeat)
+            ret['ratios'][stage] = ret['stages'][stage] / reference
+            references.append(reference)
+        ret['reference'] = min(references)
+        tracemalloc.start()
+        try:
+            stages['total']()
+            ret['peak_kib'] = tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+        return ret
+
+    @classmethod
+    def _best(cls, stages: Sequence[Callable[[], Any]], repeat: int) -> List[float]:
+        """
+        Run the stages one after the other, at least repeat times, and for at least MIN_SECONDS, with the garbage
+        collector off.
+        :return: Fastest time of each stage, in milliseconds
+        """
+        best = [float('inf')] * len(stages)
+        runs = 0
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            deadline = perf_counter() + Benchmark.MIN_SECONDS
+            while runs < repeat or perf_counter() < deadline:
+                for i, stage in enumerate(stages):
+                    start = perf_counter()
+                    stage()
+                    best[i] = min(best[i], perf_counter() - start)
+                runs += 1
+        finally:
+            if enabled:
+                gc.enable()
+        return [x * 1000 for x in best]
+
+    @classmethod
+    def _reference(cls):
+        """
+        Fixed workload, timed in turn with each stage to tell how fast the machine is running at the time
+        """
+        table = {'r{}'.format(i): i for i in range(64)}
+        return [int('{:05b}'.format(table['r{}'.format(i % 64)]), 2) << 3 for i in range(2000)]
+
+    @classmethod
+    def _straight(cls, rng: random.Random) -> str:
+        r = lambda: '${}'.format(rng.randrange(32))
+        return rng.choice([
+            lambda: 'add {} {} {}'.format(r(), r(), r()),
+            lambda: 'sub {}, {}, {}'.format(r(), r(), r()),
+            lambda: 'addi {} {} {}'.format(r(), r(), rng.randrange(-65536, 65536)),
+            lambda: 'sll {} {} {}'.format(r(), r(), rng.randrange(32)),
+            lambda: 'lw {} {}({})  # load'.format(r(), rng.randrange(1024), r()),
+            lambda: 'sw {} {}({})'.format(r(), rng.randrange(1024), r()),
+            lambda: 'nop',
+        ])()
+
+    @classmethod
+    def _branchy(cls, rng: random.Random, size: int) -> List[str]:
+        labels = ['l{}'.format(i) for i in range((size + 2) // 3)]
+        ret = []
+        for i in range(size):
+            line = rng.choice([
+                lambda: 'bne ${} ${} {}'.format(rng.randrange(32), rng.randrange(32), rng.choice(labels)),
+                lambda: 'blt ${} ${} {}'.format(rng.randrange(32), rng.randrange(32), rng.choice(labels)),
+                lambda: 'j {}'.format(rng.choice(labels)),
+                lambda: 'jal {}'.format(rng.choice(labels)),
+                lambda: Benchmark._straight(rng),
+            ])()
+            ret.append('{}: {}'.format(labels[i // 3], line) if i % 3 == 0 else line)
+        return ret
+
+    @classmethod
+    def _named(cls, rng: random.Random) -> str:
+        r = lambda: rng.choice(Benchmark.REGISTERS)
+        return rng.choice([
+            lambda: 'add {} {} {}'.format(r(), r(), r()),
+            lambda: 'addi {} {} {}'.format(r(), r(), rng.randrange(-100, 100)),
+            lambda: 'lw {} {}({})'.format(r(), rng.randrange(100), r()),
+            lambda: 'jr {}'.format(r()),
+        ])()
+
+    @classmethod
+    def _custom(cls, rng: random.Random) -> str:
+        return rng.choice([
+            lambda: 'swap ${} {}'.format(rng.randrange(32), rng.randrange(-1000, 1000)),
+            lambda: 'mac ${} ${} ${}'.format(rng.randrange(32), rng.randrange(32), rng.randrange(32)),
+        ])()
+
+    @classmethod
+    def _error(cls, rng: random.Random) -> str:
+        return rng.choice([
+            lambda: 'frob $1 $2',
+            lambda: 'addi $1 $2 1000000',
+            lambda: 'add $1 $2',
+            lambda: 'j missing',
+            lambda: 'a: b: nop',
+        ])()
+
+
+if __name__ == '__main__':
+    args = ap.ArgumentParser(description='Benchmark the assembler against a saved baseline')
+    args.add_argument('-b', '--baseline', dest='baseline', default=BASELINE, help='Baseline JSON file')
+    args.add_argument('-s', '--save', dest='save', action='store_true', help='Save the results as the new baseline '
+                                                                             'instead of comparing against it')
+    args.add_argument('-t', '--threshold', dest='threshold', type=float, default=Benchmark.THRESHOLD,
+                      help='Slowdown from the baseline that fails the run, as a ratio')
+    args.add_argument('-r', '--repeat', dest='repeat', type=int, default=5, help='Runs of each stage per round')
+    args.add_argument('-n', '--rounds', dest='rounds', type=int, default=5, help='Rounds through every case')
+    args.add_argument('-c', '--cases', dest='cases', nargs='*', default=None, help='Names of the cases to run')
+    in_ = args.parse_args()
+    cases = [c for c in Benchmark.cases() if in_.cases is None or c.name in in_.cases]
+    results = Benchmark.run(cases, in_.repeat, in_.rounds)
+    if in_.save:
+        print(Benchmark.report(results))
+        with open(in_.baseline, 'w') as file:
+            json.dump(results, file, indent=1, sort_keys=True)
+        sys.exit(0)
+    try:
+        with open(in_.baseline, 'r') as file:
+            baseline = json.load(file)
+    except FileNotFoundError:
+        baseline = None
+    print(Benchmark.report(results, baseline))
+    regressions = Benchmark.compare(results, baseline, in_.threshold) if baseline else []
+    for regression in regressions:
+        print('Regression: ' + regression)
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+
+import argparse as ap
+import json
+import re
+import sys
+from typing import *
+
+from tools350.assembler.Assembler import Assembler
+from tools350.assembler.instruction.Template import Template
+from tools350.assembler.parsing.ISA import ISA
+from tools350.assembler.parsing.ISACache import ISACache
+
+
+class Decoded(NamedTuple):
+    """
+    A word of a memory image, decoded back into assembly
+    """
+    address: int
+    word: int
+    name: Optional[str]  # Mnemonic of the instruction, None if no instruction matches the word
+    values: Tuple[int, ...]  # Value of each operand, in the order they are written in assembly
+    text: str  # The instruction as it would be written in assembly
+    target: Optional[int] = None  # Address a branch goes to
+
+
+class Difference(NamedTuple):
+    """
+    An address where two memory images hold different instructions
+    """
+    address: int
+    expected: Decoded
+    actual: Decoded
+
+
+class Disassembler:
+    """
+    Decodes memory images back into assembly with the decode tables of an ISA. Instructions are told apart by their
+    opcode and, for R types, their aluop, both looked up with integer masks in a single dict lookup per mask. Decoding
+    a word does not depend on its address, so the result for each distinct word is kept, and images full of repeated
+    words, like the nops padding every MIF, cost almost nothing past the first.
+    """
+
+    REGISTERS = ('rd', 'rs', 'rt')  # Fields written as registers
+    MAX_CACHED = 1 << 16  # Distinct words kept decoded before the cache is dropped
+
+    _RADIX = {'BIN': 2, 'HEX': 16, 'OCT': 8, 'DEC': 10, 'UNS': 10}
+
+    def __init__(self, isa: ISA):
+        """
+        :param isa: ISA the images were assembled with
+        """
+        self._isa = isa
+        tables: Dict[int, Dict[int, Template]] = {}
+        for template in isa.get_encoder().get_templates().values():
+            tables.setdefault(template.fixed, {}).setdefault(template.word, template)  # Aliases decode to the first
+        # Most specific mask first, so an R type is not taken for another instruction with a zero opcode
+        self._tables = sorted(tables.items(), key=lambda x: -bin(x[0]).count('1'))
+        self._decoded: Dict[int, Tuple[Optional[Template], Tuple[int, ...], str]] = {}
+
+    @classmethod
+    def for_declarations(cls, extra_registers: Iterable[dict] = (), extra_instr: Iterable[dict] = (),
+                         extra_types: Iterable[dict] = ()) -> "Disassembler":
+        """
+        :param extra_registers: Named register declarations the images were assembled with
+        :param extra_instr: Instruction declarations the images were assembled with
+        :param extra_types: Instruction type declarations the images were assembled with
+        :return: Disassembler for the base ISA with these declarations
+        """
+        return cls(ISACache.get(extra_registers, extra_instr, extra_types))
+
+    def decode(self, word: int, address: int = 0) -> Decoded:
+        """
+        :param word: Instruction word
+        :param address: Address of the word, used for branch targets
+        :return: The decoded instruction. A word of all zeroes is a nop
+        """
+        try:
+            template, values, text = self._decoded[word]
+        except KeyError:
+            if len(self._decoded) >= Disassembler.MAX_CACHED:
+                self._decoded.clear()
+            template, values, text = self._decoded[word] = self._decode(word)
+        target = None
+        if template is not None:
+            for operand, value in zip(template.operands, values):
+                if operand.relative:
+                    target = address + 1 + value
+        name = 'nop' if word == 0 else None if template is None else template.name
+        return Decoded(address, word, name, values, text, target)
+
+    def disassemble(self, words: Sequence[int], start: int = 0) -> List[Decoded]:
+        """
+        :param words: Memory image, one word per address
+        :param start: Address of the first word
+        :return: Every word, decoded
+        """
+        return [self.decode(word, address) for address, word in enumerate(words, start)]
+
+    def diff(self, expected: Sequence[int], actual: Sequence[int]) -> List[Difference]:
+        """
+        Compare two memory images instruction by instruction. Words that decode to the same instruction with the same
+        operands are equal even if they differ in bits the instruction doesn't use, like the shamt of an add.
+        Addresses past the end of the shorter image hold nops.
+        :param expected: Memory image to compare against
+        :param actual: Memory image to check
+        :return: Every address where the images differ, in order
+        """
+        ret = []
+        for address in range(max(len(expected), len(actual))):
+            left = expected[address] if address < len(expected) else 0
+            right = actual[address] if address < len(actual) else 0
+            if left != right and self._key(left) != self._key(right):
+                ret.append(Difference(address, self.decode(left, address), self.decode(right, address)))
+        return ret
+
+    @classmethod
+    def read_image(cls, file: str, errors: Dict[int, str] = None) -> List[int]:
+        """
+        Read a MIF, in any of the radixes Quartus writes.
+        :param file: Path of the MIF
+        :param errors: Optional dict to add the lines that were not assembled to, see parse_image
+        :return: Word at every address, up to the depth of the memory
+        :raises ValueError: The file is not a valid MIF
+        """
+        with open(file, 'r') as f:
+            return Disassembler.parse_image(f.read(), errors)
+
+    @classmethod
+    def load_image(cls, file: str) -> List[int]:
+        """
+        Read a MIF for the command line, warning on stderr about each line that was not assembled.
+        :param file: Path of the MIF
+        :return: Word at every address, up to the depth of the memory
+        :raises ValueError: The file is not a valid MIF
+        """
+        errors = {}
+        ret = Disassembler.read_image(file, errors)
+        for address, error in sorted(errors.items()):
+            sys.stderr.write('{}: {:04d} was not assembled, read as a nop: {}\n'.format(file, address, error))
+        return ret
+
+    @classmethod
+    def parse_image(cls, text: str, errors: Dict[int, str] = None) -> List[int]:
+        """
+        :param text: Content of a MIF
+        :param errors: Optional dict to add the address -> reason of each line that was not assembled to. The default
+        MIF writes the reason in place of the word, and the word is read as the nop the assembler puts there in every
+        other format
+        :return: Word at every address, up to the depth of the memory
+        :raises ValueError: The text is not a valid MIF
+        """
+        text = Disassembler._COMMENT.sub('', text)
+        begin = Disassembler._BEGIN.search(text)
+        if begin is None:
+            raise ValueError("MIF has no CONTENT BEGIN")
+        content = text[begin.end():]
+        settings = {k.upper(): v.upper() for k, v in Disassembler._SETTING.findall(text[:begin.start()])}
+        try:
+            depth, width = int(settings['DEPTH']), int(settings['WIDTH'])
+            address_radix = Disassembler._RADIX[settings.get('ADDRESS_RADIX', 'HEX')]
+            data_radix = Disassembler._RADIX[settings.get('DATA_RADIX', 'HEX')]
+        except (KeyError, ValueError) as e:
+            raise ValueError("Bad MIF header: {}".format(e))
+        mask = (1 << width) - 1
+        ret = [0] * depth
+        for entry in content.split(';'):
+            address, colon, data = entry.partition(':')
+            address = address.strip()
+            if not colon:
+                if address and address.upper() != 'END':
+                    raise ValueError("Bad MIF entry: {}".format(entry.strip()))
+                continue
+            try:
+                words = [int(x, data_radix) & mask for x in data.split()]
+            except ValueError:
+                if address.startswith('['):
+                    raise ValueError("Bad MIF entry: {}".format(entry.strip()))
+                words = [0]
+                if errors is not None:
+                    errors[int(address, address_radix)] = data.strip()
+            if address.startswith('['):
+                low, high = (int(x, address_radix) for x in address.strip('[]').split('..'))
+                for i in range(low, high + 1):
+                    ret[i] = words[(i - low) % len(words)]
+            else:
+                low = int(address, address_radix)
+                ret[low:low + len(words)] = words
+        del ret[depth:]
+        return ret
+
+    @classmethod
+    def length(cls, words: Sequence[int]) -> int:
+        """
+        :param words: Memory image
+        :return: Length of the image without the nops padding its end
+        """
+        ret = len(words)
+        while ret and not words[ret - 1]:
+            ret -= 1
+        return ret
+
+    @classmethod
+    def listing(cls, decoded: Iterable[Decoded]) -> Iterator[str]:
+        """
+        :param decoded: Decoded words
+        :return: A line per word, with its address, hex word and assembly
+        """
+        for d in decoded:
+            target = '' if d.target is None else '  # -> {:04d}'.format(d.target)
+            yield '{:04d} : {:08X} ; {}{}\n'.format(d.address, d.word, d.text, target)
+
+    def _decode(self, word: int) -> Tuple[Optional[Template], Tuple[int, ...], str]:
+        if word == 0:
+            return None, (), 'nop'
+        for mask, table in self._tables:
+            template = table.get(word & mask)
+            if template is not None:
+                break
+        else:
+            return None, (), '.word 0x{:08X}'.format(word)
+        values = []
+        for operand in template.operands:
+            value = (word >> operand.shift) & operand.mask
+            if operand.signed and value > operand.high:
+                value -= operand.mask + 1
+            values.append(value)
+        return template, tuple(values), self._format(template, values)
+
+    @classmethod
+    def _format(cls, template: Template, values: Sequence[int]) -> str:
+        parts = []
+        operands = template.operands
+        i = 0
+        while i < len(operands):
+            field = operands[i].field
+            if field in Disassembler.REGISTERS:
+                parts.append('${}'.format(values[i]))
+            elif operands[i].signed and i + 1 < len(operands) and operands[i + 1].field in Disassembler.REGISTERS:
+                parts.append('{}(${})'.format(values[i], values[i + 1]))  # Base and offset, as in lw $1, 4($2)
+                i += 1
+            else:
+                parts.append(str(values[i]))
+            i += 1
+        return '{} {}'.format(template.name, ', '.join(parts)) if parts else template.name
+
+    def _key(self, word: int) -> tuple:
+        """
+        :return: What the word means to the processor: the instruction and its operands, or the word itself when it
+        doesn't decode
+        """
+        if word not in self._decoded:
+            self.decode(word)
+        template, values, _ = self._decoded[word]
+        return (word,) if template is None else (template.word, template.fixed, values)
+
+    _COMMENT = re.compile(r'--[^\n]*|%[^%]*%')
+    _BEGIN = re.compile(r'\bCONTENT\s+BEGIN\b', re.I)
+    _SETTING = re.compile(r'(\w+)\s*=\s*(\w+)\s*;')
+
+
+if __name__ == '__main__':
+    args = ap.ArgumentParser(description='Disassemble MIFs, or compare MIFs against an expected one')
+    args.add_argument('images', nargs='+', help='MIFs to disassemble, or to compare against --diff')
+    args.add_argument('-d', '--diff', dest='expected', default=None, help='Expected MIF. Each image is compared to '
+                                                                        'it, and the differences reported as JSON')
+    args.add_argument('-a', '--all', dest='all', action='store_true', help='List the nops padding the end of each '
+                                                                           'image too')
+    for field in Assembler.FIELDS:
+        args.add_argument('--{}'.format(field), dest=field, default=None,
+                          help='JSON declarations of {} the images were assembled with'.format(field))
+    in_ = args.parse_args()
+    declarations = {f: getattr(in_, f) for f in Assembler.FIELDS if getattr(in_, f)}
+    disassembler = Disassembler.for_declarations(Assembler.unpack(declarations, 'named-regs'),
+                                                 Assembler.unpack(declarations, 'inst'),
+                                                 Assembler.unpack(declarations, 'inst-types'))
+    if in_.expected is None:
+        for image in in_.images:
+            words = Disassembler.load_image(image)
+            if len(in_.images) > 1:
+                sys.stdout.write('-- {}\n'.format(image))
+            sys.stdout.writelines(Disassembler.listing(disassembler.disassemble(
+                words if in_.all else words[:Disassembler.length(words)])))
+        sys.exit(0)
+    expected = Disassembler.load_image(in_.expected)
+    report = []
+    for image in in_.images:
+        differences = disassembler.diff(expected, Disassembler.load_image(image))
+        report.append({'image': image, 'differences': [
+            {'address': d.address, 'expected': d.expected.text, 'actual': d.actual.text} for d in differences]})
+    json.dump(report, sys.stdout, indent=1)
+    sys.stdout.write('\n')
+    sys.exit(1 if any(r['differences'] for r in report) else 0)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+import argparse as ap
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from typing import *
+
+from tools350.assembler.Assembler import Assembler
+from tools350.assembler.parsing.Parser import Parser
+
+
+class Grader:
+    """
+    Assembles every submission under a directory in one go, for autograding. The ISA is compiled once, and sent to
+    each worker process once, when it starts.
+    """
+
+    EXTENSION = '.s'
+
+    _parser: Parser = None  # Parser of a worker process
+
+    @classmethod
+    def find(cls, root: str) -> List[str]:
+        """
+        :param root: Directory of submissions
+        :return: Path of every assembly file under root, relative to root, in sorted order
+        """
+        ret = []
+        for directory, subdirectories, files in os.walk(root):
+            subdirectories.sort()
+            ret.extend(os.path.relpath(os.path.join(directory, f), root) for f in sorted(files)
+                       if f.endswith(Grader.EXTENSION))
+        return ret
+
+    @classmethod
+    def grade_all(cls, root: str, output: str = None, additional_declarations: dict = None, workers: int = 1,
+                  is_pipelined: bool = True) -> dict:
+        """
+        Assemble every assembly file under root into a MIF.
+        :param root: Directory of submissions
+        :param output: Directory to write the MIFs to, mirroring the layout of root. Defaults to writing each MIF next
+        to its assembly
+        :param additional_declarations: Paths of declarations used for every file, keyed by Assembler.FIELDS
+        :param workers: Number of worker processes. Below 2, every file is assembled in this process
+        :param is_pipelined:
+        :return: Report of every file, as {'files': [...], 'summary': {...}}. See grade for the report of a file
+        """
+        start = perf_counter()
+        additional_declarations = additional_declarations or {}
+        parser_ = Parser(Assembler.unpack(additional_declarations, 'named-regs'),
+                         Assembler.unpack(additional_declarations, 'inst'),
+                         Assembler.unpack(additional_declarations, 'inst-types'))
+        output = root if output is None else output
+        tasks = [(os.path.join(root, f), os.path.join(output, os.path.dirname(f), Assembler.fix_filename(f)),
+                  is_pipelined) for f in Grader.find(root)]
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(workers, initializer=Grader._start_worker, initargs=(parser_,)) as executor:
+                files = list(executor.map(Grader._grade_task, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+        else:
+            Grader._start_worker(parser_)
+            files = [Grader._grade_task(task) for task in tasks]
+        for report in files:
+            report['source'] = os.path.relpath(report['source'], root)
+        summary = {status: sum(1 for f in files if f['status'] == status) for status in ('ok', 'errors', 'failed')}
+        summary['files'] = len(files)
+        summary['seconds'] = perf_counter() - start
+        return {'files': files, 'summary': summary}
+
+    @classmethod
+    def grade(cls, source: str, destination: str, parser_: Parser, is_pipelined: bool = True) -> dict:
+        """
+        :param source: Assembly file
+        :param destination: Path to write the MIF to
+        :param parser_: Parser for the ISA to assemble with
+        :param is_pipelined:
+        :return: Report of the file: {'source', 'mif', 'status', 'instructions', 'errors', 'seconds'}. The status is
+        'ok', 'errors' if some lines could not be encoded (see Assembler.iter_mif), or 'failed' if no MIF could be
+        written, with the reason in 'message'
+        """
+        start = perf_counter()
+        errors = []
+        report = {'source': source, 'mif': destination}
+        try:
+            directory = os.path.dirname(destination)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            instructions = -2  # The header and footer are a piece each
+            with open(destination, 'w') as mif:
+                for piece in Assembler.iter_mif(source, parser_, is_pipelined, errors=errors):
+                    mif.write(piece)
+                    instructions += 1
+            report['status'] = 'errors' if errors else 'ok'
+            report['instructions'] = instructions
+        except Exception as e:
+            report['status'] = 'failed'
+            report['message'] = '{}: {}'.format(type(e).__name__, str(e))
+            if os.path.exists(destination):
+                os.remove(destination)
+        report['errors'] = errors
+        report['seconds'] = perf_counter() - start
+        return report
+
+    @classmethod
+    def _start_worker(cls, parser_: Parser):
+        Grader._parser = parser_
+
+    @classmethod
+    def _grade_task(cls, task: Tuple[str, str, bool]) -> dict:
+        source, destination, is_pipelined = task
+        return Grader.grade(source, destination, Grader._parser, is_pipelined)
+
+
+if __name__ == '__main__':
+    args = ap.ArgumentParser(description='Assemble every {} file under a directory'.format(Grader.EXTENSION))
+    args.add_argument('root', help='Directory of submissions')
+    args.add_argument('-o', '--output', dest='output', default=None, help='Directory to write the MIFs to, mirroring '
+                                                                          'the submissions. Defaults to writing each '
+                                                                          'MIF next to its assembly')
+    args.add_argument('-r', '--report', dest='report', default=None, help='File to write the JSON report to. '
+                                                                          'Defaults to standard output')
+    args.add_argument('-j', '--workers', dest='workers', type=int, default=os.cpu_count(),
+                      help='Number of worker processes')
+    for field in Assembler.FIELDS:
+        args.add_argument('--{}'.format(field), dest=field, default=None,
+                          help='JSON declarations of {} used for every file'.format(field))
+    in_ = args.parse_args()
+    declarations = {f: getattr(in_, f) for f in Assembler.FIELDS if getattr(in_, f)}
+    result = Grader.grade_all(in_.root, in_.output, declarations, in_.workers)
+    if in_.report is None:
+        json.dump(result, sys.stdout, indent=1)
+        sys.stdout.write('\n')
+    else:
+        with open(in_.report, 'w') as file:
+            json.dump(result, file, indent=1)
+    sys.exit(1 if result['summary']['failed'] else 0)
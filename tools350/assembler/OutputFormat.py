@@ -0,0 +1,209 @@
+from struct import Struct
+from typing import *
+
+from tools350.assembler.instruction.EncodedInstruction import EncodedInstruction
+from tools350.assembler.instruction.Encoder import Encoder
+from tools350.assembler.instruction.ErrorInstruction import ErrorInstruction
+from tools350.assembler.parsing.Lexer import SourceLine
+from tools350.MifWriter import MifWriter
+
+
+class OutputFormat:
+    """
+    How the assembled program is written out: a header, one piece per instruction and a footer. Pieces are str for text
+    formats and bytes for binary ones. Lines that could not be encoded are written as a nop, the word of an
+    ErrorInstruction; formats that can't show the reason inline (inline_errors) rely on the caller to report it some
+    other way.
+    """
+
+    DEPTH = 4096
+    WIDTH = 32
+
+    name = ''
+    extension = ''
+    inline_errors = False
+    fixed_width = False  # Whether every word is written in exactly WIDTH bits
+    empty: Union[str, bytes] = ''  # Pieces of the format are of this type
+
+    _FORMATS: Dict[str, "OutputFormat"] = {}
+
+    @classmethod
+    def get(cls, name: str) -> "OutputFormat":
+        """
+        :param name: Name of the format, one of names()
+        :return: The format
+        :raises KeyError: No format has this name
+        """
+        return OutputFormat._FORMATS[name]
+
+    @classmethod
+    def names(cls) -> List[str]:
+        return list(OutputFormat._FORMATS)
+
+    @classmethod
+    def register(cls, fmt: "OutputFormat"):
+        OutputFormat._FORMATS[fmt.name] = fmt
+
+    def check(self, encoder: Encoder):
+        """
+        :param encoder: Encoder of the ISA the program is assembled with
+        :return: None
+        :raises ValueError: The format can't hold the words of some instruction, as they are wider than WIDTH
+        """
+        if not self.fixed_width:
+            return
+        wide = sorted({(t.inst_type, t.width) for t in encoder.get_templates().values() if t.width != self.WIDTH})
+        if wide:
+            raise ValueError("The {} format holds {}-bit words, but instruction type {} is {} bits wide".format(
+                self.name, self.WIDTH, *wide[0]))
+
+    def header(self) -> Union[str, bytes]:
+        return self.empty
+
+    def line(self, address: int, instr: Union[EncodedInstruction, ErrorInstruction],
+             source: SourceLine) -> Union[str, bytes]:
+        """
+        :param address: Address of the instruction
+        :param instr: Encoded instruction, or the error of a line that could not be encoded
+        :param source: Line the instruction came from
+        :return: The instruction, written out
+        """
+        raise NotImplementedError
+
+    def body(self, lines: Iterable[Union[str, bytes]]) -> Iterable[Union[str, bytes]]:
+        """
+        :param lines: Every instruction, written out by line, in address order
+        :return: Pieces of the file between the header and the footer
+        """
+        return lines
+
+    def footer(self, length: int) -> Union[str, bytes]:
+        """
+        :param length: Number of instructions in the program
+        """
+        return self.empty
+
+    def __reduce__(self):
+        return OutputFormat.get, (self.name,)
+
+
+class MifFormat(OutputFormat):
+    """
+    Quartus memory initialization file. The original format spells each word out in binary, with the source line as a
+    comment and the reason in place of the word for lines that could not be encoded. Without comments, runs of
+    identical words, including the nops padding the program, are collapsed into ranges.
+    """
+
+    extension = 'mif'
+
+    def __init__(self, name: str, radix: str, comments: bool):
+        """
+        :param name: Name of the format
+        :param radix: BIN or HEX
+        :param comments: Whether to write the source line after each word
+        """
+        self.name = name
+        self.inline_errors = comments
+        self._radix = radix
+        digits = self.WIDTH if radix == 'BIN' else self.WIDTH // 4
+        self._word = '{:0' + str(digits) + ('b' if radix == 'BIN' else 'X') + '}'
+        self._line = '{:04d} : {:' + str(digits) + 's}; -- {}\n'
+        self._error = '{:04d} : ' + self._word.format(0) + '; -- {} -- {}\n'
+        self._zero = self._word.format(0)
+
+    def header(self) -> str:
+        return MifWriter.header(self.DEPTH, self.WIDTH, self._radix)
+
+    def line(self, address: int, instr: Union[EncodedInstruction, ErrorInstruction], source: SourceLine) -> str:
+        if not self.inline_errors:  # Only the word, for body to collapse
+            return str(instr) if instr.__class__ is EncodedInstruction else self._zero
+        if instr.__class__ is EncodedInstruction:
+            word = str(instr) if self._radix == 'BIN' else self._word.format(int(instr))
+            return self._line.format(address, word, source.text)
+        elif self._radix == 'BIN':  # The original format writes the reason in place of the word
+            return self._line.format(address, str(instr), source.text)
+        return self._error.format(address, source.text, str(instr))
+
+    def body(self, lines: Iterable[str]) -> Iterable[str]:
+        if self.inline_errors:
+            return lines
+        return MifWriter.entries(lines, 0, self.DEPTH, self._zero)
+
+    def footer(self, length: int) -> str:
+        if not self.inline_errors or length >= self.DEPTH:  # Nothing left to pad
+            return MifWriter.footer()
+        return MifWriter.entry(length, self.DEPTH - 1, self._zero) + MifWriter.footer()
+
+
+class IntelHexFormat(OutputFormat):
+    """
+    Intel HEX, one data record per word. As Quartus expects for memories wider than a byte, record addresses count
+    words rather than bytes.
+    """
+
+    name = 'ihex'
+    extension = 'hex'
+    fixed_width = True
+
+    def line(self, address: int, instr: Union[EncodedInstruction, ErrorInstruction], source: SourceLine) -> str:
+        word = int(instr)
+        checksum = 4 + (address >> 8) + (address & 0xff) + sum(word.to_bytes(4, 'big'))
+        return ':04{:04X}00{:08X}{:02X}\n'.format(address, word, -checksum & 0xff)
+
+    def footer(self, length: int) -> str:
+        return ':00000001FF\n'
+
+
+class BinaryFormat(OutputFormat):
+    """
+    The words of the program back to back, without padding to the depth of the memory
+    """
+
+    extension = 'bin'
+    empty = b''
+    fixed_width = True
+
+    def __init__(self, name: str, byteorder: str):
+        """
+        :param name: Name of the format
+        :param byteorder: '<' for little endian, '>' for big endian
+        """
+        self.name = name
+        self._pack = Struct(byteorder + 'I').pack
+
+    def line(self, address: int, instr: Union[EncodedInstruction, ErrorInstruction], source: SourceLine) -> bytes:
+        return self._pack(int(instr))
+
+
+class CoeFormat(OutputFormat):
+    """
+    Xilinx coefficient file, in hexadecimal
+    """
+
+    name = 'coe'
+    extension = 'coe'
+    fixed_width = True
+
+    def header(self) -> str:
+        return 'memory_initialization_radix=16;\nmemory_initialization_vector=\n'
+
+    def line(self, address: int, instr: Union[EncodedInstruction, ErrorInstruction], source: SourceLine) -> str:
+        return '{:08X},\n'.format(int(instr))
+
+    def body(self, lines: Iterable[str]) -> Iterator[str]:
+        # The vector ends with a ';' rather than a ',', so the last word is held back until it is known to be the last
+        last = None
+        for line in lines:
+            if last is not None:
+                yield last
+            last = line
+        if last is not None:
+            yield last[:-2] + ';\n'
+
+    def footer(self, length: int) -> str:
+        return '' if length else '00000000;\n'  # The vector can't be empty
+
+
+for _fmt in (MifFormat('mif', 'BIN', True), MifFormat('mif-hex', 'HEX', True), MifFormat('mif-bare', 'BIN', False),
+             IntelHexFormat(), BinaryFormat('bin-le', '<'), BinaryFormat('bin-be', '>'), CoeFormat()):
+    OutputFormat.register(_fmt)
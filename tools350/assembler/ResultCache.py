@@ -0,0 +1,138 @@
+import os
+from hashlib import sha256
+from time import time
+from typing import *
+from uuid import uuid4
+
+from tools350.assembler.parsing.ISACache import ISACache
+from tools350.Metrics import Metrics
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, where eviction is left unsynchronized
+    fcntl = None
+
+
+class ResultCache:
+    """
+    Disk-backed cache of finished zips, keyed by a hash of everything that goes into them. The cache directory can be
+    shared by every server process: entries are written to a temporary file and renamed into place, so they are never
+    seen half written, and only one process at a time trims the cache. Reading an entry marks it as recently used.
+    """
+
+    VERSION = 2  # Bump whenever the bytes written for any output format change, to drop every cached zip
+    STALE_SECONDS = 3600  # Age of an unfinished temporary file that is assumed to be abandoned
+
+    _LABELS = {'cache': 'results'}
+
+    def __init__(self, root: str, max_bytes: int):
+        """
+        :param root: Directory to keep the cache in, created if needed
+        :param max_bytes: Size the cache is trimmed back to after each new entry
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    @classmethod
+    def key(cls, files: Iterable[Tuple[str, Iterable[bytes]]], declarations: Mapping[str, Iterable[bytes]],
+            is_pipelined: bool = True, output_format: str = 'mif') -> str:
+        """
+        :param files: Name and content of each assembly file, in order
+        :param declarations: Content of each additional declaration, keyed by field
+        :param is_pipelined:
+        :param output_format: Name of the format the files are written in
+        :return: Hex digest identifying the zip these inputs assemble to
+        """
+        m = sha256('{}:{}:{:d}:{}'.format(ResultCache.VERSION, ISACache.base_digest(), is_pipelined,
+                                          output_format).encode('utf-8'))
+        for kind, items in (('file', files), ('declaration', sorted(declarations.items()))):
+            for name, chunks in items:
+                content = sha256()
+                for chunk in chunks:
+                    content.update(chunk)
+                m.update('\0{}\0{}\0'.format(kind, name).encode('utf-8'))
+                m.update(content.digest())
+        return m.hexdigest()
+
+    def get(self, key: str) -> Optional[BinaryIO]:
+        """
+        :param key: Key of the zip
+        :return: The cached zip, opened for reading, None if it is not cached
+        """
+        path = self._path(key)
+        try:
+            ret = open(path, 'rb')
+        except FileNotFoundError:
+            Metrics.inc('tools350_cache_misses_total', ResultCache._LABELS)
+            return None
+        Metrics.inc('tools350_cache_hits_total', ResultCache._LABELS)
+        try:
+            os.utime(path)
+        except FileNotFoundError:  # Evicted since it was opened. The open file can still be read
+            pass
+        return ret
+
+    def store(self, key: str, stream: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Pass the stream through, saving it under the key once it is exhausted. Nothing is saved if the stream fails or
+        is closed early.
+        :param key: Key of the zip
+        :param stream: The zip, in chunks
+        :return: The same chunks
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = '{}.{}.tmp'.format(path, uuid4().hex)
+        complete = False
+        try:
+            with open(tmp, 'wb') as file:
+                for chunk in stream:
+                    file.write(chunk)
+                    yield chunk
+            os.replace(tmp, path)
+            complete = True
+        finally:
+            if not complete:
+                os.remove(tmp)
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used zips until the cache fits in max_bytes, along with abandoned temporary files.
+        Does nothing if another process is already evicting.
+        :return: None
+        """
+        with open(os.path.join(self.root, '.lock'), 'wb') as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return
+            entries = []
+            stale = time() - ResultCache.STALE_SECONDS
+            for directory in os.scandir(self.root):
+                if not directory.is_dir():
+                    continue
+                for entry in os.scandir(directory.path):
+                    try:
+                        stat = entry.stat()
+                        if entry.name.endswith('.tmp'):
+                            if stat.st_mtime < stale:
+                                os.remove(entry.path)
+                        else:
+                            entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    except FileNotFoundError:
+                        pass
+            size = sum(x[1] for x in entries)
+            for _, entry_size, path in sorted(entries):
+                if size <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                size -= entry_size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + '.zip')
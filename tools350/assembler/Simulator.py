@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+
+import argparse as ap
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import *
+
+from tools350.assembler.Assembler import Assembler
+from tools350.assembler.Disassembler import Disassembler
+
+
+class Predecoded(NamedTuple):
+    """
+    A program decoded once for the simulator: a (operation, a, b, c) tuple per address, with the operands already
+    sign extended and in the order the operation uses them
+    """
+    code: Tuple[Tuple[int, int, int, int], ...]
+    names: Tuple[Optional[str], ...]  # Mnemonic at each address, None where the word does not decode
+
+
+class State(NamedTuple):
+    """
+    State of the machine when a simulation stopped
+    """
+    status: str  # One of the Simulator statuses
+    pc: int
+    cycles: int  # Instructions executed
+    registers: Tuple[int, ...]
+    memory: Dict[int, int]  # Every data memory word that is not zero, keyed by address
+
+
+class Simulator:
+    """
+    Reference model of the ECE350 processor, one instruction per cycle. Registers and memory words are signed 32-bit.
+    Instruction and data memory are separate, and data addresses wrap at the depth of the memory. As on the processor,
+    add, addi, sub, mul and div write their exception code (1 to 5) to $rstatus instead of writing $rd when they
+    overflow, or for div, divide by zero. setx writes $rstatus, bex jumps if it is not zero, and jal links in $ra.
+    $0 is always zero.
+    """
+
+    DEPTH = 4096
+    RSTATUS = 30
+    RA = 31
+    MAX_CYCLES = 100000
+
+    DONE = 'done'  # Ran past the last instruction
+    LOOP = 'loop'  # Reached a jump to itself, the usual way for a program to end
+    LIMIT = 'limit'  # Ran for max_cycles
+    ILLEGAL = 'illegal'  # Reached a word that is not an instruction of the base ISA
+
+    # Operations, in the order the dispatch loop tests for them
+    (_ADD, _ADDI, _SUB, _AND, _OR, _SLL, _SRA, _MUL, _DIV, _LW, _SW, _J, _BNE, _JAL, _JR, _BLT, _BEX, _SETX,
+     _NOP, _ILLEGAL) = range(20)
+
+    # Mnemonic -> operation, and where each of a, b, c comes from in the operands as written
+    _OPERATIONS = {
+        'add': (_ADD, 0, 1, 2), 'addi': (_ADDI, 0, 1, 2), 'sub': (_SUB, 0, 1, 2), 'and': (_AND, 0, 1, 2),
+        'or': (_OR, 0, 1, 2), 'sll': (_SLL, 0, 1, 2), 'sra': (_SRA, 0, 1, 2), 'mul': (_MUL, 0, 1, 2),
+        'mult': (_MUL, 0, 1, 2), 'div': (_DIV, 0, 1, 2), 'lw': (_LW, 0, 2, 1), 'sw': (_SW, 0, 2, 1),
+        'j': (_J, 0), 'bne': (_BNE, 0, 1, 2), 'jal': (_JAL, 0), 'jr': (_JR, 0), 'blt': (_BLT, 0, 1, 2),
+        'bex': (_BEX, 0), 'setx': (_SETX, 0), 'nop': (_NOP,),
+    }
+
+    _programs: List[Predecoded] = None  # Programs of a worker process
+
+    @classmethod
+    def predecode(cls, words: Sequence[int], disassembler: Disassembler) -> Predecoded:
+        """
+        :param words: Instruction memory image. The nops padding its end are dropped
+        :param disassembler: Disassembler for the ISA the program was assembled with
+        :return: The program, ready to run
+        """
+        code, names = [], []
+        for instr in disassembler.disassemble(words[:Disassembler.length(words)]):
+            layout = Simulator._OPERATIONS.get(instr.name)
+            if layout is None:
+                code.append((Simulator._ILLEGAL, 0, 0, 0))
+            else:
+                operands = [instr.values[i] for i in layout[1:]]
+                code.append((layout[0],) + tuple(operands) + (0,) * (3 - len(operands)))
+            names.append(instr.name)
+        return Predecoded(tuple(code), tuple(names))
+
+    @classmethod
+    def run(cls, program: Predecoded, registers: Mapping[int, int] = None, memory: Mapping[int, int] = None,
+            max_cycles: int = None) -> State:
+        """
+        :param program: Predecoded program
+        :param registers: Starting value of registers, by number. The others start at zero
+        :param memory: Starting value of data memory words, by address. The others start at zero
+        :param max_cycles: Most instructions to execute, defaults to MAX_CYCLES
+        :return: State of the machine once it stopped
+        """
+        code = program.code
+        length = len(code)
+        limit = Simulator.MAX_CYCLES if max_cycles is None else max_cycles
+        regs = [0] * 32
+        for number, value in (registers or {}).items():
+            regs[number] = Simulator._wrap(value)
+        mem = [0] * Simulator.DEPTH
+        for address, value in (memory or {}).items():
+            mem[address % Simulator.DEPTH] = Simulator._wrap(value)
+        depth = Simulator.DEPTH - 1
+        pc = cycles = 0
+        status = Simulator.LIMIT
+        # Locals, as global and attribute lookups dominate a loop this small. Same order as the class constants
+        ADD, ADDI, SUB, AND, OR, SLL, SRA, MUL, DIV, LW, SW, J, BNE, JAL, JR, BLT, BEX, SETX, NOP = \
+            range(Simulator._ILLEGAL)
+        low, high, rs, ra = -0x80000000, 0x7fffffff, Simulator.RSTATUS, Simulator.RA
+        while cycles < limit:
+            if not 0 <= pc < length:
+                status = Simulator.DONE
+                break
+            op, a, b, c = code[pc]
+            cycles += 1
+            pc += 1
+            if op <= SUB:
+                result = regs[b] + (c if op == ADDI else -regs[c] if op == SUB else regs[c])
+                if low <= result <= high:
+                    regs[a] = result
+                else:
+                    regs[rs] = op + 1
+            elif op == AND:
+                regs[a] = regs[b] & regs[c]
+            elif op == OR:
+                regs[a] = regs[b] | regs[c]
+            elif op == SLL:
+                regs[a] = ((regs[b] << c) + 0x80000000 & 0xffffffff) - 0x80000000
+            elif op == SRA:
+                regs[a] = regs[b] >> c
+            elif op == MUL:
+                result = regs[b] * regs[c]
+                if low <= result <= high:
+                    regs[a] = result
+                else:
+                    regs[rs] = 4
+            elif op == DIV:
+                x, y = regs[b], regs[c]
+                result = abs(x) // abs(y) * (1 if (x < 0) == (y < 0) else -1) if y else None
+                if result is not None and result <= high:  # Truncates towards zero
+                    regs[a] = result
+                else:
+                    regs[rs] = 5
+            elif op == LW:
+                regs[a] = mem[(regs[b] + c) & depth]
+            elif op == SW:
+                mem[(regs[b] + c) & depth] = regs[a]
+            elif op == J:
+                if a == pc - 1:
+                    status = Simulator.LOOP
+                    pc -= 1
+                    break
+                pc = a
+            elif op == BNE:
+                if regs[a] != regs[b]:
+                    pc += c
+            elif op == JAL:
+                regs[ra] = pc
+                pc = a
+            elif op == JR:
+                pc = regs[a]
+            elif op == BLT:
+                if regs[a] < regs[b]:
+                    pc += c
+            elif op == BEX:
+                if regs[rs]:
+                    pc = a
+            elif op == SETX:
+                regs[rs] = a
+            elif op != NOP:
+                status = Simulator.ILLEGAL
+                cycles -= 1
+                pc -= 1
+                break
+            regs[0] = 0
+        return State(status, pc, cycles, tuple(regs), {i: x for i, x in enumerate(mem) if x})
+
+    @classmethod
+    def run_all(cls, programs: Sequence[Predecoded],
+                jobs: Iterable[Tuple[int, Mapping[int, int], Mapping[int, int]]] = None,
+                max_cycles: int = None, workers: int = 1) -> List[State]:
+        """
+        Run many programs, or one program on many inputs, across processes. The programs are sent to each worker once,
+        when it starts.
+        :param programs: Predecoded programs
+        :param jobs: (index of the program, registers, memory) for each run, see run. Defaults to running every
+        program once from zero
+        :param max_cycles: Most instructions to execute in each run
+        :param workers: Number of worker processes. Below 2, everything is run in this process
+        :return: State at the end of each job, in order
+        """
+        jobs = [(i, None, None) for i in range(len(programs))] if jobs is None else list(jobs)
+        tasks = [(i, registers, memory, max_cycles) for i, registers, memory in jobs]
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(workers, initializer=Simulator._start_worker, initargs=(programs,)) as executor:
+                return list(executor.map(Simulator._run_task, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+        return [Simulator.run(programs[i], registers, memory, max_cycles) for i, registers, memory, max_cycles in tasks]
+
+    @classmethod
+    def _start_worker(cls, programs: Sequence[Predecoded]):
+        Simulator._programs = programs
+
+    @classmethod
+    def _run_task(cls, task: Tuple[int, Mapping[int, int], Mapping[int, int], int]) -> State:
+        i, registers, memory, max_cycles = task
+        return Simulator.run(Simulator._programs[i], registers, memory, max_cycles)
+
+    @classmethod
+    def _wrap(cls, value: int) -> int:
+        return ((value + 0x80000000) & 0xffffffff) - 0x80000000
+
+
+if __name__ == '__main__':
+    args = ap.ArgumentParser(description='Run MIFs on a model of the processor, reporting the final state as JSON')
+    args.add_argument('images', nargs='+', help='MIFs to run')
+    args.add_argument('-c', '--cycles', dest='cycles', type=int, default=Simulator.MAX_CYCLES,
+                      help='Most instructions to run each program for')
+    args.add_argument('-i', '--inputs', dest='inputs', default=None,
+                      help='JSON list of inputs to run every program on, each {"registers": {n: value}, "memory": '
+                           '{address: value}}. Defaults to running once from zero')
+    args.add_argument('-j', '--workers', dest='workers', type=int, default=1, help='Number of worker processes')
+    for field in Assembler.FIELDS:
+        args.add_argument('--{}'.format(field), dest=field, default=None,
+                          help='JSON declarations of {} the images were assembled with'.format(field))
+    in_ = args.parse_args()
+    declarations = {f: getattr(in_, f) for f in Assembler.FIELDS if getattr(in_, f)}
+    disassembler = Disassembler.for_declarations(Assembler.unpack(declarations, 'named-regs'),
+                                                 Assembler.unpack(declarations, 'inst'),
+                                                 Assembler.unpack(declarations, 'inst-types'))
+    programs = [Simulator.predecode(Disassembler.load_image(image), disassembler) for image in in_.images]
+    inputs = [{}]
+    if in_.inputs is not None:
+        with open(in_.inputs, 'r') as f:
+            inputs = json.load(f)
+    jobs = [(i, {int(k): v for k, v in x.get('registers', {}).items()}, {int(k): v for k, v in x.get('memory', {})
+             .items()}) for i in range(len(programs)) for x in inputs]
+    states = Simulator.run_all(programs, jobs, in_.cycles, in_.workers)
+    json.dump([dict(image=in_.images[job[0]], input=i % len(inputs), **state._asdict())
+               for i, (job, state) in enumerate(zip(jobs, states))], sys.stdout, indent=1)
+    sys.stdout.write('\n')
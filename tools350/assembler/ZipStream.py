@@ -0,0 +1,92 @@
+from io import RawIOBase
+from time import localtime
+from typing import *
+from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED
+
+from tools350.Spans import Spans
+
+
+class ZipStream(RawIOBase):
+    """
+    Write-only, unseekable file for building a zip while it is being sent. ZipFile writes each entry with a trailing
+    data descriptor when it can't seek back, so whatever has been written so far can be drained and sent straight
+    away, and only the data written since the last drain is held in memory.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._pending = 0
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        size = len(b)
+        self._chunks.append(bytes(b))
+        self._pending += size
+        self._position += size
+        return size
+
+    def tell(self) -> int:
+        return self._position
+
+    def pending(self) -> int:
+        """
+        :return: Number of bytes written since the last drain
+        """
+        return self._pending
+
+    def drain(self) -> bytes:
+        """
+        :return: Everything written since the last drain
+        """
+        ret = b''.join(self._chunks)
+        self._chunks.clear()
+        self._pending = 0
+        return ret
+
+    @classmethod
+    def zip(cls, entries: Iterable[Tuple[str, Iterable[Union[str, bytes]]]],
+            chunk_size: int = 1 << 16) -> Iterator[bytes]:
+        """
+        Build a zip of files, one chunk at a time. Entries are consumed lazily, so neither the entries nor the zip are
+        ever held in memory as a whole.
+        :param entries: Name of each file in the zip, with its content in pieces. Pieces of text are written as utf-8,
+        and all pieces of a file must be of the same type
+        :param chunk_size: Smallest chunk of the zip to hand out, except for the last
+        :return: The zip, in chunks
+        """
+        buffer = cls()
+        with ZipFile(buffer, 'w', ZIP_DEFLATED) as zip_:
+            for name, pieces in entries:
+                info = ZipInfo(name, date_time=localtime()[:6])
+                info.create_system = 0
+                info.compress_type = ZIP_DEFLATED
+                info.external_attr = 0o600 << 16
+                with zip_.open(info, 'w') as entry:
+                    text, size = [], 0
+                    for piece in pieces:
+                        # Compress in blocks, as pieces are often single lines
+                        text.append(piece)
+                        size += len(piece)
+                        if size >= ZipStream._BLOCK_SIZE:
+                            with Spans.span('zip'):
+                                entry.write(ZipStream._join(text))
+                            text, size = [], 0
+                            if buffer.pending() >= chunk_size:
+                                yield buffer.drain()
+                    with Spans.span('zip'):
+                        entry.write(ZipStream._join(text))
+                if buffer.pending() >= chunk_size:
+                    yield buffer.drain()
+        yield buffer.drain()
+
+    @classmethod
+    def _join(cls, pieces: List[Union[str, bytes]]) -> bytes:
+        if pieces and isinstance(pieces[0], bytes):
+            return b''.join(pieces)
+        return ''.join(pieces).encode('utf-8')
+
+    _BLOCK_SIZE = 1 << 14  # Characters or bytes compressed at a time
@@ -0,0 +1,32 @@
+from tools350.assembler.instruction.Template import Template
+
+
+class EncodedInstruction:
+    """
+    An instruction packed into an integer word. The binary text is only produced when the instruction is written out.
+    Everything but the word is in the template shared by every use of the mnemonic.
+    """
+
+    __slots__ = ('_template', '_word')
+
+    def __init__(self, template: Template, word: int):
+        self._template = template
+        self._word = word
+
+    def get_name(self) -> str:
+        return self._template.get_name()
+
+    def get_type(self) -> str:
+        return self._template.get_type()
+
+    def get_template(self) -> Template:
+        return self._template
+
+    def get_word(self) -> int:
+        return self._word
+
+    def __int__(self) -> int:
+        return self._word
+
+    def __str__(self) -> str:
+        return self._template.to_binary(self._word)
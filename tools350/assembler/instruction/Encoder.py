@@ -0,0 +1,91 @@
+from typing import *
+
+from tools350.assembler.instruction.InstructionType import InstructionType
+from tools350.assembler.instruction.Template import Template, Operand
+
+
+class Encoder:
+    """
+    Precomputes, for every instruction type, the shift and mask of each field, and for every instruction, the fixed
+    opcode/aluop bits. Instructions can then be packed straight into an integer word.
+    """
+
+    IMMED = "immed"  # Only immediates are encoded in two's complement
+
+    def __init__(self, instructions: Mapping[str, Mapping], types: InstructionType):
+        """
+        :param instructions: Instruction bank, keyed by mnemonic
+        :param types: Instruction types the instructions are declared with
+        """
+        self._layouts: Dict[str, Tuple[int, Dict[str, Tuple[int, int]]]] = \
+            {name: Encoder._layout(fields) for name, fields in types.get_types().items()}
+        self._templates: Dict[str, Union[Template, Exception]] = {}
+        for name, declaration in instructions.items():
+            try:
+                self._templates[name] = self._compile(name, declaration, types)
+            except (KeyError, AssertionError) as e:  # Only fail the lines that use a broken declaration
+                self._templates[name] = e
+
+    @classmethod
+    def _layout(cls, fields: Mapping[str, int]) -> Tuple[int, Dict[str, Tuple[int, int]]]:
+        """
+        Place each field of an instruction type in the word. The first field is the most significant.
+        :param fields: Width of each field, in order
+        :return: Width of the word, and the shift and width of each field
+        """
+        width = sum(fields.values())
+        ret = {}
+        shift = width
+        for field, length in fields.items():
+            shift -= length
+            ret[field] = (shift, length)
+        return width, ret
+
+    def _compile(self, name: str, declaration: Mapping, types: InstructionType) -> Template:
+        """
+        Build the template for an instruction.
+        :param name: Mnemonic of the instruction
+        :param declaration: Declaration of the instruction from the instruction bank
+        :param types: Instruction types, used to find branches
+        :return: Template with the fixed bits set
+        :raises KeyError: The declaration is missing a key, or refers to an unknown type or field
+        :raises AssertionError: The fixed bits don't fit their field
+        """
+        type_ = declaration['type']
+        syntax = declaration['syntax']
+        width, layout = self._layouts[type_]
+        fixed = "aluop" if type_ == "R" else "opcode"  # Opcode is always '00000' for R, no need to specify here
+        bits = declaration[fixed]
+        assert fixed in layout, "Field {} not in instruction type {}".format(fixed, type_)
+        shift, length = layout[fixed]
+        assert len(bits) == length and not bits.strip('01'), \
+            "Field {} of {} must be a {}-bit binary string".format(fixed, name, length)
+        operands = tuple(Encoder._operand(field, *layout[field], field == Encoder.IMMED and types.is_branch(name))
+                         for field in syntax)
+        mask = sum(((1 << layout[f][1]) - 1) << layout[f][0] for f in {fixed, "opcode"} if f in layout)
+        return Template(name, type_, width, int(bits, 2) << shift, operands, mask)
+
+    @classmethod
+    def _operand(cls, field: str, shift: int, width: int, relative: bool) -> Operand:
+        signed = field == Encoder.IMMED
+        mask = (1 << width) - 1
+        low, high = (-(1 << (width - 1)), (1 << (width - 1)) - 1) if signed else (0, mask)
+        return Operand(field, shift, width, mask, ~(mask << shift), low, high, signed, relative)
+
+    def get_templates(self) -> Dict[str, Template]:
+        """
+        :return: Template of every instruction whose declaration compiled, keyed by mnemonic, in declaration order
+        """
+        return {name: t for name, t in self._templates.items() if not isinstance(t, Exception)}
+
+    def get_template(self, name: str) -> Template:
+        """
+        :param name: Mnemonic of the instruction
+        :return: Template of the instruction
+        :raises KeyError: The instruction provided is invalid, or its declaration is broken.
+        :raises AssertionError: The declaration of the instruction is broken.
+        """
+        template = self._templates[name]
+        if isinstance(template, Exception):
+            raise type(template)(*template.args)
+        return template
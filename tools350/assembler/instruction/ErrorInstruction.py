@@ -0,0 +1,21 @@
+class ErrorInstruction:
+    """
+    A line that could not be encoded. Only the reason is kept; the line is written out as the all-zero nop word.
+    """
+
+    __slots__ = ('message',)
+
+    def __init__(self, message: str):
+        self.message = message
+
+    def get_name(self) -> str:
+        return 'err'
+
+    def get_type(self) -> str:
+        return 'E'
+
+    def __int__(self) -> int:
+        return 0
+
+    def __str__(self) -> str:
+        return self.message
@@ -1,5 +1,7 @@
+from os import path
+
 BASE_JSON_PATH = 'tools350/assembler/base_jsn'
-BASE_JSON_LOCAL = 'tools350/assembler/base_jsn'
+BASE_JSON_LOCAL = path.join(path.dirname(path.dirname(path.abspath(__file__))), 'base_jsn')
 
 
 class InstructionType:
@@ -7,12 +9,12 @@ class InstructionType:
     def __init__(self, types: dict):
         self._instruction_types: dict = types
 
+    def get_types(self) -> dict:
+        return self._instruction_types["types"]
+
     def get_by_type(self, type_: str) -> dict:
         return self._instruction_types["types"][type_]
 
     def is_branch(self, instr: str) -> bool:
         return instr in self._instruction_types["branches"]
 
-    NOP = {"opcode": 5, "rd": 5, "rs": 5, "rt": 5, "shamt": 5, "aluop": 5, "zeroes": 2}
-    ERROR = {"err": 32}
-
@@ -0,0 +1,67 @@
+from typing import *
+
+
+class Operand(NamedTuple):
+    """
+    Placement of one operand from the assembly syntax inside the instruction word
+    """
+    field: str
+    shift: int
+    width: int
+    mask: int  # Mask of the field, before shifting
+    clear: int  # Mask of every bit of the word outside the field
+    low: int  # Smallest value that fits the field
+    high: int  # Largest value that fits the field
+    signed: bool  # Encoded in two's complement
+    relative: bool  # Encoded relative to the next instruction, ie a branch offset
+
+    def range_error(self, value: int) -> str:
+        """
+        :param value: Value that does not fit the field
+        :return: Message explaining why the value does not fit
+        """
+        if self.signed:
+            return "{} is out of range for {}-bit two's complement".format(value, self.width)
+        elif value < 0:
+            return "Value must be at least 0 for representation in non-two's complement"
+        return "{} is out of range for {}-bit representation".format(value, self.width)
+
+
+class Template:
+    """
+    Everything about an instruction that does not depend on the line it is written on: the fixed opcode/aluop bits
+    and where each operand goes in the word.
+    """
+
+    __slots__ = ('name', 'inst_type', 'width', 'word', 'operands', 'fixed', '_format')
+
+    def __init__(self, name: str, inst_type: str, width: int, word: int, operands: Tuple[Operand, ...],
+                 fixed: int = 0):
+        """
+        :param name: Mnemonic of the instruction
+        :param inst_type: Name of the instruction type
+        :param width: Width of the instruction word, in bits
+        :param word: Instruction word with only the fixed bits set
+        :param operands: Operands in the order they are written in assembly
+        :param fixed: Mask of the bits that identify the instruction, ie the opcode and aluop fields
+        """
+        self.name = name
+        self.inst_type = inst_type
+        self.width = width
+        self.word = word
+        self.operands = operands
+        self.fixed = fixed
+        self._format = '0{}b'.format(width)
+
+    def get_name(self) -> str:
+        return self.name
+
+    def get_type(self) -> str:
+        return self.inst_type
+
+    def to_binary(self, word: int) -> str:
+        """
+        :param word: Encoded instruction
+        :return: Binary string of the word, padded to the width of the instruction type
+        """
+        return format(word, self._format)
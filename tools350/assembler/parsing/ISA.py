@@ -0,0 +1,103 @@
+from types import MappingProxyType
+from typing import *
+
+from tools350.assembler.instruction.Encoder import Encoder
+from tools350.assembler.instruction.InstructionType import InstructionType
+from tools350.assembler.parsing.LayeredMapping import LayeredMapping
+
+
+class ISA:
+    """
+    Compiled, read-only instruction set: the base JSON resources layered under any declarations uploaded alongside
+    the assembly. An ISA holds no per-file state, so a single instance can be shared by every thread in the process.
+    """
+
+    INSTRUCTIONS = 'base_instr.json'
+    REGISTERS = 'value-mappings.json'
+    TYPES = 'instruction-types.json'
+    BASE_FILES = (INSTRUCTIONS, REGISTERS, TYPES)
+
+    def __init__(self, instructions: Mapping[str, Mapping], registers: Mapping[str, int], types: Mapping,
+                 extras: Tuple[list, list, list] = ((), (), ()), key: str = None):
+        """
+        :param instructions: Read-only instruction bank, keyed by mnemonic
+        :param registers: Read-only named register mappings, keyed by name
+        :param types: Read-only instruction type declarations
+        :param extras: Uploaded register, instruction and type declarations the ISA was compiled with
+        :param key: Key of the ISA in the ISACache, if it was compiled through the cache
+        """
+        self.key = key
+        self._extras = extras
+        self._instructions: Mapping[str, Mapping] = instructions
+        self._registers: Mapping[str, int] = registers
+        self._types: InstructionType = InstructionType(types)
+        self._encoder: Encoder = Encoder(self._instructions, self._types)
+
+    @classmethod
+    def compile(cls, base: Dict[str, Mapping], extra_registers: Iterable[dict] = (), extra_instr: Iterable[dict] = (),
+                extra_types: Iterable[dict] = (), key: str = None) -> "ISA":
+        """
+        Layer the uploaded declarations under the base resources. The base resources take priority over all others for
+        replacement of elements, but after that the elements are prioritized by their order in the iterable. Lists,
+        like the branches, are concatenated. Only the uploaded declarations are copied, so compiling costs time and
+        memory in proportion to their size.
+        :param base: Base resources, keyed by file name (see BASE_FILES), frozen with freeze
+        :param extra_registers: Named register declarations uploaded by students
+        :param extra_instr: Instruction declarations uploaded by students
+        :param extra_types: Instruction type declarations uploaded by students
+        :param key: Key of the ISA in the ISACache
+        :return: Compiled ISA
+        """
+        extras = (list(extra_registers), list(extra_instr), list(extra_types))
+        return cls(ISA._layer(base[ISA.INSTRUCTIONS], extras[1]), ISA._layer(base[ISA.REGISTERS], extras[0]),
+                   ISA._layer(base[ISA.TYPES], extras[2]), extras, key)
+
+    @classmethod
+    def _layer(cls, master: Mapping, extra_files: Sequence[dict] = ()) -> Mapping:
+        """
+        :param master: Base elements, like the provided ISA or instruction types. No elements of the master can be
+        overwritten, and they should be deployed by course staff only.
+        :param extra_files: Secondary declarations to draw from, uploaded by students as supplements to add instruction
+        types, instructions, or named registers.
+        :return: Read-only view of the master over the declarations. The master is never modified.
+        """
+        return LayeredMapping.of([master] + [ISA.freeze(x) for x in extra_files])
+
+    @classmethod
+    def freeze(cls, value: Any) -> Any:
+        """
+        Recursively wrap a parsed JSON value so it can be shared without being modified.
+        :param value: Value to freeze
+        :return: Read-only mappings in place of dicts, tuples in place of lists
+        """
+        if isinstance(value, dict):
+            return MappingProxyType({k: ISA.freeze(v) for k, v in value.items()})
+        elif isinstance(value, list):
+            return tuple(ISA.freeze(v) for v in value)
+        return value
+
+    def get_instruction(self, name: str) -> Mapping:
+        """
+        :param name: Mnemonic of the instruction
+        :return: Declaration of the instruction from the instruction bank
+        :raises KeyError: The instruction provided is invalid.
+        """
+        return self._instructions[name]
+
+    def get_instructions(self) -> Mapping[str, Mapping]:
+        return self._instructions
+
+    def get_registers(self) -> Mapping[str, int]:
+        return self._registers
+
+    def get_types(self) -> InstructionType:
+        return self._types
+
+    def get_encoder(self) -> Encoder:
+        return self._encoder
+
+    def __reduce__(self):
+        # Read-only mappings can't be pickled, so ship the uploaded declarations. The receiving process layers them over
+        # its own base resources, unless its cache already holds this ISA
+        from tools350.assembler.parsing.ISACache import ISACache
+        return ISACache.restore, (self.key,) + self._extras
@@ -0,0 +1,150 @@
+import json
+from collections import OrderedDict
+from hashlib import sha1
+from os import stat
+from os.path import join
+from threading import RLock
+from typing import *
+
+from tools350.assembler.instruction.InstructionType import BASE_JSON_PATH, BASE_JSON_LOCAL
+from tools350.assembler.parsing.ISA import ISA
+from tools350.Metrics import Metrics
+
+
+class ISACache:
+    """
+    Process wide cache of compiled ISAs, keyed by a content hash of the base resources and the uploaded declarations.
+    The least recently used ISA is evicted once MAX_SIZE is reached. All methods are safe to call from any thread.
+    """
+
+    MAX_SIZE = 32
+
+    _lock = RLock()
+    _entries: "OrderedDict[str, ISA]" = OrderedDict()
+    _base: Optional[Tuple[tuple, str, Dict[str, Mapping]]] = None  # (stamp, digest, frozen base resources)
+    hits = 0
+    misses = 0
+
+    _LABELS = {'cache': 'isa'}
+
+    @classmethod
+    def get(cls, extra_registers: Iterable[dict] = (), extra_instr: Iterable[dict] = (),
+            extra_types: Iterable[dict] = ()) -> ISA:
+        """
+        Get the compiled ISA for these declarations, compiling it if it has not been seen recently.
+        :param extra_registers: Named register declarations uploaded by students
+        :param extra_instr: Instruction declarations uploaded by students
+        :param extra_types: Instruction type declarations uploaded by students
+        :return: Shared, read-only ISA
+        """
+        extras = (list(extra_registers), list(extra_instr), list(extra_types))
+        with cls._lock:
+            digest, base = ISACache._load_base()
+            key = ISACache.key(digest, *extras)
+            try:
+                cls._entries.move_to_end(key)
+                cls.hits += 1
+                Metrics.inc('tools350_cache_hits_total', ISACache._LABELS)
+                return cls._entries[key]
+            except KeyError:
+                cls.misses += 1
+                Metrics.inc('tools350_cache_misses_total', ISACache._LABELS)
+        # Compile outside of the lock, a duplicate compile is harmless
+        return ISACache._insert(ISA.compile(base, *extras, key=key))
+
+    @classmethod
+    def restore(cls, key: Optional[str], extra_registers: List[dict], extra_instr: List[dict],
+                extra_types: List[dict]) -> ISA:
+        """
+        Rebuild an ISA sent from another process, reusing the compiled copy in this process if there is one.
+        :param key: Key of the ISA in the sending process's cache
+        :param extra_registers: Named register declarations the ISA was compiled with
+        :param extra_instr: Instruction declarations the ISA was compiled with
+        :param extra_types: Instruction type declarations the ISA was compiled with
+        :return: Shared, read-only ISA
+        """
+        if key is not None:
+            with cls._lock:
+                try:
+                    cls._entries.move_to_end(key)
+                    return cls._entries[key]
+                except KeyError:
+                    pass
+        return ISACache.get(extra_registers, extra_instr, extra_types)
+
+    @classmethod
+    def _insert(cls, isa: ISA) -> ISA:
+        """
+        Add a compiled ISA to the cache, evicting the least recently used ISAs if needed
+        :param isa: ISA to add, with its key set
+        :return: The cached ISA for the key
+        """
+        with cls._lock:
+            cls._entries.setdefault(isa.key, isa)
+            cls._entries.move_to_end(isa.key)
+            while len(cls._entries) > cls.MAX_SIZE:
+                cls._entries.popitem(last=False)
+            return cls._entries[isa.key]
+
+    @classmethod
+    def key(cls, base_digest: str, *extras: Iterable[dict]) -> str:
+        """
+        Hash the declarations. Key order is kept, as the order of fields in an instruction type is significant.
+        :param base_digest: Digest of the base resources
+        :param extras: Uploaded declarations, in the order they are passed to ISA.compile
+        :return: Hex digest identifying the compiled ISA
+        """
+        m = sha1(base_digest.encode('utf-8'))
+        m.update(json.dumps(extras, separators=(',', ':')).encode('utf-8'))
+        return m.hexdigest()
+
+    @classmethod
+    def base_digest(cls) -> str:
+        """
+        :return: Digest of the current version of the base resources
+        """
+        with cls._lock:
+            return ISACache._load_base()[0]
+
+    @classmethod
+    def clear(cls):
+        """
+        Drop every compiled ISA and the base resources, forcing them to be read again on next use
+        :return: None
+        """
+        with cls._lock:
+            cls._entries.clear()
+            cls._base = None
+            cls.hits = cls.misses = 0
+
+    @classmethod
+    def _load_base(cls) -> Tuple[str, Dict[str, Mapping]]:
+        """
+        Read the base resources, unless they were already read and have not been modified since. Must hold _lock.
+        :return: Digest of the base resources and the frozen resources, keyed by file name
+        """
+        try:
+            root = BASE_JSON_PATH
+            stamp = ISACache._stamp(root)
+        except FileNotFoundError:
+            root = BASE_JSON_LOCAL
+            stamp = ISACache._stamp(root)
+        if cls._base is None or cls._base[0] != stamp:
+            m = sha1()
+            base = {}
+            for name in ISA.BASE_FILES:
+                with open(join(root, name), 'rb') as file:
+                    raw = file.read()
+                m.update(raw)
+                base[name] = ISA.freeze(json.loads(raw.decode('utf-8')))
+            cls._base = (stamp, m.hexdigest(), base)
+        return cls._base[1], cls._base[2]
+
+    @classmethod
+    def _stamp(cls, root: str) -> tuple:
+        """
+        :param root: Directory holding the base resources
+        :return: Identity of the current version of the base resources
+        :raises FileNotFoundError: A base resource is missing from root
+        """
+        return (root,) + tuple((s.st_mtime_ns, s.st_size) for s in (stat(join(root, n)) for n in ISA.BASE_FILES))
@@ -0,0 +1,64 @@
+from typing import *
+
+
+class LayeredMapping(Mapping):
+    """
+    Read-only view over a stack of read-only mappings, looked up as if they had been deep merged: the first layer to
+    hold a key wins, except that mappings found under the same key are layered in turn and tuples are concatenated in
+    layer order. Nothing is copied, so a view costs only what its own layers cost, however large the layers below it.
+    Merged values are built on first use and kept.
+    """
+
+    __slots__ = ('_layers', '_merged')
+
+    def __init__(self, layers: Sequence[Mapping]):
+        """
+        :param layers: Mappings to look keys up in, highest priority first. They must not change while in use
+        """
+        self._layers = tuple(layers)
+        self._merged: Dict[Any, Any] = {}
+
+    @classmethod
+    def of(cls, layers: Sequence[Mapping]) -> Mapping:
+        """
+        :param layers: Mappings, highest priority first
+        :return: A view over the layers, or the only layer if there is just one
+        """
+        return layers[0] if len(layers) == 1 else cls(layers)
+
+    def __getitem__(self, key):
+        try:
+            return self._merged[key]
+        except KeyError:
+            pass
+        found = [layer[key] for layer in self._layers if key in layer]
+        if not found:
+            raise KeyError(key)
+        first = found[0]
+        if len(found) == 1:
+            return first
+        if isinstance(first, Mapping):
+            ret = LayeredMapping.of([x for x in found if isinstance(x, Mapping)])
+        elif isinstance(first, tuple):
+            ret = sum((x for x in found if isinstance(x, tuple)), ())
+        else:
+            return first
+        self._merged[key] = ret
+        return ret
+
+    def __contains__(self, key) -> bool:
+        return any(key in layer for layer in self._layers)
+
+    def __iter__(self) -> Iterator:
+        seen = set()
+        for layer in self._layers:
+            for key in layer:
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return 'LayeredMapping({!r})'.format(dict(self))
@@ -0,0 +1,107 @@
+import re
+from typing import *
+
+
+class Token(NamedTuple):
+    """
+    A single operand of an instruction
+    """
+    kind: str  # One of the Lexer token kinds
+    value: Union[int, str]  # Register number, immediate, or symbol name. The offset for a base+offset operand
+    base: Union[int, str, None] = None  # Base register of a base+offset operand
+
+    def values(self) -> Tuple[Union[int, str], ...]:
+        """
+        :return: Values this operand supplies to the instruction, in the order they are written
+        """
+        return (self.value, self.base) if self.kind == Lexer.BASE_OFFSET else (self.value,)
+
+
+class SourceLine(NamedTuple):
+    """
+    A line of assembly, split into its parts
+    """
+    number: int  # Line number in the source file, starting at 0
+    label: Optional[str]  # Jump target declared on this line
+    mnemonic: Optional[str]  # Name of the instruction, None if the line holds no instruction
+    operands: Tuple[Token, ...]
+    values: Tuple[Union[int, str], ...]  # Values of all operands in order, ints for literals and str for names
+    text: str  # Instruction and comment, without the label or surrounding whitespace
+    error: Optional[str] = None  # Why the line could not be split, if it couldn't
+
+
+class Lexer:
+    """
+    Splits lines of assembly into a label, mnemonic and typed operands in a single scan of each line. Commas,
+    semicolons, parentheses and whitespace all separate operands.
+    """
+
+    REGISTER = 'register'
+    IMMEDIATE = 'immediate'
+    SYMBOL = 'symbol'
+    BASE_OFFSET = 'base_offset'
+
+    @classmethod
+    def lex(cls, text_file: Iterable[str]) -> Iterator[SourceLine]:
+        """
+        :param text_file: Lines of assembly
+        :return: Every line, split into its parts. Lines that can't be split are returned whole, with their error
+        """
+        for i, line in enumerate(text_file):
+            try:
+                yield Lexer.lex_line(line, i)
+            except SyntaxError as e:
+                yield SourceLine(i, None, None, (), (), line.strip(), str(e))
+
+    @classmethod
+    def lex_line(cls, line: str, number: int = 0) -> SourceLine:
+        """
+        :param line: Line of assembly
+        :param number: Line number in the source file
+        :return: The line, split into its parts
+        :raises SyntaxError: The line declares more than one label, or a label without a name
+        """
+        code = line.partition('#')[0]
+        label, colon, rest = code.partition(':')
+        if colon:
+            if ':' in rest:
+                sections = [x for x in Lexer._TARGET_PATTERN.split(code) if x]
+                raise SyntaxError("Too many sections to labeled line: expected two or fewer, found {}"
+                                  .format(len(sections)))
+            text = line[len(label) + 1:].strip()
+            code = rest
+            label = label.strip()
+            if not label:
+                raise SyntaxError("Missing jump target name before ':'")
+        else:
+            text = line.strip()
+            label = None
+        tokens = Lexer._TOKEN.findall(code)
+        if not tokens:
+            return SourceLine(number, label, None, (), (), text)
+        mnemonic, operands, values = None, [], []
+        after_open = False
+        for numeric, register, symbol, open_ in tokens:
+            if open_:
+                after_open = True
+                continue
+            elif mnemonic is None:
+                mnemonic = numeric or symbol
+                continue
+            elif register:
+                kind, value = Lexer.REGISTER, int(register)
+            elif numeric:
+                kind, value = Lexer.IMMEDIATE, int(numeric)
+            else:
+                kind, value = Lexer.SYMBOL, symbol
+            if after_open and operands and operands[-1].kind != Lexer.BASE_OFFSET:
+                operands[-1] = Token(Lexer.BASE_OFFSET, operands[-1].value, value)
+            else:
+                operands.append(Token(kind, value))
+            values.append(value)
+            after_open = False
+        return SourceLine(number, label, mnemonic, tuple(operands), tuple(values), text)
+
+    _TARGET_PATTERN = re.compile(r':\s*')
+    # Register or immediate, then symbol, then '(' to mark a base. Separators and ')' are skipped
+    _TOKEN = re.compile(r'(\$r?(\d+)(?![^\s,;()])|[+-]?\d+(?![^\s,;()]))|([^\s,;()]+)|(\()')
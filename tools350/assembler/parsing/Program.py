@@ -0,0 +1,30 @@
+from typing import *
+
+from tools350.assembler.parsing.Lexer import SourceLine
+from tools350.assembler.parsing.SymbolTable import SymbolTable
+
+
+class Program:
+    """
+    Result of the first pass over a file: the instruction lines in address order, and every name they can refer to.
+    Once built, each line can be encoded independently of the others.
+    """
+
+    def __init__(self, lines: Iterable[SourceLine], symbols: SymbolTable):
+        """
+        :param lines: Lines holding instructions. The index of a line is its address
+        :param symbols: Jump targets and named registers
+        """
+        self.lines: Tuple[SourceLine, ...] = tuple(lines)
+        self.symbols: SymbolTable = symbols
+        self._addresses: Dict[int, int] = {line.number: address for address, line in enumerate(self.lines)}
+
+    def address_of(self, line_number: int) -> Optional[int]:
+        """
+        :param line_number: Line number in the source file, starting at 0
+        :return: Address of the instruction on the line, None if the line holds no instruction
+        """
+        return self._addresses.get(line_number)
+
+    def __len__(self) -> int:
+        return len(self.lines)
@@ -0,0 +1,46 @@
+from types import MappingProxyType
+from typing import *
+
+
+class SymbolTable:
+    """
+    Read-only names known to a program: the jump targets found by the first pass, and the named registers of the ISA.
+    A jump target hides a named register with the same name.
+    """
+
+    def __init__(self, registers: Mapping[str, int], targets: Mapping[str, int] = None):
+        """
+        :param registers: Named registers of the ISA
+        :param targets: Address of the instruction each jump target points to
+        """
+        self._registers: Mapping[str, int] = registers
+        self._targets: Mapping[str, int] = MappingProxyType(dict(targets or {}))
+
+    def resolve(self, name: str) -> int:
+        """
+        :param name: Jump target or named register
+        :return: Address of the jump target, or number of the register
+        :raises KeyError: The name was never declared
+        """
+        try:
+            return self._targets[name]
+        except KeyError:
+            return self._registers[name]
+
+    def offset(self, name: str, address: int) -> int:
+        """
+        :param name: Jump target
+        :param address: Address of the branch
+        :return: Offset encoded in the branch to reach the target
+        :raises KeyError: The name was never declared
+        """
+        return self.resolve(name) - (address + 1)  # Since target = PC + N + 1   =>   N = target - PC - 1
+
+    def get_targets(self) -> Mapping[str, int]:
+        return self._targets
+
+    def __getstate__(self):
+        return dict(self._registers), dict(self._targets)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
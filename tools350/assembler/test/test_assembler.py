@@ -0,0 +1,127 @@
+import pickle
+import re
+import sys
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from os import path, remove
+from tempfile import NamedTemporaryFile
+from unittest import mock
+from zipfile import ZipFile
+from ..Assembler import Assembler
+from ..ZipStream import ZipStream
+from ..parsing.Parser import Parser
+
+DAT = path.join(path.dirname(path.abspath(__file__)), 'dat')
+
+
+class TestAssembler(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.parser = Parser()
+
+    @staticmethod
+    def words(mif: str):
+        return re.findall(r'^\d{4} : ([01]{32});', mif, re.M)
+
+    def test_assemble(self):
+        for name in ['branch_test', 'jump_test', 'reg_replace_test']:
+            actual = self.words(Assembler.assemble(path.join(DAT, name + '.s'), self.parser, True).getvalue())
+            with open(path.join(DAT, name + '.mif'), 'r') as mif:
+                expected = [x.strip() for x in mif if x.strip()]
+            self.assertEqual(expected, actual, 'Assembly failed for ' + name)
+
+    def test_streams(self):
+        file = path.join(DAT, 'branch_test.s')
+        expected = Assembler.assemble(file, self.parser, True).getvalue()
+        with open(file, 'rb') as f:
+            data = f.read()
+        self.assertEqual(expected, Assembler.assemble(BytesIO(data), self.parser, True).getvalue(),
+                         'Binary stream assembled differently')
+        stream = StringIO(data.decode('utf-8'))
+        stream.read()
+        self.assertEqual(expected, Assembler.assemble(stream, self.parser, True).getvalue(),
+                         'Stream not read from the start')
+        self.assertEqual([{'$x': 3}], Assembler.unpack({'named-regs': BytesIO(b'{"$x": 3}')}, 'named-regs'))
+
+    def test_first_pass(self):
+        program = self.parser.first_pass(['start:\n', '# comment\n', 'add $1 $2 $3\n', '\n', 'end: j start\n'])
+        self.assertEqual(2, len(program), 'Instruction lines not found')
+        self.assertEqual({'start': 0, 'end': 1}, dict(program.symbols.get_targets()), 'Symbol table incorrect')
+        self.assertEqual((0, 1, None), tuple(program.address_of(x) for x in (2, 4, 3)), 'Line addresses incorrect')
+        self.assertEqual(-2, program.symbols.offset('start', 1), 'Branch offset incorrect')
+        with self.assertRaises(TypeError, msg='Symbol table is writable'):
+            program.symbols.get_targets()['start'] = 3
+
+    def test_executor(self):
+        program = ['loop: addi $1 $1 1\n', 'bne $1 $2 loop\n', 'blt $1 $2 end\n', 'sll $1 $1 40\n'] * 40 + ['end: j loop\n']
+        with NamedTemporaryFile('w', suffix='.s', delete=False) as f:
+            f.writelines(program)
+        file = f.name
+        old = Assembler.PARALLEL_LINES, Assembler.BATCH_SIZE
+        try:
+            expected = Assembler.assemble(file, self.parser, True).getvalue()
+            Assembler.PARALLEL_LINES, Assembler.BATCH_SIZE = 10, 7
+            with ThreadPoolExecutor(3) as executor:
+                actual = Assembler.assemble(file, self.parser, True, executor).getvalue()
+            self.assertEqual(expected, actual, 'Batched encoding changed the output')
+        finally:
+            Assembler.PARALLEL_LINES, Assembler.BATCH_SIZE = old
+            remove(file)
+
+    def test_assemble_all_parallel(self):
+        files = [path.join(DAT, name + '.s') for name in ['jump_test', 'branch_test', 'reg_replace_test']] * 2
+        names = ['{}_{}.s'.format(i, path.basename(f)) for i, f in enumerate(files)]
+        timings = {}
+        serial = ZipFile(Assembler.assemble_all(files, names, {}, timings=timings))
+        self.assertEqual(set(names), set(timings), 'Timings missing')
+        try:
+            parallel = ZipFile(Assembler.assemble_all(files, names, {}, workers=2, parallel_files=2))
+        finally:
+            Assembler.shutdown_executor()
+        self.assertEqual([Assembler.fix_filename(x) for x in names], parallel.namelist(), 'Zip order not kept')
+        self.assertEqual([serial.read(x) for x in serial.namelist()], [parallel.read(x) for x in parallel.namelist()],
+                         'Parallel assembly changed the output')
+
+    def test_python(self):
+        self.assertEqual(sys.executable, Assembler._python())
+        with mock.patch.object(sys, 'executable', '/usr/local/bin/uwsgi'):
+            python = Assembler._python()
+        self.assertTrue(path.basename(python).startswith('python') and path.isfile(python),
+                        'Workers would be spawned with ' + python)
+
+    def test_stream_all(self):
+        with NamedTemporaryFile('w', suffix='.s', delete=False) as f:
+            f.writelines(['a: b: nop\n', 'frob $1\n', 'j nowhere\n', 'addi $1 $1 1\n'])
+        file = f.name
+        try:
+            stream = Assembler.stream_all([file], ['errors.s'], {})
+            mif = ZipFile(BytesIO(b''.join(stream))).read('errors.mif').decode('utf-8')
+            self.assertEqual(Assembler.assemble(file, self.parser, True).getvalue(), mif, 'Streamed MIF differs')
+        finally:
+            remove(file)
+        lines = mif.splitlines()
+        self.assertIn('Too many sections', lines[6], 'Syntax error not written into the MIF')
+        self.assertIn("'frob' is not declared", lines[7], 'Unknown instruction not written into the MIF')
+        self.assertIn("'nowhere' is not declared", lines[8], 'Unknown target not written into the MIF')
+
+    def test_zip_stream(self):
+        entries = [('{}.mif'.format(i), (str(x * i) + '\n' for x in range(2000))) for i in range(3)]
+        chunks = list(ZipStream.zip(entries, chunk_size=256))
+        self.assertGreater(len(chunks), 3, 'Zip not streamed in chunks')
+        zip_ = ZipFile(BytesIO(b''.join(chunks)))
+        self.assertEqual(['0.mif', '1.mif', '2.mif'], zip_.namelist(), 'Zip order not kept')
+        self.assertEqual(''.join(str(x * 2) + '\n' for x in range(2000)), zip_.read('2.mif').decode('utf-8'),
+                         'Zip entry corrupted')
+
+    def test_pickle(self):
+        program = self.parser.first_pass(['j end\n', 'end: nop\n'])
+        parser, symbols = pickle.loads(pickle.dumps((self.parser, program.symbols)))
+        self.assertIs(self.parser.get_isa(), parser.get_isa(), 'Cached ISA not reused after pickling')
+        self.assertEqual(str(self.parser.parse_source(program.lines[0], 0, program.symbols)),
+                         str(parser.parse_source(program.lines[0], 0, symbols)), 'Pickled parser differs')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+from ..Assembler import Assembler
+from ..Benchmark import Benchmark
+from ..parsing.Parser import Parser
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_cases(self):
+        for case in Benchmark.cases():
+            parser = Parser([], [case.declarations['inst']] if case.declarations else [],
+                            [case.declarations['inst-types']] if case.declarations else [])
+            program = parser.first_pass(case.lines)
+            errors = Assembler._encode_batch(parser, program.symbols, 0, program.lines)[1]
+            self.assertEqual(len(case.lines), len(program), 'Lines missing from ' + case.name)
+            if case.name.startswith('errors'):
+                self.assertTrue(errors, 'No errors in ' + case.name)
+            else:
+                self.assertEqual([], errors, 'Unexpected errors in ' + case.name)
+
+    def test_compare(self):
+        baseline = {'cases': {'a': {'reference': 1.0, 'ratios': {'encode': 10.0, 'zip': 0.1}, 'peak_kib': 100}}}
+        same = {'cases': {'a': {'reference': 2.0, 'ratios': {'encode': 10.0, 'zip': 0.3}, 'peak_kib': 100}}}
+        self.assertEqual([], Benchmark.compare(same, baseline), 'Slower machine or noise reported as a regression')
+        slower = {'cases': {'a': {'reference': 1.0, 'ratios': {'encode': 16.0, 'zip': 0.3}, 'peak_kib': 200},
+                            'b': {'reference': 1.0, 'ratios': {'encode': 1.0}, 'peak_kib': 1}}}
+        self.assertEqual(['a encode: 16.00 ms, baseline 10.00 ms', 'a memory: 200 KiB, baseline 100 KiB'],
+                         Benchmark.compare(slower, baseline), 'Wrong regressions')
+
+    def test_run(self):
+        results = Benchmark.run(Benchmark.cases()[:1], repeat=1, rounds=3)['cases']['straight_10']
+        self.assertEqual(set(Benchmark.STAGES), set(results['ratios']))
+        self.assertEqual([], Benchmark.compare({'cases': {'x': results}}, {'cases': {'x': results}}),
+                         'Results regress against themselves')
+
+if __name__ == '__main__':
+    unittest.main()
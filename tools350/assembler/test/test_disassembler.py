@@ -0,0 +1,79 @@
+import unittest
+from os import path, remove
+from tempfile import NamedTemporaryFile
+from ..Assembler import Assembler
+from ..Disassembler import Disassembler
+from ..OutputFormat import OutputFormat
+from ..parsing.Parser import Parser
+
+DAT = path.join(path.dirname(path.abspath(__file__)), 'dat')
+
+
+class TestDisassembler(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.parser = Parser()
+        self.disassembler = Disassembler(self.parser.get_isa())
+
+    def image(self, file: str, output_format: str = 'mif'):
+        fmt = OutputFormat.get(output_format)
+        return Disassembler.parse_image(''.join(Assembler.iter_mif(file, self.parser, True, fmt=fmt)))
+
+    def test_round_trip(self):
+        for name in ['branch_test', 'jump_test', 'reg_replace_test']:
+            words = self.image(path.join(DAT, name + '.s'))
+            self.assertEqual(4096, len(words), 'Image not padded to the depth')
+            decoded = self.disassembler.disassemble(words[:Disassembler.length(words)])
+            program = self.parser.first_pass([d.text + '\n' for d in decoded])
+            again = [int(Assembler.encode_line(self.parser, line, address, program.symbols))
+                     for address, line in enumerate(program.lines)]
+            self.assertEqual(words[:len(again)], again, 'Disassembly does not assemble back for ' + name)
+
+    def test_errors(self):
+        program = 'add $1 $2 $3\nj nowhere\naddi $1 $2 1000000\na: b: nop\nsw $1 4($2)\n'
+        with NamedTemporaryFile('w', suffix='.s', delete=False) as f:
+            f.write(program)
+        try:
+            errors = {}
+            words = Disassembler.parse_image(''.join(Assembler.iter_mif(f.name, self.parser, True)), errors)
+            expected = self.image(f.name, 'mif-hex')
+        finally:
+            remove(f.name)
+        self.assertEqual(expected, words, 'Lines that were not assembled not read as nops')
+        self.assertEqual([1, 2, 3], sorted(errors))
+        self.assertIn("'nowhere' is not declared", errors[1])
+        with self.assertRaises(ValueError):
+            Disassembler.parse_image('DEPTH = 4; WIDTH = 32; CONTENT BEGIN [0..3] : nop; END;')
+
+    def test_decode(self):
+        program = self.parser.first_pass(['lw $1, 4($2)\n', 'blt $1, $2, -3\n', 'mult $1 $2 $3\n'])
+        words = [int(Assembler.encode_line(self.parser, line, address, program.symbols))
+                 for address, line in enumerate(program.lines)]
+        decoded = self.disassembler.disassemble(words)
+        self.assertEqual(['lw $1, 4($2)', 'blt $1, $2, -3', 'mul $1, $2, $3'], [d.text for d in decoded])
+        self.assertEqual(-1, decoded[1].target, 'Branch target incorrect')
+        self.assertEqual('nop', self.disassembler.decode(0).text)
+        self.assertIsNone(self.disassembler.decode(0xF8000000).name, 'Unknown opcode decoded')
+
+    def test_radix(self):
+        file = path.join(DAT, 'jump_test.s')
+        self.assertEqual(self.image(file), self.image(file, 'mif-hex'), 'Hex MIF read differently')
+
+    def test_diff(self):
+        add = int(Assembler.encode_line(self.parser, self.parser.first_pass(['add $1 $2 $3\n']).lines[0], 0, None))
+        expected = [add, add, 0]
+        self.assertEqual([], self.disassembler.diff(expected, [add, add | (5 << 7)]),
+                         'Unused shamt bits should not count')
+        differences = self.disassembler.diff(expected, [add, 0, add])
+        self.assertEqual([1, 2], [d.address for d in differences])
+        self.assertEqual(('add $1, $2, $3', 'nop'), (differences[0].expected.text, differences[0].actual.text))
+
+    def test_declarations(self):
+        disassembler = Disassembler.for_declarations(extra_instr=[{
+            "nand": {"type": "R", "aluop": "11111", "syntax": ["rd", "rs", "rt"]}}])
+        self.assertEqual('nand $1, $2, $3', disassembler.decode((1 << 22) | (2 << 17) | (3 << 12) | (31 << 2)).text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from ..parsing.Parser import Parser
+
+
+class TestEncoder(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.parser = Parser([], [{"swap": {"type": "S", "opcode": "111", "syntax": ["immed", "rd"]},
+                                   "bad": {"type": "S", "opcode": "1", "syntax": []}}],
+                             [{"types": {"S": {"opcode": 3, "rd": 4, "immed": 9}}}])
+        self.encoder = self.parser.get_isa().get_encoder()
+
+    def test_fixed_bits(self):
+        self.assertEqual(0b00101 << 27, self.encoder.get_template('addi').word, 'opcode misplaced')
+        self.assertEqual(0b00001 << 2, self.encoder.get_template('sub').word, 'aluop misplaced')
+
+    def test_word(self):
+        instr = self.parser.parse_line('addi $1, $r2, -1', 1)
+        self.assertEqual(0b00101_00001_00010_11111111111111111, int(instr), 'addi packed incorrectly')
+        self.assertEqual('addi', instr.get_name(), 'Wrong template')
+
+    def test_shared_template(self):
+        first, second = self.parser.parse_line('add $1 $2 $3', 0), self.parser.parse_line('add $4 $5 $6', 1)
+        self.assertIs(first.get_template(), second.get_template(), 'Template not shared between lines')
+        self.assertFalse(hasattr(first, '__dict__'), 'Encoded instructions should be slotted')
+        self.assertEqual(0b11111 << 27 | 0b11111 << 2, self.encoder.get_template('sub').fixed,
+                         'Fixed bits of an R type should cover opcode and aluop')
+
+    def test_custom_type(self):
+        self.assertEqual('1110011' + '111111111', str(self.parser.parse_line('swap -1 $3', 1)), 'custom type failed')
+        with self.assertRaises(AssertionError, msg='Custom immediate range not checked'):
+            self.parser.parse_line('swap 256 $3', 1)
+        with self.assertRaises(AssertionError, msg='Custom register range not checked'):
+            self.parser.parse_line('swap 0 $16', 1)
+
+    def test_broken_declaration(self):
+        for _ in range(2):
+            with self.assertRaises(AssertionError, msg='Bad opcode width accepted'):
+                self.parser.parse_line('bad', 1)
+        with self.assertRaises(KeyError, msg='Unknown instruction accepted'):
+            self.parser.parse_line('nope $1', 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import shutil
+import unittest
+from tempfile import TemporaryDirectory
+from ..Grader import Grader
+
+DAT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dat')
+
+
+class TestGrader(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+        self.root = os.path.join(self.dir.name, 'submissions')
+        os.makedirs(os.path.join(self.root, 'bob', 'lab2'))
+        os.makedirs(os.path.join(self.root, 'alice'))
+        shutil.copy(os.path.join(DAT, 'branch_test.s'), os.path.join(self.root, 'alice'))
+        with open(os.path.join(self.root, 'bob', 'lab2', 'bad.s'), 'w') as f:
+            f.write('nop\nfrob $1\n')
+        with open(os.path.join(self.root, 'bob', 'binary.s'), 'wb') as f:
+            f.write(b'\xff\xfe')
+        with open(os.path.join(self.root, 'bob', 'notes.txt'), 'w') as f:
+            f.write('frob\n')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_grade_all(self):
+        output = os.path.join(self.dir.name, 'mifs')
+        for workers in (1, 2):
+            report = Grader.grade_all(self.root, output, workers=workers)
+            files = report['files']
+            self.assertEqual(['alice/branch_test.s', 'bob/binary.s', 'bob/lab2/bad.s'], [f['source'] for f in files],
+                             'Wrong files assembled')
+            self.assertEqual(['ok', 'failed', 'errors'], [f['status'] for f in files], 'Wrong status')
+            self.assertEqual([{'line': 1, 'address': 1, 'text': 'frob $1', 'error': "'frob' is not declared"}],
+                             files[2]['errors'], 'Error lines not reported')
+            self.assertEqual(2, files[2]['instructions'], 'Wrong number of instructions')
+            self.assertEqual({'ok': 1, 'errors': 1, 'failed': 1, 'files': 3},
+                             {k: v for k, v in report['summary'].items() if k != 'seconds'}, 'Wrong summary')
+            with open(os.path.join(output, 'alice', 'branch_test.mif')) as actual, \
+                    open(os.path.join(DAT, 'branch_test.mif')) as expected:
+                self.assertEqual([x.strip() for x in expected if x.strip()],
+                                 [x[7:39] for x in actual if x[:4].isdigit()], 'Wrong MIF written')
+            self.assertFalse(os.path.exists(os.path.join(output, 'bob', 'binary.mif')), 'Failed MIF left behind')
+
+    def test_in_place(self):
+        Grader.grade_all(self.root)
+        self.assertTrue(os.path.exists(os.path.join(self.root, 'bob', 'lab2', 'bad.mif')), 'MIF not next to source')
+
+
+if __name__ == '__main__':
+    unittest.main()
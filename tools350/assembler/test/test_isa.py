@@ -0,0 +1,77 @@
+import unittest
+from threading import Thread
+from ..parsing.ISACache import ISACache
+from ..parsing.Parser import Parser
+
+
+class TestISA(unittest.TestCase):
+
+    def setUp(self):
+        ISACache.clear()
+
+    def test_cache_hit(self):
+        first = Parser().get_isa()
+        second = Parser().get_isa()
+        self.assertIs(first, second, 'Base ISA not shared')
+        self.assertEqual((1, 1), (ISACache.misses, ISACache.hits), 'Cache not used')
+
+    def test_cache_keyed_by_declarations(self):
+        base = Parser().get_isa()
+        extra = Parser([{"$x": 7}]).get_isa()
+        self.assertIsNot(base, extra, 'Declarations ignored in key')
+        self.assertIs(extra, Parser([{"$x": 7}]).get_isa(), 'Equal declarations not shared')
+        self.assertNotIn('$x', base.get_registers(), 'Declarations leaked into base ISA')
+
+    def test_cache_eviction(self):
+        old, ISACache.MAX_SIZE = ISACache.MAX_SIZE, 2
+        try:
+            first = Parser([{"$a": 1}]).get_isa()
+            Parser([{"$b": 2}])
+            Parser([{"$c": 3}])
+            self.assertIsNot(first, Parser([{"$a": 1}]).get_isa(), 'Least recently used ISA not evicted')
+        finally:
+            ISACache.MAX_SIZE = old
+
+    def test_read_only(self):
+        isa = Parser().get_isa()
+        with self.assertRaises(TypeError, msg='ISA is writable'):
+            isa.get_registers()['$ra'] = 0
+
+    def test_master_priority(self):
+        registers = Parser([{"$ra": 5, "$x": 7}]).get_isa().get_registers()
+        self.assertEqual(31, registers['$ra'], 'Master value overwritten')
+        self.assertEqual(7, registers['$x'], 'Extra value missing')
+
+    def test_layers(self):
+        base = Parser().get_isa()
+        isa = Parser([], [{"swap": {"type": "S", "opcode": "11111", "syntax": ["rd"]}}],
+                     [{"types": {"S": {"opcode": 5, "rd": 27}, "R": {"extra": 1}}, "branches": ["swap"]}]).get_isa()
+        types = isa.get_types()
+        self.assertTrue(types.is_branch('swap') and types.is_branch('bne'), 'Branches not concatenated')
+        self.assertEqual(list(base.get_types().get_by_type('R')) + ['extra'], list(types.get_by_type('R')),
+                         'Type fields not layered in order')
+        self.assertEqual(5, types.get_by_type('R')['opcode'], 'Master field overwritten')
+        self.assertIn('swap', isa.get_instructions())
+        self.assertIs(base.get_registers(), isa.get_registers(), 'Base registers copied')
+        with self.assertRaises(TypeError, msg='Layered ISA is writable'):
+            isa.get_instructions()['add'] = {}
+
+    def test_shared_parser(self):
+        parser = Parser()
+        programs = [['j end\n'] + ['nop\n'] * i + ['end: nop\n'] for i in range(8)]
+        results = {}
+
+        def assemble(i, program):
+            for _ in range(50):
+                program_ = parser.first_pass(program)
+                results[i] = [int(parser.parse_source(x, n, program_.symbols)) for n, x in enumerate(program_.lines)]
+
+        threads = [Thread(target=assemble, args=x) for x in enumerate(programs)]
+        [t.start() for t in threads]
+        [t.join() for t in threads]
+        for i, words in results.items():
+            self.assertEqual((1 << 27) + i + 1, words[0], 'Jump targets shared between files')
+
+
+if __name__ == '__main__':
+    unittest.main()
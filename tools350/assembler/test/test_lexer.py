@@ -0,0 +1,43 @@
+import unittest
+from ..parsing.Lexer import Lexer, Token
+
+
+class TestLexer(unittest.TestCase):
+
+    def test_typed_operands(self):
+        line = Lexer.lex_line('addi $r1, $sp, -4; # comment\n', 3)
+        self.assertEqual(3, line.number, 'Line number lost')
+        self.assertEqual('addi', line.mnemonic, 'Mnemonic not found')
+        self.assertEqual((Token(Lexer.REGISTER, 1), Token(Lexer.SYMBOL, '$sp'), Token(Lexer.IMMEDIATE, -4)),
+                         line.operands, 'Operands typed incorrectly')
+        self.assertEqual((1, '$sp', -4), line.values, 'Operand values incorrect')
+        self.assertEqual('addi $r1, $sp, -4; # comment', line.text, 'Text not stripped')
+
+    def test_base_offset(self):
+        for text in ['lw $1, 4($2)', 'lw $1 4 ( $2 )', 'lw $1,4($2);']:
+            line = Lexer.lex_line(text)
+            self.assertEqual((Token(Lexer.REGISTER, 1), Token(Lexer.BASE_OFFSET, 4, 2)), line.operands,
+                             'Base+offset failed for ' + text)
+            self.assertEqual((1, 4, 2), line.values, 'Base+offset values failed for ' + text)
+
+    def test_compact_separators(self):
+        self.assertEqual((1, 2, 3), Lexer.lex_line('add $1,$2,$3').values, 'Commas without spaces failed')
+
+    def test_label(self):
+        line = Lexer.lex_line('\tloop:  sub $1 $2 $3  # note: here\n')
+        self.assertEqual('loop', line.label, 'Indented label not stripped')
+        self.assertEqual('sub $1 $2 $3  # note: here', line.text, 'Text after label incorrect')
+        line = Lexer.lex_line('end: # only a label\n')
+        self.assertEqual(('end', None), (line.label, line.mnemonic), 'Label only line failed')
+
+    def test_symbols(self):
+        self.assertEqual((Token(Lexer.SYMBOL, '12abc'), Token(Lexer.SYMBOL, '$r1a')),
+                         Lexer.lex_line('j 12abc $r1a').operands, 'Symbols split incorrectly')
+
+    def test_too_many_labels(self):
+        with self.assertRaises(SyntaxError, msg='Two labels accepted'):
+            Lexer.lex_line('a: b: add $1 $2 $3')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import json
+import re
+import struct
+import unittest
+from os import path, remove
+from tempfile import NamedTemporaryFile
+from zipfile import ZipFile
+from ..Assembler import Assembler
+from ..OutputFormat import OutputFormat
+from ..parsing.Parser import Parser
+
+DAT = path.join(path.dirname(path.abspath(__file__)), 'dat')
+
+
+class TestOutputFormat(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.parser = Parser()
+        self.file = path.join(DAT, 'branch_test.s')
+        with open(path.join(DAT, 'branch_test.mif'), 'r') as mif:
+            self.expected = [int(x.strip(), 2) for x in mif if x.strip()]
+
+    def render(self, name: str):
+        fmt = OutputFormat.get(name)
+        return fmt.empty.join(Assembler.iter_mif(self.file, self.parser, True, fmt=fmt))
+
+    def test_mif_unchanged(self):
+        self.assertEqual(Assembler.assemble(self.file, self.parser, True).getvalue(), self.render('mif'),
+                         'Default format changed')
+
+    def test_words(self):
+        words = {
+            'mif-hex': [int(x, 16) for x in re.findall(r'^\d{4} : ([0-9A-F]{8}); --', self.render('mif-hex'), re.M)],
+            'mif-bare': [int(x, 2) for x in re.findall(r'^\d{4} : ([01]{32});$', self.render('mif-bare'), re.M)],
+            'ihex': [int(x, 16) for x in re.findall(r'^:04[0-9A-F]{4}00([0-9A-F]{8})', self.render('ihex'), re.M)],
+            'bin-le': [x for x, in struct.iter_unpack('<I', self.render('bin-le'))],
+            'bin-be': [x for x, in struct.iter_unpack('>I', self.render('bin-be'))],
+            'coe': [int(x, 16) for x in re.findall(r'^([0-9A-F]{8})[,;]$', self.render('coe'), re.M)],
+        }
+        for name, actual in words.items():
+            self.assertEqual(self.expected, actual, 'Words incorrect for ' + name)
+
+    def test_ranges(self):
+        with NamedTemporaryFile('w', suffix='.s', delete=False) as f:
+            f.write('nop\nnop\nadd $1 $2 $3\nnop\n')
+        try:
+            fmt = OutputFormat.get('mif-bare')
+            mif = ''.join(Assembler.iter_mif(f.name, self.parser, True, fmt=fmt))
+        finally:
+            remove(f.name)
+        zero = '0' * 32
+        self.assertEqual(['[0000..0001] : {};'.format(zero), '0002 : {:032b};'.format(1 << 22 | 2 << 17 | 3 << 12),
+                          '[0003..4095] : {};'.format(zero), 'END;'], mif.splitlines()[6:], 'Nops not collapsed')
+
+    def test_intel_hex(self):
+        records = self.render('ihex').splitlines()
+        self.assertEqual(':00000001FF', records[-1], 'Missing end of file record')
+        for address, record in enumerate(records[:-1]):
+            data = bytes.fromhex(record[1:])
+            self.assertEqual(0, sum(data) & 0xff, 'Bad checksum in ' + record)
+            self.assertEqual(address, int.from_bytes(data[1:3], 'big'), 'Records should be word addressed')
+
+    def test_coe(self):
+        coe = self.render('coe').splitlines()
+        self.assertEqual(len(self.expected) + 2, len(coe), 'Words added to the program')
+        self.assertTrue(coe[-1].endswith(';') and all(x.endswith(',') for x in coe[2:-1]), 'Vector not ended once')
+
+    def test_errors_file(self):
+        with NamedTemporaryFile('w', suffix='.s', delete=False) as f:
+            f.write('add $1 $2 $3\nj nowhere\n')
+        source = f.name
+        try:
+            zip_ = ZipFile(Assembler.assemble_all([source], ['prog.s'], {}, output_format='bin-be'))
+            self.assertEqual(['prog.bin', 'prog.errors.txt'], zip_.namelist(), 'Errors not written out')
+            self.assertEqual(8, len(zip_.read('prog.bin')), 'Error lines should still take a word')
+            self.assertIn("'nowhere' is not declared", zip_.read('prog.errors.txt').decode('utf-8'))
+            zip_ = ZipFile(Assembler.assemble_all([source], ['prog.s'], {}, output_format='mif-hex'))
+            self.assertEqual(['prog.mif'], zip_.namelist(), 'Errors are shown inline in a MIF')
+        finally:
+            remove(source)
+
+    def test_width(self):
+        types = {'types': {'W': {'opcode': 5, 'rd': 5, 'immed': 26}}}
+        instr = {'wide': {'type': 'W', 'opcode': '11011', 'syntax': ['rd', 'immed']}}
+        parser = Parser(extra_instr=[instr], extra_types=[types])
+        for name in ('ihex', 'bin-le', 'bin-be', 'coe'):
+            with self.assertRaisesRegex(ValueError, 'type W is 36 bits', msg='Wide words written as ' + name):
+                list(Assembler.iter_mif(self.file, parser, True, fmt=OutputFormat.get(name)))
+        self.assertTrue(''.join(Assembler.iter_mif(self.file, parser, True)), 'Wide words refused in a MIF')
+        declarations = {}
+        try:
+            for field, declaration in (('inst', instr), ('inst-types', types)):
+                with NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+                    json.dump(declaration, f)
+                declarations[field] = f.name
+            with self.assertRaises(ValueError, msg='Wide words not refused before streaming'):
+                Assembler.stream_all([self.file], ['branch_test.s'], declarations, output_format='bin-be')
+        finally:
+            [remove(x) for x in declarations.values()]
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            Assembler.stream_all([self.file], ['branch_test.s'], {}, output_format='srec')
+
+
+if __name__ == '__main__':
+    unittest.main()
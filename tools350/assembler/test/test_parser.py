@@ -1,7 +1,10 @@
 import re
 import unittest
+from os import path
 from ..parsing.Parser import Parser
 
+DAT = path.join(path.dirname(path.abspath(__file__)), 'dat')
+
 
 class TestParsing(unittest.TestCase):
 
@@ -158,8 +161,8 @@ class TestParsing(unittest.TestCase):
         self.assertEqual(expected, actual, 'Inline target filter error')
 
     def test_branch_target_replacement(self):
-        with open('./assembler/test/dat/branch_test.s', 'r') as mips, \
-                open('./assembler/test/dat/branch_test.mif', 'r') as mif:
+        with open(path.join(DAT, 'branch_test.s'), 'r') as mips, \
+                open(path.join(DAT, 'branch_test.mif'), 'r') as mif:
             text = self.parser.preprocess_assembly(mips.readlines())
             actual = [str(self.parser.parse_line(x, i)) for i, x in enumerate(text)]
             # Read in the expected file, remove blank lines (filter), and remove the newline character (map)
@@ -167,16 +170,16 @@ class TestParsing(unittest.TestCase):
             self.assertEqual(actual, expected, 'Error in branch replacement')
 
     def test_jump_target_replacement(self):
-        with open('./assembler/test/dat/jump_test.s', 'r') as mips, \
-                open('./assembler/test/dat/jump_test.mif', 'r') as mif:
+        with open(path.join(DAT, 'jump_test.s'), 'r') as mips, \
+                open(path.join(DAT, 'jump_test.mif'), 'r') as mif:
             text = self.parser.preprocess_assembly(mips.readlines())
             actual = [str(self.parser.parse_line(x, i)) for i, x in enumerate(text)]
             expected = list(map(lambda y: y[:-1], filter(lambda x: not re.match('^\s*$', x), mif.readlines())))
             self.assertEqual(actual, expected, 'Error in branch replacement')
 
     def test_register_replacement(self):
-        with open('./assembler/test/dat/reg_replace_test.s', 'r') as mips, \
-                open('./assembler/test/dat/reg_replace_test.mif', 'r') as mif:
+        with open(path.join(DAT, 'reg_replace_test.s'), 'r') as mips, \
+                open(path.join(DAT, 'reg_replace_test.mif'), 'r') as mif:
             text = self.parser.preprocess_assembly(mips.readlines())
             actual = [str(self.parser.parse_line(x, i)) for i, x in enumerate(text)]
             expected = list(map(lambda y: y[:-1], filter(lambda x: not re.match('^\s*$', x), mif.readlines())))
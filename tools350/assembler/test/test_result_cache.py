@@ -0,0 +1,60 @@
+import os
+import unittest
+from tempfile import TemporaryDirectory
+from ..ResultCache import ResultCache
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+        self.cache = ResultCache(self.dir.name, 100)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    @staticmethod
+    def key(*files, **declarations):
+        return ResultCache.key([(name, [content]) for name, content in files],
+                               {k: [v] for k, v in declarations.items()})
+
+    def test_key(self):
+        key = self.key(('a.s', b'nop\n'), ('b.s', b'j a\n'))
+        self.assertEqual(key, ResultCache.key([('a.s', [b'no', b'p\n']), ('b.s', [b'j a\n'])], {}),
+                         'Key depends on how the content is split')
+        self.assertNotEqual(key, self.key(('b.s', b'j a\n'), ('a.s', b'nop\n')), 'Key ignores file order')
+        self.assertNotEqual(key, self.key(('a.s', b'nop\n'), ('c.s', b'j a\n')), 'Key ignores names')
+        self.assertNotEqual(key, self.key(('a.s', b'nop\n'), ('b.s', b'j b\n')), 'Key ignores content')
+        self.assertNotEqual(key, self.key(('a.s', b'nop\n'), ('b.s', b'j a\n'), inst=b'{}'), 'Key ignores declarations')
+        self.assertNotEqual(key, ResultCache.key([('a.s', [b'nop\n']), ('b.s', [b'j a\n'])], {}, False),
+                            'Key ignores pipelining')
+
+    def test_store(self):
+        key = self.key(('a.s', b'nop\n'))
+        self.assertIsNone(self.cache.get(key), 'Empty cache hit')
+        self.assertEqual([b'ab', b'cd'], list(self.cache.store(key, [b'ab', b'cd'])), 'Stream changed')
+        with self.cache.get(key) as cached:
+            self.assertEqual(b'abcd', cached.read(), 'Cached zip changed')
+
+    def test_incomplete(self):
+        key = self.key(('a.s', b'nop\n'))
+        stream = self.cache.store(key, [b'ab', b'cd'])
+        next(stream)
+        stream.close()
+        self.assertIsNone(self.cache.get(key), 'Incomplete zip cached')
+        self.assertEqual([], [f for _, _, files in os.walk(self.dir.name) for f in files if f.endswith('.tmp')],
+                         'Temporary file left behind')
+
+    def test_evict(self):
+        keys = [self.key(('{}.s'.format(i), b'nop\n')) for i in range(3)]
+        for i, key in enumerate(keys[:2]):
+            list(self.cache.store(key, [b'x' * 40]))
+            os.utime(self.cache._path(key), (i, i))
+        self.cache.get(keys[0]).close()  # Now the most recently used
+        list(self.cache.store(keys[2], [b'x' * 40]))
+        self.assertEqual([True, False, True], [os.path.exists(self.cache._path(k)) for k in keys],
+                         'Least recently used zip not evicted')
+
+
+if __name__ == '__main__':
+    unittest.main()
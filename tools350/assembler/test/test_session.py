@@ -0,0 +1,75 @@
+import random
+import unittest
+from ..AssemblySession import AssemblySession
+from ..parsing.Parser import Parser
+
+
+class TestAssemblySession(unittest.TestCase):
+
+    PROGRAM = ['start: addi $1 $1 1\n', 'bne $1 $2 start\n', '# comment\n', 'j end\n', 'add $3 $1 $2\n',
+               'end: blt $1 $2 start\n', 'nop\n']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.parser = Parser()
+
+    def expected(self, text_file):
+        session = AssemblySession(self.parser, text_file)
+        return session.words()
+
+    def test_start(self):
+        session = AssemblySession(self.parser, self.PROGRAM)
+        words = session.words()
+        self.assertEqual(6, len(session), 'Wrong number of instructions')
+        self.assertEqual([0, 1, 3, 4, 5, 6], [w['line'] for w in words], 'Wrong instruction lines')
+        program = self.parser.first_pass(self.PROGRAM)
+        self.assertEqual([str(self.parser.parse_source(line, i, program.symbols)) for i, line in enumerate(program.lines)],
+                         [w['word'] for w in words], 'Session encoding differs from the parser')
+
+    def test_edit_in_place(self):
+        session = AssemblySession(self.parser, self.PROGRAM)
+        changed = session.edit(4, 5, ['sub $3 $1 $2'])
+        self.assertEqual([4], [w['line'] for w in changed], 'Unaffected lines encoded again')
+
+    def test_edit_moves_targets(self):
+        session = AssemblySession(self.parser, self.PROGRAM)
+        changed = session.edit(4, 4, ['nop'])
+        # j end has its target moved, and the branch on the end line moves away from start. bne and add are unaffected
+        self.assertEqual([3, 4, 6], [w['line'] for w in changed], 'Wrong lines encoded again')
+        self.assertEqual(self.expected(self.PROGRAM[:4] + ['nop'] + self.PROGRAM[4:]), session.words(),
+                         'Edited session differs from a new session')
+
+    def test_errors(self):
+        session = AssemblySession(self.parser, ['j nowhere\n', 'a: b: nop\n'])
+        errors = [w['error'] for w in session.words()]
+        self.assertTrue(errors[0].startswith("'nowhere' is not declared"), 'Unknown target not reported')
+        self.assertTrue(errors[1].startswith('Too many sections'), 'Syntax error not reported')
+        changed = session.edit(1, 2, ['nowhere: nop'])
+        self.assertEqual([0, 1], [w['line'] for w in changed], 'Declared target not resolved')
+        self.assertTrue(all('word' in w for w in session.words()), 'Errors left after fixing them')
+        with self.assertRaises(ValueError, msg='Edit outside of the program accepted'):
+            session.edit(2, 4, [])
+
+    def test_random_edits(self):
+        rng = random.Random(350)
+        choices = ['loop: addi $1 $1 1', 'bne $1 $2 loop', 'blt $2 $1 done', 'j loop', 'jal done', 'done: nop',
+                   '# comment', '', 'add $1 $2 $3', 'bex done', 'sw $1 4($2)']
+        text_file = [rng.choice(choices) for _ in range(40)]
+        session = AssemblySession(self.parser, text_file)
+        for _ in range(200):
+            start = rng.randrange(len(text_file) + 1)
+            end = min(len(text_file), start + rng.randrange(3))
+            lines = [rng.choice(choices) for _ in range(rng.randrange(3))]
+            text_file[start:end] = lines
+            session.edit(start, end, lines)
+            self.assertEqual(self.expected(text_file), session.words(), 'Edited session differs from a new session')
+
+    def test_registry(self):
+        session = AssemblySession.start(self.PROGRAM)
+        self.assertIs(session, AssemblySession.get(session.key), 'Session not found')
+        AssemblySession.clear()
+        self.assertIsNone(AssemblySession.get(session.key), 'Session not dropped')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from ..Assembler import Assembler
+from ..Disassembler import Disassembler
+from ..Simulator import Simulator
+from ..parsing.Parser import Parser
+
+
+class TestSimulator(unittest.TestCase):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.parser = Parser()
+        self.disassembler = Disassembler(self.parser.get_isa())
+
+    def predecode(self, *lines: str):
+        program = self.parser.first_pass([line + '\n' for line in lines])
+        words = [int(Assembler.encode_line(self.parser, line, address, program.symbols))
+                 for address, line in enumerate(program.lines)]
+        return Simulator.predecode(words, self.disassembler)
+
+    def test_loop(self):
+        program = self.predecode('addi $2 $0 100', 'loop: addi $1 $1 1', 'sw $1 5($0)', 'lw $3 5($0)',
+                                 'blt $1 $2 loop', 'end: j end')
+        state = Simulator.run(program)
+        self.assertEqual((Simulator.LOOP, 5, 402), (state.status, state.pc, state.cycles))
+        self.assertEqual((100, 100, 100), state.registers[1:4])
+        self.assertEqual({5: 100}, state.memory)
+        self.assertEqual(Simulator.LIMIT, Simulator.run(program, max_cycles=50).status, 'Cycle limit not kept')
+
+    def test_exceptions(self):
+        state = Simulator.run(self.predecode('addi $1 $0 65535', 'sll $1 $1 15', 'add $2 $1 $1'))
+        self.assertEqual((2147450880, 0, 1), (state.registers[1], state.registers[2], state.registers[30]),
+                         'add overflow should set $rstatus and leave $rd')
+        for code, line in enumerate(['add $3 $1 $1', 'addi $3 $1 65535', 'sub $3 $2 $1', 'mul $3 $1 $1',
+                                     'div $3 $1 $0'], 1):
+            state = Simulator.run(self.predecode(line), {1: 0x7fffffff, 2: -0x80000000})
+            self.assertEqual((code, 0), (state.registers[30], state.registers[3]), 'Wrong exception for ' + line)
+        state = Simulator.run(self.predecode('div $3 $1 $2', 'sra $4 $1 1', 'add $0 $1 $2'), {1: -7, 2: 2})
+        self.assertEqual((-3, -4, 0), (state.registers[3], state.registers[4], state.registers[0]))
+
+    def test_control(self):
+        program = self.predecode('jal f', 'setx 7', 'bex out', 'addi $5 $0 1', 'f: jr $31', 'out: addi $6 $0 1')
+        state = Simulator.run(program)
+        self.assertEqual(Simulator.DONE, state.status)
+        self.assertEqual((0, 1, 7, 1), (state.registers[5], state.registers[6], state.registers[30],
+                                        state.registers[31]))
+        illegal = Simulator.predecode([0xF8000000], self.disassembler)
+        self.assertEqual((Simulator.ILLEGAL, 0, 0), Simulator.run(illegal)[:3])
+
+    def test_run_all(self):
+        program = self.predecode('add $3 $1 $2', 'sw $3 0($0)')
+        jobs = [(0, {1: i, 2: i}, None) for i in range(6)]
+        expected = [Simulator.run(program, registers) for _, registers, _ in jobs]
+        self.assertEqual(expected, Simulator.run_all([program], jobs))
+        self.assertEqual(expected, Simulator.run_all([program], jobs, workers=2))
+
+
+if __name__ == '__main__':
+    unittest.main()
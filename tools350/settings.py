@@ -48,6 +48,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tools350.MetricsMiddleware.MetricsMiddleware',
+    'tools350.TimingMiddleware.TimingMiddleware',
 #    'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -56,6 +58,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'tools350.AdmissionMiddleware.AdmissionMiddleware',
 ]
 
 ROOT_URLCONF = 'tools350.urls'
@@ -127,4 +130,74 @@ STATICFILES_DIRS = [
         os.path.join(BASE_DIR, "tools350/static")
     ]
 STATIC_ROOT = os.path.join(BASE_DIR, "static_serve/")
+# collectstatic writes a gzip (and, with the brotli package installed, a brotli) copy of each file next to it in
+# STATIC_ROOT, which WhiteNoise serves to clients that accept them
+STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
+
+# Uploads
+# Uploads up to this size are kept in memory and handed to the tools as streams. Larger uploads are spooled to a
+# temporary file in FILE_UPLOAD_TEMP_DIR (the system default when None), read from there, and removed by Django once the
+# response is done
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440
+FILE_UPLOAD_TEMP_DIR = None
+
+# Assembler
+# Worker processes used to assemble large uploads in parallel. Below 2, every file is assembled in the request thread
+ASSEMBLER_WORKERS = 4
+# Fewest files in one upload worth sending to the worker processes. Check the per-file timings logged by
+# tools350.assembler.Assembler when tuning this
+ASSEMBLER_PARALLEL_FILES = 8
+# Finished zips are kept here, so that repeated submissions of the same files are not assembled again
+ASSEMBLER_CACHE_DIR = os.path.join(MEDIA_ROOT, 'assembled')
+# Size the cache is trimmed back to, least recently used zips first
+ASSEMBLER_CACHE_BYTES = 256 * 1024 * 1024
+
+# Tools
+# Tools are imported on first use. These are loaded by tools350.wsgi when the server starts instead, before uWSGI forks
+# its workers. See `python -m tools350.Tools` for what each costs to import
+TOOLS_PRELOAD = ('assembler',)
+
+# Admission
+# Most work each pool runs at once across every server process, in units, with the most requests waiting for units
+# and how long they wait, in seconds. Requests turned away get a 503
+ADMISSION_POOLS = {
+    'assembler': {'capacity': 24, 'queue': 32, 'timeout': 5},
+    'im2mif': {'capacity': 8, 'queue': 8, 'timeout': 5},
+}
+# View -> (pool, how its cost is estimated), see tools350.AdmissionMiddleware. Other views are not limited
+ADMISSION_VIEWS = {
+    'assemble': ('assembler', 'lines'),
+    'assemble_session': ('assembler', 'lines'),
+    'im2mif_convert': ('im2mif', 'bytes'),
+}
+# Size of a unit of cost. A 4096 line program costs 8 units, as does an 8 MB upload
+ADMISSION_LINES_PER_UNIT = 512
+ADMISSION_BYTES_PER_UNIT = 1024 * 1024
+ADMISSION_DIR = os.path.join(MEDIA_ROOT, 'admission')
+
+# Jobs
+# Slow conversions, like Im2MIF, are queued in the database and run by `python -m tools350.JobQueue`, started alongside
+# the server in uwsgi.ini, instead of in request threads. JOB_WORKERS is the most jobs run at once
+JOB_WORKERS = 2
+# Most jobs waiting or running at once. Submissions past it are turned away until the queue drains
+JOB_MAX_QUEUED = 64
+# Uploads and results of jobs are kept here, for JOB_TTL_SECONDS after each job finishes
+JOB_DIR = os.path.join(MEDIA_ROOT, 'jobs')
+JOB_TTL_SECONDS = 3600
+# A job still running after this long is assumed lost with its worker, and marked failed
+JOB_TIMEOUT_SECONDS = 600
+
+# Instrumentation
+# Time the stages of every request, reported in a Server-Timing header and logged by tools350.TimingMiddleware. The
+# header shows every client how the server works inside, so it is off unless TOOLS350_TIMING=1 is in the environment
+TIMING_ENABLED = os.environ.get('TOOLS350_TIMING') == '1'
+# Fraction of requests to run under cProfile, and under tracemalloc. Dumps are written to PROFILE_DIR
+PROFILE_SAMPLE_RATE = 0.0
+TRACEMALLOC_SAMPLE_RATE = 0.0
+PROFILE_DIR = os.path.join(MEDIA_ROOT, 'profiles')
+# Request and cache metrics of every server process are kept here, for /metrics to report in the Prometheus text format.
+# None turns them off. Cleared when the server starts, by python -m tools350.Metrics in uwsgi.ini
+METRICS_DIR = os.path.join(MEDIA_ROOT, 'metrics')
+# Addresses allowed to read /metrics. Everyone else gets a 404
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
 print(STATIC_ROOT) 
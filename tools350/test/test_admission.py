@@ -0,0 +1,54 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import unittest
+from ..Admission import Admission
+
+
+class TestAdmission(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'pool.json')
+        self.pool = Admission(self.path, capacity=4, queue=1, timeout=0.05)
+
+    def test_capacity(self):
+        first = self.pool.acquire(3)
+        self.assertIsNotNone(first)
+        second = self.pool.acquire(1)
+        self.assertIsNotNone(second, 'Free unit not granted')
+        self.assertIsNone(self.pool.acquire(1), 'Capacity exceeded')
+        self.assertEqual((4, 0), self.pool.usage(), 'Timed out request left queued')
+        self.pool.release(first)
+        self.pool.release(second)
+        self.assertIsNotNone(self.pool.acquire(100), 'Oversized request not capped at the capacity')
+
+    def test_queue(self):
+        held = self.pool.acquire(4)
+        self.pool.timeout = 5
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(self.pool.acquire(2)))
+        waiter.start()
+        while self.pool.usage()[1] == 0:
+            pass
+        self.assertIsNone(self.pool.acquire(1), 'Queue not bounded')
+        self.pool.release(held)
+        waiter.join()
+        self.assertIsNotNone(results[0], 'Waiting request not granted')
+        self.assertEqual((2, 0), self.pool.usage())
+
+    def test_dead(self):
+        child = multiprocessing.get_context('fork').Process(target=lambda: None)
+        child.start()
+        child.join()
+        with open(self.path, 'w') as f:
+            json.dump({'held': {'x': [child.pid, 4]}, 'queue': [['y', child.pid, 1]]}, f)
+        self.assertEqual((0, 0), self.pool.usage(), 'Units of a dead process not reclaimed')
+        self.assertIsNotNone(self.pool.acquire(4))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory
+
+
+class TestAdmissionMiddleware(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        if not settings.configured:
+            settings.configure()
+        cls.tmp = tempfile.TemporaryDirectory()
+        # The project settings need the deployment's secret key, so the middleware is given just what it reads
+        config = SimpleNamespace(ADMISSION_DIR=cls.tmp.name, ADMISSION_LINES_PER_UNIT=512,
+                                 ADMISSION_BYTES_PER_UNIT=1 << 20,
+                                 ADMISSION_POOLS={'assembler': {'capacity': 8, 'queue': 1, 'timeout': 0.05}})
+        with mock.patch.dict(sys.modules, {'tools350.settings': config}):
+            from ..AdmissionMiddleware import AdmissionMiddleware
+        cls.middleware = AdmissionMiddleware
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_cost(self):
+        files = [SimpleUploadedFile('{}.s'.format(i), b'nop\n' * 4096) for i in range(6)]
+        request = RequestFactory().post('/assemble', {'assembly': files})
+        self.assertEqual(6 * 4096 // 512, self.middleware.cost(request, 'lines'), 'Not every file charged')
+
+    def test_cost_without_files(self):
+        request = RequestFactory().post('/assemble', {'pipelined': 'on'})
+        request.POST  # Parsed by the CSRF middleware before the view in the server, consuming the body
+        self.assertEqual(1, self.middleware.cost(request, 'lines'))
+        request = RequestFactory().post('/assemble', '{"source": "' + 'nop\\n' * 1024 + '"}',
+                                        content_type='application/json')
+        self.assertEqual(2, self.middleware.cost(request, 'lines'), 'JSON source not counted')
+
+    def test_close(self):
+        def respond(request):
+            request.admission = pool, pool.acquire(4)
+            return StreamingHttpResponse(iter([b'a', b'b']))
+        middleware = self.middleware(respond)
+        pool = middleware.pools['assembler']
+        response = middleware(RequestFactory().post('/assemble'))
+        self.assertEqual((4, 0), pool.usage(), 'Units released before the response was sent')
+        response.close()
+        self.assertEqual((0, 0), pool.usage(), 'Units of an unread response not released on close')
+
+
+if __name__ == '__main__':
+    unittest.main()
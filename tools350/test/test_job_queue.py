@@ -0,0 +1,118 @@
+import multiprocessing
+import os
+import signal
+import tempfile
+import threading
+import unittest
+from time import sleep, time
+from ..JobQueue import JobQueue
+
+
+def join(inputs, params, out):
+    for _, path in inputs:
+        with open(path, 'rb') as file:
+            out.write(file.read() * params['times'])
+
+
+def fail(inputs, params, out):
+    raise ValueError('bad image')
+
+
+def pid(inputs, params, out):
+    out.write(str(os.getpid()).encode())
+
+
+class TestJobQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        JobQueue.HANDLERS.update(join=__name__ + ':join', fail=__name__ + ':fail', pid=__name__ + ':pid')
+        self.addCleanup(lambda: [JobQueue.HANDLERS.pop(x) for x in ('join', 'fail', 'pid')])
+        self.queue = JobQueue(os.path.join(self.tmp.name, 'db.sqlite3'), os.path.join(self.tmp.name, 'jobs'),
+                              ttl=3600, max_queued=2, timeout=600)
+
+    def test_run(self):
+        job = self.queue.submit('join', {'times': 2}, [('a', [b'a', b'b']), ('b', [b'c'])])
+        self.assertEqual(JobQueue.QUEUED, self.queue.status(job).status)
+        self.assertIsNone(self.queue.result(job), 'Result before the job ran')
+        self.assertEqual(job, self.queue.run_once())
+        self.assertIsNone(self.queue.run_once(), 'Job run twice')
+        self.assertEqual(JobQueue.DONE, self.queue.status(job).status)
+        with open(self.queue.result(job), 'rb') as file:
+            self.assertEqual(b'ababcc', file.read())
+        self.assertEqual(['result'], os.listdir(os.path.join(self.tmp.name, 'jobs', job)), 'Inputs left behind')
+
+    def test_order(self):
+        first = self.queue.submit('join', {'times': 1}, [])
+        second = self.queue.submit('join', {'times': 1}, [])
+        self.assertEqual(1, self.queue.position(second))
+        self.assertIsNone(self.queue.submit('join', {'times': 1}, []), 'Queue not bounded')
+        self.assertEqual([first, second], [self.queue.run_once(), self.queue.run_once()])
+        self.assertIsNotNone(self.queue.submit('join', {'times': 1}, []), 'Finished jobs still count')
+
+    def test_concurrent(self):
+        ready = threading.Barrier(4)
+
+        def chunks():
+            ready.wait(5)  # Every submitter has found the queue empty before any job is added
+            yield b'a'
+        jobs = []
+        submit = lambda: jobs.append(self.queue.submit('join', {'times': 1}, [('a', chunks())]))
+        threads = [threading.Thread(target=submit) for _ in range(4)]
+        [x.start() for x in threads]
+        [x.join() for x in threads]
+        self.assertEqual(2, len([x for x in jobs if x is not None]), 'Queue overfilled by concurrent submitters')
+        self.assertEqual(2, len(os.listdir(os.path.join(self.tmp.name, 'jobs'))), 'Files of a refused job left behind')
+
+    def test_terminate(self):
+        jobs = [self.queue.submit('pid', {}, []) for _ in range(2)]
+        fork = multiprocessing.get_context('fork')
+        runner = fork.Process(target=self.queue.work, args=(2,))
+        runner.start()
+        deadline = time() + 10
+        while any(self.queue.result(x) is None for x in jobs) and time() < deadline:
+            sleep(0.05)
+        workers = set()
+        for job in jobs:
+            with open(self.queue.result(job), 'rb') as file:
+                workers.add(int(file.read()))
+        os.kill(runner.pid, signal.SIGTERM)
+        runner.join(5)
+        self.assertFalse(runner.is_alive())
+        for worker in workers:
+            with self.assertRaises(ProcessLookupError, msg='Worker outlived its parent'):
+                os.kill(worker, 0)
+        orphan = fork.Process(target=self.queue._work, args=(1,))  # Its parent is not process 1, as if it had died
+        orphan.start()
+        orphan.join(5)
+        self.assertEqual(0, orphan.exitcode, 'Worker did not stop without its parent')
+
+    def test_fail(self):
+        job = self.queue.submit('fail', {}, [('a', [b'a'])])
+        self.queue.run_once()
+        status = self.queue.status(job)
+        self.assertEqual(JobQueue.FAILED, status.status)
+        self.assertIn('bad image', status.error)
+        self.assertIsNone(self.queue.result(job))
+        with self.assertRaises(ValueError):
+            self.queue.submit('unknown', {}, [])
+
+    def test_expire(self):
+        job = self.queue.submit('join', {'times': 1}, [('a', [b'a'])])
+        self.queue.run_once()
+        self.queue.ttl = -1
+        self.queue.expire()
+        self.assertIsNone(self.queue.status(job), 'Job not expired')
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, 'jobs', job)), 'Files of the job left behind')
+        job = self.queue.submit('join', {'times': 1}, [])
+        self.queue.timeout = -1
+        with self.queue._connect() as db:
+            db.execute("UPDATE jobs SET status = ?, started = 0", (JobQueue.RUNNING,))
+        self.queue.ttl = 3600
+        self.queue.expire()
+        self.assertEqual(JobQueue.FAILED, self.queue.status(job).status, 'Lost job not failed')
+
+
+if __name__ == '__main__':
+    unittest.main()
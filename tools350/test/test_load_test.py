@@ -0,0 +1,37 @@
+import random
+import unittest
+from ..LoadTest import LoadTest, Sample
+
+
+class TestLoadTest(unittest.TestCase):
+
+    def test_mix(self):
+        test = LoadTest(LoadTest.parse_mix('assemble=1,page=1'))
+        uploads = test.uploads(random.Random(1))
+        scenarios = {next(uploads).scenario for _ in range(50)}
+        self.assertEqual({'assemble', 'page'}, scenarios)
+        with self.assertRaises(ValueError):
+            LoadTest({'unknown': 1})
+        image = LoadTest({'image': 1})._image(random.Random(1))
+        self.assertTrue(image.files[0][2].startswith(b'\x89PNG'), 'Image is not a PNG')
+
+    def test_run(self):
+        sent = []
+        samples = LoadTest({'page': 1}).run(lambda upload: sent.append(upload) or (200, 10), users=3, requests=20)
+        self.assertEqual(20, len(samples))
+        self.assertEqual(20, len(sent))
+
+    def test_summarize(self):
+        samples = [Sample('page', 200, i / 1000, 1024) for i in range(1, 101)] + [Sample('assemble', 503, 1, 0)]
+        summary = LoadTest.summarize(samples, 10)
+        self.assertEqual((50, 95, 99), tuple(summary['page']['p{}_ms'.format(p)] for p in LoadTest.PERCENTILES))
+        self.assertEqual(101, summary['total']['requests'])
+        self.assertEqual((1, 1), (summary['assemble']['errors'], summary['assemble']['rejected']))
+        self.assertAlmostEqual(10.1, summary['total']['throughput'])
+        slower = {'scenarios': {'page': dict(summary['page'], p95_ms=200.0)}}
+        self.assertEqual(1, len(LoadTest.compare(slower, {'scenarios': summary})), 'Slowdown not reported')
+        self.assertEqual([], LoadTest.compare({'scenarios': summary}, {'scenarios': summary}))
+
+
+if __name__ == '__main__':
+    unittest.main()
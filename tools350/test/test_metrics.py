@@ -0,0 +1,76 @@
+import multiprocessing
+import os
+import tempfile
+import unittest
+from ..Metrics import Metrics
+
+
+def record(view: str):
+    Metrics.inc('tools350_requests_total', {'view': view, 'code': '200'})
+    Metrics.inc('tools350_requests_in_flight', {'view': view})
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(Metrics.configure, None)
+        Metrics.configure(self.tmp.name)
+
+    def test_disabled(self):
+        Metrics.configure(None)
+        Metrics.inc('tools350_requests_total')
+        self.assertEqual([], os.listdir(self.tmp.name), 'Recorded while off')
+
+    def test_histogram(self):
+        for value in (0.001, 0.2, 100):
+            Metrics.observe('tools350_request_seconds', value, {'view': 'assemble'})
+        samples = Metrics.collect()
+        self.assertEqual(1, samples['tools350_request_seconds_bucket{view="assemble",le="0.005"}'])
+        self.assertEqual(2, samples['tools350_request_seconds_bucket{view="assemble",le="0.25"}'])
+        self.assertEqual(3, samples['tools350_request_seconds_bucket{view="assemble",le="+Inf"}'])
+        self.assertEqual(3, samples['tools350_request_seconds_count{view="assemble"}'])
+        self.assertAlmostEqual(100.201, samples['tools350_request_seconds_sum{view="assemble"}'])
+        text = Metrics.render()
+        self.assertIn('# TYPE tools350_request_seconds histogram\n', text)
+        lines = [x for x in text.splitlines() if x.startswith('tools350_request_seconds')]
+        self.assertTrue(lines[0].startswith('tools350_request_seconds_bucket{view="assemble",le="0.005"} '),
+                        'Buckets out of order')
+        self.assertTrue(lines[-1].startswith('tools350_request_seconds_count'), 'Count not last')
+
+    def test_processes(self):
+        record('index')
+        context = multiprocessing.get_context('fork')
+        for _ in range(2):
+            child = context.Process(target=record, args=('index',))
+            child.start()
+            child.join()
+        samples = Metrics.collect()
+        self.assertEqual(3, samples['tools350_requests_total{view="index",code="200"}'], 'Processes not summed')
+        self.assertEqual(1, samples['tools350_requests_in_flight{view="index"}'], 'Gauges of exited processes kept')
+
+    def test_growth(self):
+        for i in range(Metrics.INITIAL_BYTES // 32):
+            Metrics.inc('tools350_cache_hits_total', {'cache': 'cache{}'.format(i)})
+        Metrics.inc('tools350_cache_hits_total', {'cache': 'cache0'}, 2)
+        samples = Metrics.collect()
+        self.assertEqual(Metrics.INITIAL_BYTES // 32, len(samples))
+        self.assertEqual(3, samples['tools350_cache_hits_total{cache="cache0"}'])
+        Metrics.configure(self.tmp.name)
+        Metrics.inc('tools350_cache_hits_total', {'cache': 'cache0'})
+        self.assertEqual(4, Metrics.collect()['tools350_cache_hits_total{cache="cache0"}'], 'File not reopened')
+
+    def test_clear(self):
+        other = os.path.join(self.tmp.name, '1{}.metrics'.format(os.getpid()))
+        open(other, 'wb').close()
+        Metrics.inc('tools350_cache_hits_total', {'cache': 'cache0'})
+        Metrics.configure(self.tmp.name, clear=True)
+        self.assertEqual(['1{}.metrics'.format(os.getpid())], os.listdir(self.tmp.name),
+                         'File of another process dropped, or that of this one kept')
+        Metrics.clear(self.tmp.name)
+        self.assertEqual([], os.listdir(self.tmp.name))
+
+
+if __name__ == '__main__':
+    unittest.main()
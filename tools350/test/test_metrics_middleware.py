@@ -0,0 +1,56 @@
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory
+
+from ..Metrics import Metrics
+
+
+class TestMetricsMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        if not settings.configured:
+            settings.configure()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(Metrics.configure, None)
+        # The project settings need the deployment's secret key, so the middleware is given just what it reads
+        config = SimpleNamespace(METRICS_DIR=self.tmp.name, STATIC_URL='/static/')
+        with mock.patch.dict(sys.modules, {'tools350.settings': config}):
+            from ..MetricsMiddleware import MetricsMiddleware
+            self.middleware = MetricsMiddleware(self.respond)
+
+    def respond(self, request):
+        self.middleware.process_view(request, self.respond, [], {})
+        return StreamingHttpResponse(iter([b'ab', b'c']))
+
+    def request(self):
+        request = RequestFactory().get('/assemble')
+        request.resolver_match = SimpleNamespace(url_name='assemble')
+        return request
+
+    def test_closed_unread(self):
+        response = self.middleware(self.request())
+        self.assertEqual(1, Metrics.collect()['tools350_requests_in_flight{view="assemble"}'])
+        response.close()
+        response.close()
+        samples = Metrics.collect()
+        self.assertEqual(0, samples['tools350_requests_in_flight{view="assemble"}'], 'Request left in flight')
+        self.assertEqual(1, samples['tools350_requests_total{view="assemble",code="200"}'], 'Not counted once')
+
+    def test_streamed(self):
+        response = self.middleware(self.request())
+        self.assertEqual(b'abc', b''.join(response))
+        response.close()
+        samples = Metrics.collect()
+        self.assertEqual(1, samples['tools350_requests_total{view="assemble",code="200"}'], 'Not counted once')
+        self.assertEqual(3, samples['tools350_response_bytes_sum{view="assemble"}'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+from ..MifWriter import MifWriter
+
+
+class TestMifWriter(unittest.TestCase):
+
+    def test_runs(self):
+        self.assertEqual(['[0000..0002] : 1;\n', '0003 : 2;\n', '[0004..0005] : 3;\n'],
+                         list(MifWriter.entries(['1', '1', '1', '2', '3', '3'])), 'Runs not collapsed')
+
+    def test_fill(self):
+        self.assertEqual(['0000 : 1;\n', '[0001..0007] : 0;\n'], list(MifWriter.entries(['1', '0', '0'], 0, 8, '0')),
+                         'Trailing run not merged with the fill')
+        self.assertEqual(['0000 : 1;\n', '[0001..0003] : 0;\n'], list(MifWriter.entries(['1'], 0, 4, '0')))
+        self.assertEqual(['[0000..0003] : 0;\n'], list(MifWriter.entries([], 0, 4, '0')), 'Empty memory not filled')
+        self.assertEqual([], list(MifWriter.entries([])))
+
+    def test_write(self):
+        mif = ''.join(MifWriter.write(['A', 'A'], 2, 4))
+        self.assertTrue(mif.startswith('DEPTH = 2;\nWIDTH = 4;\n'), 'Bad header')
+        self.assertTrue(mif.endswith('BEGIN\n[0000..0001] : A;\nEND;\n'), 'Bad content')
+
+
+if __name__ == '__main__':
+    unittest.main()
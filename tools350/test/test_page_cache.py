@@ -0,0 +1,65 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+from django.conf import settings
+from django.test import RequestFactory
+
+from ..PageCache import PageCache
+
+
+class TestPageCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        if not settings.configured:
+            settings.configure()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.file = os.path.join(self.tmp.name, 'page.html')
+        self.write(b'<p>page</p>' * 100)
+        self.pages = PageCache([os.path.join(self.tmp.name, 'missing'), self.tmp.name, self.tmp.name])
+        self.requests = RequestFactory()
+
+    def write(self, content: bytes, mtime: int = 1000000000):
+        with open(self.file, 'wb') as f:
+            f.write(content)
+        os.utime(self.file, (mtime, mtime))
+
+    def test_reload(self):
+        self.assertEqual(2, len(self.pages.roots), 'Duplicate root kept')
+        first = self.pages.get(['page.html'])
+        self.assertIs(first, self.pages.get(['page.html']), 'Unchanged page loaded again')
+        self.write(b'<p>changed</p>', 1000000100)
+        self.assertEqual(b'<p>changed</p>', self.pages.get(['page.html']).bodies[''])
+        with self.assertRaises(FileNotFoundError):
+            self.pages.get(['other.html'])
+
+    def test_encoding(self):
+        response = self.pages.respond(self.requests.get('/', HTTP_ACCEPT_ENCODING='gzip, deflate'), ['page.html'])
+        self.assertEqual('gzip', response['Content-Encoding'])
+        self.assertEqual(b'<p>page</p>' * 100, gzip.decompress(response.content))
+        self.assertEqual('Accept-Encoding', response['Vary'])
+        plain = self.pages.respond(self.requests.get('/', HTTP_ACCEPT_ENCODING='gzip;q=0'), ['page.html'])
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertNotEqual(response['ETag'], plain['ETag'], 'Encodings share an ETag')
+        self.assertEqual('', PageCache.choose('identity', {'': b'x', 'gzip': b''}))
+        self.assertEqual('br', PageCache.choose('*', {'': b'xxx', 'gzip': b'xx', 'br': b'x'}))
+
+    def test_conditional(self):
+        etag = self.pages.respond(self.requests.get('/'), ['page.html'])['ETag']
+        self.assertEqual(304, self.pages.respond(self.requests.get('/', HTTP_IF_NONE_MATCH=etag),
+                                                 ['page.html']).status_code)
+        modified = self.pages.respond(self.requests.get('/'), ['page.html'])['Last-Modified']
+        self.assertEqual(304, self.pages.respond(self.requests.get('/', HTTP_IF_MODIFIED_SINCE=modified),
+                                                 ['page.html']).status_code)
+        self.write(b'<p>changed</p>', 1000000100)
+        self.assertEqual(200, self.pages.respond(self.requests.get('/', HTTP_IF_NONE_MATCH=etag),
+                                                 ['page.html']).status_code, 'Stale copy not replaced')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+from time import sleep
+from ..Spans import Spans
+
+
+class TestSpans(unittest.TestCase):
+
+    def test_inactive(self):
+        self.assertIsNone(Spans.active(), 'Spans active outside of a request')
+        with Spans.span('noop'):
+            pass
+        items = [1, 2]
+        self.assertIs(items, Spans.iterate('noop', items), 'Inactive iterate wrapped the items')
+
+    def test_span(self):
+        spans = Spans()
+        with spans:
+            self.assertIs(spans, Spans.active(), 'Spans not activated')
+            for _ in range(2):
+                with Spans.span('stage'):
+                    sleep(0.002)
+        self.assertIsNone(Spans.active(), 'Spans left active')
+        seconds, count = spans.totals['stage']
+        self.assertEqual(2, count, 'Entries not counted')
+        self.assertGreaterEqual(seconds, 0.004, 'Time not summed')
+        self.assertRegex(spans.server_timing(), r'^stage;dur=\d+\.\d\d;desc="x2"$', 'Bad Server-Timing header')
+
+    def test_iterate(self):
+        spans = Spans()
+
+        def produce():
+            for i in range(3):
+                sleep(0.002)
+                yield i
+
+        with spans:
+            items = Spans.iterate('produce', produce())
+        for _ in items:
+            sleep(0.01)  # Consumer time is not counted
+        self.assertLess(spans.totals['produce'][0], 0.02, 'Consumer time counted')
+
+    def test_bind(self):
+        spans = Spans()
+
+        def produce():
+            for i in range(3):
+                with Spans.span('late'):
+                    yield i
+
+        self.assertEqual([0, 1, 2], list(spans.bind(produce())), 'Items changed')
+        self.assertIsNone(Spans.active(), 'Spans left active')
+        self.assertEqual(3, spans.totals['late'][1], 'Work after the request not timed')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+from ..Tools import Tool, Tools
+
+
+class TestTools(unittest.TestCase):
+
+    def setUp(self):
+        Tools.TOOLS['missing'] = Tool({'Missing': 'tools350.no_such_module:Missing'})
+        self.addCleanup(Tools.TOOLS.pop, 'missing')
+
+    def test_get(self):
+        from ..MifWriter import MifWriter
+        self.assertIs(MifWriter, Tools.resolve('tools350.MifWriter:MifWriter'))
+        self.assertEqual(MifWriter.header, Tools.resolve('tools350.MifWriter:MifWriter.header'))
+        assembler = Tools.get('assembler')
+        self.assertIs(assembler, Tools.get('assembler'), 'Tool loaded twice')
+        self.assertEqual('Assembler', assembler.Assembler.__name__)
+
+    def test_warm(self):
+        self.assertEqual(['missing'], Tools.warm(['jobs', 'missing']))
+        with self.assertRaises(ImportError):
+            Tools.get('missing')
+
+    def test_import_times(self):
+        times = Tools.import_times('jobs')
+        modules = [x.module for x in times]
+        self.assertIn('tools350.JobQueue', modules)
+        self.assertNotIn('encodings', modules, 'Interpreter startup counted')
+        self.assertTrue(all(x.cumulative >= x.own >= 0 for x in times))
+        with self.assertRaises(ImportError):
+            Tools.import_times('missing')
+
+
+if __name__ == '__main__':
+    unittest.main()
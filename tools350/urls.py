@@ -27,5 +27,10 @@ urlpatterns = [
     path('feedback/', views.bugs_features, name='feedback'),
     path('about/', views.wip, name='about'),
     path('assemble/', views.assemble, name='assemble'),
-    path('help/', views.help, name='help')
+    path('assemble/session/', views.assemble_session, name='assemble_session'),
+    path('im2mif_convert/', views.im2mif_convert, name='im2mif_convert'),
+    path('jobs/<slug:job>/', views.job_status, name='job_status'),
+    path('jobs/<slug:job>/result/', views.job_result, name='job_result'),
+    path('help/', views.help, name='help'),
+    path('metrics', views.metrics, name='metrics')
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -1,32 +1,47 @@
-from typing import Tuple, Iterable
-from django.core.files.uploadedfile import InMemoryUploadedFile
-from django.http import HttpResponse, Http404
-from django.core.files.storage import default_storage
+from functools import lru_cache
+from typing import Iterable, Union, IO
+from django.core.files.uploadedfile import UploadedFile, TemporaryUploadedFile
+from django.http import HttpResponse, Http404, StreamingHttpResponse, JsonResponse, FileResponse, \
+    HttpResponseNotModified
+import json
 import os
-from time import time
-from hashlib import md5
 
 from django.shortcuts import render
+from django.utils.http import parse_etags
+from django.views.decorators.csrf import csrf_exempt
 
 from tools350 import settings
-from tools350.assembler.Assembler import Assembler
+from tools350.Metrics import Metrics
+from tools350.PageCache import PageCache
+from tools350.Spans import Spans
+from tools350.Tools import Tools
 
 HTML_ROOT = './static'
 HTML_ROOT_LOCAL = './static'
 
+_PAGES = PageCache([HTML_ROOT, HTML_ROOT_LOCAL])
 
 
-def find(path: Iterable[str]):
+@lru_cache(maxsize=None)
+def _results():
+    return Tools.get('assembler').ResultCache(settings.ASSEMBLER_CACHE_DIR, settings.ASSEMBLER_CACHE_BYTES)
+
+
+@lru_cache(maxsize=None)
+def _jobs():
+    return Tools.get('jobs').JobQueue(settings.DATABASES['default']['NAME'], settings.JOB_DIR,
+                                      settings.JOB_TTL_SECONDS, settings.JOB_MAX_QUEUED, settings.JOB_TIMEOUT_SECONDS)
+
+
+def find(request, path: Iterable[str]):
     try:
-        with open(os.path.join(HTML_ROOT, *path), 'r') as html:
-            return HttpResponse(''.join(html.readlines()))
+        return _PAGES.respond(request, path)
     except FileNotFoundError:
-        with open(os.path.join(HTML_ROOT_LOCAL, *path), 'r') as html:
-            return HttpResponse(''.join(html.readlines()))
+        raise Http404("No page {}".format('/'.join(path)))
 
 
 def index(request):
-    return find(('index', 'index.html'))
+    return find(request, ('index', 'index.html'))
 
 
 def assembler(request):
@@ -36,63 +51,177 @@ def im2mif(request):
     return render(request, 'Im2MIF/im2mif.html', {})
 
 def wip(request):
-    return find(('wip', 'wip.html'))
+    return find(request, ('wip', 'wip.html'))
 
 
 def bugs_features(request):
-    return find(('bugs', 'bugs.html'))
+    return find(request, ('bugs', 'bugs.html'))
 
 
 def help(request):
-    return find(('help', 'help.html'))
+    return find(request, ('help', 'help.html'))
 
 
 def assemble(request):
     if request.method == 'POST':
-        assembly_files = [_store_local(f) for f in request.FILES.getlist('assembly', None) if f]
-        if assembly_files:
-            additional_declarations = {k: _store_local(v)[1] for k, v in zip(Assembler.FIELDS,
-                                                                             [request.FILES.get(f, None) for f in
-                                                                              Assembler.FIELDS]) if v}
-            try:
-                ret = Assembler.assemble_all([x[1] for x in assembly_files], [x[0] for x in assembly_files],
-                                             additional_declarations)
+        uploads = [f for f in request.FILES.getlist('assembly', None) if f]
+        if uploads:
+            tools = Tools.get('assembler')
+            Assembler, OutputFormat, results = tools.Assembler, tools.OutputFormat, _results()
+            declarations = {k: v for k, v in zip(Assembler.FIELDS, [request.FILES.get(f, None)
+                                                                    for f in Assembler.FIELDS]) if v}
+            output_format = request.POST.get('format', 'mif')
+            if output_format not in OutputFormat.names():
+                return render(request, 'error/error.html', {'error': 'Unknown output format {}'.format(output_format)})
+            with Spans.span('cache_key'):
+                key = results.key([(f.name, f.chunks()) for f in uploads],
+                                   {k: v.chunks() for k, v in declarations.items()}, output_format=output_format)
+            etag = '"{}"'.format(key)
+            if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+                response = HttpResponseNotModified()
+                response["ETag"] = etag
+                return response
+            cached = results.get(key)
+            if cached is not None:
+                response = FileResponse(cached, content_type="application/zip")
+                response["Content-Disposition"] = "attachment; filename=mifs.zip"
+                response["ETag"] = etag
+                return response
 
-                response = HttpResponse(content_type="application/zip")
+            try:
+                # Uploads are read where Django put them, and removed by Django once the response is closed
+                stream = Assembler.stream_all([_source(f) for f in uploads], [f.name for f in uploads],
+                                              {k: _source(v) for k, v in declarations.items()},
+                                              workers=settings.ASSEMBLER_WORKERS,
+                                              parallel_files=settings.ASSEMBLER_PARALLEL_FILES,
+                                              output_format=output_format)
+
+                response = StreamingHttpResponse(results.store(key, stream), content_type="application/zip")
                 response["Content-Disposition"] = "attachment; filename=mifs.zip"
-                ret.seek(0)
-                response.write(ret.read())
+                response["ETag"] = etag
             except Exception as e:
                 s = '{}: {}'.format(str(type(e)), str(e))
                 response = render(request, 'error/error.html', {'error': s})
 
-            [os.remove(x[1]) for x in assembly_files]
-            [os.remove(x) for x in [y for _, y in additional_declarations.items()]]
-
             return response
         else:
             return Http404("No assembly files")
     else:
         raise Http404("Endpoint not allowed for GET")
 
+@csrf_exempt
+def assemble_session(request):
+    """
+    Live assembly for an editor. Post {"source": text, "declarations": {field: json}} to start a session, then
+    {"session": key, "start": line, "end": line, "lines": [text]} to replace lines start to end of it. Both reply with
+    {"session": key, "length": instructions, "words": [...]}, listing every word on a start and the words that changed
+    on an edit. An unknown session gets a 404, and should be started again, and a malformed request a 400.
+
+    No CSRF token is needed, as nothing about the request is taken from cookies: a session is only reachable through
+    its random key, which other sites can't know.
+    """
+    if request.method != 'POST':
+        raise Http404("Endpoint not allowed for GET")
+    AssemblySession = Tools.get('assembler').AssemblySession
+    try:
+        body = json.loads(request.body.decode('utf-8'))
+        if not isinstance(body, dict):
+            raise ValueError("Expected a JSON object")
+        if 'session' in body:
+            if not isinstance(body.get('lines'), list) or not all(isinstance(x, str) for x in body['lines']):
+                raise ValueError("lines must be a list of strings")
+            if not all(isinstance(body.get(x), int) and not isinstance(body[x], bool) for x in ('start', 'end')):
+                raise ValueError("start and end must be integers")
+            session = AssemblySession.get(str(body['session']))
+            if session is None:
+                return JsonResponse({'error': 'Unknown session'}, status=404)
+            with session.lock:
+                words = session.edit(body['start'], body['end'], body['lines'])
+                length = len(session)
+        else:
+            declarations = body.get('declarations', {})
+            if not isinstance(body.get('source'), str):
+                raise ValueError("source must be a string")
+            if not isinstance(declarations, dict):
+                raise ValueError("declarations must be an object")
+            session = AssemblySession.start(body['source'].splitlines(),
+                                            *([declarations[f]] if f in declarations else []
+                                              for f in ('named-regs', 'inst', 'inst-types')))
+            words = session.words()
+            length = len(session)
+    except Exception as e:
+        return JsonResponse({'error': '{}: {}'.format(str(type(e)), str(e))}, status=400)
+    return JsonResponse({'session': session.key, 'length': length, 'words': words})
+
+
 def im2mif_convert(request):
+    """
+    Queue a conversion of the uploaded images. Replies 202 with {"job": id, "status": url, "result": url}, see
+    job_status, 400 with {"error": reason} if there are no images or the options are invalid, or 503 if the queue is
+    full.
+    """
     if request.method == 'POST':
-        response = render(request, 'error/error.html', {'error': s})
-        return response
+        uploads = [f for f in request.FILES.getlist('assembly', None) if f]
+        if not uploads:
+            return JsonResponse({'error': 'No images'}, status=400)
+        try:
+            colors = int(request.POST.get('num-colors') or 32)
+            cluster_size = int(request.POST.get('pixel-compression') or 1)
+            if not 1 <= colors <= 1024:
+                raise ValueError("Number of colors must be between 1 and 1024")
+            job = _jobs().submit('im2mif', {'colors': colors, 'cluster_size': cluster_size},
+                               [(f.name, f.chunks()) for f in uploads])
+        except Exception as e:
+            return JsonResponse({'error': '{}: {}'.format(str(type(e)), str(e))}, status=400)
+        if job is None:
+            response = JsonResponse({'error': 'Too many conversions queued, try again later'}, status=503)
+            response["Retry-After"] = str(settings.JOB_TIMEOUT_SECONDS // 10)
+            return response
+        return JsonResponse({'job': job, 'status': '/jobs/{}/'.format(job), 'result': '/jobs/{}/result/'.format(job)},
+                            status=202)
     else:
-        response = render(request, 'error/error.html', {'error': s})
-        return response
-
-def _store_local(filelike: InMemoryUploadedFile) -> Tuple[str, str]:
-    name = filelike.name + str(time())
-    m = md5()
-    m.update(name.encode('utf-8'))
-    ret_name: str = m.hexdigest()
-    tmpdir = 'tmp/'
-    path = tmpdir + ret_name
-    if not os.path.exists(tmpdir):
-        os.makedirs(tmpdir)
-    with default_storage.open(path, 'wb+') as destination:
-        for chunk in filelike.chunks():
-            destination.write(chunk)
-    return filelike.name, os.path.join(settings.MEDIA_ROOT, path)
+        raise Http404("Endpoint not allowed for GET")
+
+
+def job_status(request, job: str):
+    """
+    Replies with {"job": id, "status": queued|running|done|failed, "position": jobs ahead of it while queued,
+    "error": why it failed, "result": url once done}, or a 404 once the job has expired.
+    """
+    JobQueue = Tools.get('jobs').JobQueue
+    status = _jobs().status(job)
+    if status is None:
+        return JsonResponse({'error': 'Unknown job'}, status=404)
+    ret = {'job': job, 'status': status.status}
+    if status.status == JobQueue.QUEUED:
+        ret['position'] = _jobs().position(job)
+    elif status.status == JobQueue.DONE:
+        ret['result'] = '/jobs/{}/result/'.format(job)
+    elif status.status == JobQueue.FAILED:
+        ret['error'] = status.error
+    return JsonResponse(ret)
+
+
+def job_result(request, job: str):
+    path = _jobs().result(job)
+    if path is None:
+        raise Http404("No result for job {}".format(job))
+    response = FileResponse(open(path, 'rb'), content_type="application/zip")
+    response["Content-Disposition"] = "attachment; filename=mifs.zip"
+    return response
+
+def metrics(request):
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise Http404("Endpoint not allowed")
+    return HttpResponse(Metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _source(upload: UploadedFile) -> Union[str, IO]:
+    """
+    :param upload: Uploaded file
+    :return: Path of the upload if Django spooled it to disk, past FILE_UPLOAD_MAX_MEMORY_SIZE, otherwise the
+    in-memory stream it was read into
+    """
+    if isinstance(upload, TemporaryUploadedFile):
+        return upload.temporary_file_path()
+    return upload.file
@@ -11,6 +11,19 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from tools350 import settings
+from tools350.Metrics import Metrics
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tools350.settings')
 
+# Run by each worker with lazy-apps, and again whenever one is respawned, so only the file this process may have left
+# behind is dropped. uWSGI clears the whole directory once, before the first worker starts
+Metrics.configure(settings.METRICS_DIR, clear=True)
+
 application = get_wsgi_application()
+
+# Unless uWSGI runs with lazy-apps, this module is loaded in the master, so tools loaded here are shared by every worker
+# copy-on-write instead of being imported by each worker on first use
+from tools350.Tools import Tools
+
+Tools.warm(settings.TOOLS_PRELOAD)